@@ -14,3 +14,9 @@ from django.core.asgi import get_asgi_application
 os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'CShop.settings')
 
 application = get_asgi_application()
+
+# Set CSHOP_WARMUP=1 to load URLs, templates and caches before the server forks its workers
+if os.environ.get('CSHOP_WARMUP'):
+    from core.warmup import warm_up
+
+    warm_up()
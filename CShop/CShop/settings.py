@@ -10,6 +10,7 @@ For the full list of settings and their values, see
 https://docs.djangoproject.com/en/4.2/ref/settings/
 """
 
+import os
 from pathlib import Path
 
 # Build paths inside the project like this: BASE_DIR / 'subdir'.
@@ -29,6 +30,65 @@ ALLOWED_HOSTS = []
 
 CART_SESSION_ID = 'cart'
 SESSION_COOKIE_AGE = 86400
+SESSION_ENGINE = 'core.sessions'
+
+PRODUCTS_PER_PAGE = 24
+ORDERS_PER_PAGE = 10
+
+# Send listing pages (frontpage, categories, search) as a stream, the page first and the products as they load
+STREAM_LISTINGS = True
+
+# Orders older than this are moved to the archive by "manage.py archive_orders"
+ORDER_ARCHIVE_DAYS = 365
+
+# The longest date range of the vendor sales analytics page
+ANALYTICS_MAX_DAYS = 366
+
+SEARCH_FUZZY_MIN_RESULTS = 5
+SEARCH_CACHE_TIMEOUT = 300
+
+# How long a visitor reads from the primary database after writing, so they see their own writes
+REPLICA_PIN_COOKIE_NAME = 'primary_pin'
+REPLICA_PIN_SECONDS = 10
+
+# Share of requests measured by MemorySamplingMiddleware, 0 turns it off
+MEMORY_SAMPLE_RATE = float(os.environ.get('CSHOP_MEMORY_SAMPLE_RATE', 0))
+MEMORY_SAMPLE_ALERT_BYTES = 50 * 1024 * 1024
+MEMORY_SAMPLE_FRAMES = 25
+MEMORY_SAMPLE_TOP_SITES = 10
+
+# Background job queue
+JOB_BATCH_SIZE = 100
+JOB_LEASE_SECONDS = 300
+JOB_MAX_ATTEMPTS = 5
+JOB_RETRY_DELAY = 10
+JOB_MAX_RETRY_DELAY = 3600
+
+# Requests allowed per URL name, per IP address and per session, as (requests, period in seconds)
+RATE_LIMITS = {
+    'search': {'ip': (120, 60), 'session': (40, 60)},
+    'add_to_cart': {'ip': (120, 60), 'session': (30, 60)},
+    'change_quantity': {'ip': (240, 60), 'session': (60, 60)},
+    'cart_api': {'ip': (240, 60), 'session': (60, 60)},
+    'checkout': {'ip': (30, 60), 'session': (10, 60)},
+}
+
+# Addresses or networks of the reverse proxies in front of the site. Requests coming from one are
+# rate limited by the client address in their X-Forwarded-For header instead of the proxy's own
+RATE_LIMIT_TRUSTED_PROXIES = [proxy for proxy in os.environ.get('CSHOP_TRUSTED_PROXIES', '').split(',') if proxy]
+
+# How long the checkout page holds the cart's units in stock, 0 disables reservations
+STOCK_RESERVATION_SECONDS = 600
+
+# Expired reservations are returned to stock by a run_worker job queued at checkout, due on the next
+# multiple of this many seconds after they expire. Without a worker, run the sweep_reservations
+# command from cron instead, e.g. '* * * * * manage.py sweep_reservations'
+STOCK_RESERVATION_SWEEP_SECONDS = 60
+
+RECOMMENDATIONS_TOP_K = 8
+
+# The scheme and host written into the sitemap files by the build_sitemaps command
+SITE_URL = os.environ.get('CSHOP_SITE_URL', 'http://localhost:8000')
 
 LOGIN_URL = 'login'
 LOGIN_REDIRECT_URL = 'myaccount'
@@ -50,13 +110,17 @@ INSTALLED_APPS = [
 ]
 
 MIDDLEWARE = [
+    'core.middleware.MemorySamplingMiddleware',
     'django.middleware.security.SecurityMiddleware',
+    # Its process_view runs first, so a rejected request skips the CSRF checks and the view
+    'core.middleware.RateLimitMiddleware',
     'django.contrib.sessions.middleware.SessionMiddleware',
     'django.middleware.common.CommonMiddleware',
     'django.middleware.csrf.CsrfViewMiddleware',
     'django.contrib.auth.middleware.AuthenticationMiddleware',
     'django.contrib.messages.middleware.MessageMiddleware',
     'django.middleware.clickjacking.XFrameOptionsMiddleware',
+    'core.middleware.ReplicaRoutingMiddleware',
 ]
 
 ROOT_URLCONF = 'CShop.urls'
@@ -88,9 +152,51 @@ DATABASES = {
     'default': {
         'ENGINE': 'django.db.backends.sqlite3',
         'NAME': BASE_DIR / 'db.sqlite3',
+        # Concurrent checkouts wait for the write lock instead of failing with "database is locked"
+        'OPTIONS': {
+            'timeout': 20,
+        },
     }
 }
 
+# Read-only views read from a replica when one is configured, e.g. a copy of the sqlite file
+# kept up to date with "manage.py sync_replica"
+if os.environ.get('CSHOP_REPLICA_DB'):
+    DATABASES['replica'] = {
+        'ENGINE': 'django.db.backends.sqlite3',
+        'NAME': os.environ['CSHOP_REPLICA_DB'],
+        'OPTIONS': {
+            'timeout': 20,
+        },
+        'TEST': {
+            'MIRROR': 'default',
+        },
+    }
+
+DATABASE_ROUTERS = ['core.routers.PrimaryReplicaRouter']
+
+
+# Cache
+# https://docs.djangoproject.com/en/4.2/topics/cache/
+# The catalogue version, the search result cache, the menu, the rate limit counters and the
+# media hashes live here. Each process has its own local memory cache, so deployments running
+# more than one worker must set CSHOP_REDIS_URL (e.g. redis://127.0.0.1:6379/0, needs the redis
+# package) for every worker to see the same catalogue version and counters.
+
+if os.environ.get('CSHOP_REDIS_URL'):
+    CACHES = {
+        'default': {
+            'BACKEND': 'django.core.cache.backends.redis.RedisCache',
+            'LOCATION': os.environ['CSHOP_REDIS_URL'],
+        }
+    }
+else:
+    CACHES = {
+        'default': {
+            'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
+        }
+    }
+
 
 # Password validation
 # https://docs.djangoproject.com/en/4.2/ref/settings/#auth-password-validators
@@ -127,9 +233,28 @@ USE_TZ = True
 # https://docs.djangoproject.com/en/4.2/howto/static-files/
 
 STATIC_URL = 'static/'
+STATIC_ROOT = BASE_DIR / 'staticfiles'
 MEDIA_URL = 'media/'
 MEDIA_ROOT = BASE_DIR / 'media'
 
+# The internal nginx location aliasing MEDIA_ROOT, e.g. '/protected-media/'. When set, serve_media
+# answers with X-Accel-Redirect and nginx sends the file
+MEDIA_ACCEL_REDIRECT = os.environ.get('CSHOP_MEDIA_ACCEL_REDIRECT', '')
+
+# Pre-built sitemap files, served by the web server like media files
+SITEMAP_URL = '/sitemaps/'
+SITEMAP_ROOT = BASE_DIR / 'sitemaps'
+
+STORAGES = {
+    'default': {
+        'BACKEND': 'django.core.files.storage.FileSystemStorage',
+    },
+    # Hashed and precompressed names only exist after collectstatic, so development keeps plain names
+    'staticfiles': {
+        'BACKEND': 'django.contrib.staticfiles.storage.StaticFilesStorage' if DEBUG else 'core.storage.PrecompressedManifestStaticFilesStorage',
+    },
+}
+
 # Default primary key field type
 # https://docs.djangoproject.com/en/4.2/ref/settings/#default-auto-field
 
@@ -1,16 +1,23 @@
+import re
+
 from django.conf import settings
 from django.conf.urls.static import static
 from django.contrib import admin
-from django.urls import path, include
+from django.urls import path, include, re_path
 from django.views.generic.base import TemplateView
 
-from core.views import frontpage, about
+from core.views import frontpage, about, serve_media, static_file
 
 urlpatterns = [
     path('about/', about, name='about'),
     path('admin/', admin.site.urls),
-    path('robots.txt', TemplateView.as_view(template_name='core/robots.txt', content_type='text/plain')),
+    path('%suploads/<path:path>' % settings.MEDIA_URL.lstrip('/'), serve_media, name='media'),
+    path('robots.txt', TemplateView.as_view(template_name='core/robots.txt', content_type='text/plain', extra_context={'sitemap_url': settings.SITEMAP_URL + 'sitemap.xml'})),
     path('', include('userprofile.urls')),
     path('', include('store.urls')),
     path('', frontpage, name='frontpage'),
-] + static(settings.MEDIA_URL, document_root=settings.MEDIA_ROOT)
+] + static(settings.SITEMAP_URL, document_root=settings.SITEMAP_ROOT)
+
+if not settings.DEBUG:
+    # Collected static files, when no web server serves STATIC_ROOT
+    urlpatterns.insert(0, re_path(r'^%s(?P<path>.*)$' % re.escape(settings.STATIC_URL.lstrip('/')), static_file))
@@ -14,3 +14,9 @@ from django.core.wsgi import get_wsgi_application
 os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'CShop.settings')
 
 application = get_wsgi_application()
+
+# Set CSHOP_WARMUP=1 to load URLs, templates and caches before the server forks its workers
+if os.environ.get('CSHOP_WARMUP'):
+    from core.warmup import warm_up
+
+    warm_up()
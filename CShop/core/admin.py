@@ -1,3 +1,11 @@
 from django.contrib import admin
 
-# Register your models here.
+from .models import Job
+from .paginators import EstimatedCountPaginator
+
+@admin.register(Job)
+class JobAdmin(admin.ModelAdmin):
+    list_display = ('task', 'status', 'attempts', 'run_at', 'created_at')
+    list_filter = ('status', 'task')
+    paginator = EstimatedCountPaginator
+    show_full_result_count = False
@@ -0,0 +1,148 @@
+import re
+from pathlib import Path
+
+from django.conf import settings
+
+SOURCE = Path(__file__).resolve().parent / 'assets' / 'tailwind.css'
+BUNDLE = Path(__file__).resolve().parent / 'static' / 'core' / 'css' / 'site.css'
+
+# The files scanned for class names, relative to BASE_DIR, like the content setting of tailwind.config.js
+CONTENT = (
+    '*/templates/**/*.html',
+    '*/templates/**/*.txt',
+    '*/forms.py',
+)
+
+UTILITIES_MARKER = '/* @utilities */'
+
+PSEUDO_VARIANTS = {
+    'hover': ':hover',
+    'focus': ':focus',
+    'active': ':active',
+    'disabled': ':disabled',
+}
+
+# In Tailwind's order, so larger breakpoints override smaller ones
+SCREENS = (
+    ('sm', '640px'),
+    ('md', '768px'),
+    ('lg', '1024px'),
+    ('xl', '1280px'),
+    ('2xl', '1536px'),
+)
+
+RULE_RE = re.compile(r'^\.((?:\\.|[\w-])+)(\S*)\{(.*)\}$')
+TOKEN_RE = re.compile(r'[^\s"\'`<>={}]+')
+COMMENT_RE = re.compile(r'/\*.*?\*/', re.S)
+
+def escape_class(name):
+    """
+    Escapes a class name for use in a CSS selector, e.g. md:w-1/2 becomes md\\:w-1\\/2.
+
+    Args:
+        name (str): The class name.
+
+    Returns:
+        str: The escaped class name.
+
+    """
+    return re.sub(r'([^\w-])', r'\\\1', name)
+
+def load_stylesheet(path=SOURCE):
+    """
+    Reads the vendored stylesheet.
+
+    Args:
+        path (Path, optional): The stylesheet (default is the vendored Tailwind subset).
+
+    Returns:
+        tuple: The base styles as a string and the utilities as an ordered dict of
+               class name -> (selector suffix, declarations).
+
+    """
+    base, _, utilities_css = path.read_text(encoding='utf-8').partition(UTILITIES_MARKER)
+    utilities = {}
+
+    for line in COMMENT_RE.sub('', utilities_css).splitlines():
+        match = RULE_RE.match(line.strip())
+
+        if match:
+            name, suffix, declarations = match.groups()
+            utilities[re.sub(r'\\(.)', r'\1', name)] = (suffix, declarations)
+
+    base = '\n'.join(line.strip() for line in COMMENT_RE.sub('', base).splitlines() if line.strip())
+
+    return base, utilities
+
+def find_class_names(base_dir=None, patterns=CONTENT):
+    """
+    Collects every token that could be a class name from the content files.
+
+    Like Tailwind, this doesn't parse the files: any word is a candidate, so classes built in
+    template conditions or Python strings are found too, and words that are not utilities are
+    dropped later.
+
+    Args:
+        base_dir (Path, optional): The directory the patterns are relative to (default is BASE_DIR).
+        patterns (tuple, optional): The glob patterns of the content files (default is CONTENT).
+
+    Returns:
+        set: The candidate class names.
+
+    """
+    base_dir = Path(base_dir or settings.BASE_DIR)
+    names = set()
+
+    for pattern in patterns:
+        for path in base_dir.glob(pattern):
+            names.update(TOKEN_RE.findall(path.read_text(encoding='utf-8', errors='replace')))
+
+    return names
+
+def build_css(names, path=SOURCE):
+    """
+    Builds the purged stylesheet holding only the utilities and variants used by the given class names.
+
+    Plain and pseudo-class utilities come first, in the order of the vendored stylesheet,
+    followed by one media query per breakpoint, so the cascade matches Tailwind's.
+
+    Args:
+        names (set): The candidate class names.
+        path (Path, optional): The stylesheet (default is the vendored Tailwind subset).
+
+    Returns:
+        tuple: The minified CSS and the sorted list of class names it styles.
+
+    """
+    base, utilities = load_stylesheet(path)
+    order = {name: index for index, name in enumerate(utilities)}
+    screens = dict(SCREENS)
+    rules = {screen: [] for screen in [None] + list(screens)}
+    used = []
+
+    for name in names:
+        *variants, utility = name.split(':')
+
+        if utility not in utilities:
+            continue
+
+        screen = variants.pop(0) if variants and variants[0] in screens else None
+
+        if any(variant not in PSEUDO_VARIANTS for variant in variants):
+            continue
+
+        suffix, declarations = utilities[utility]
+        pseudo = ''.join(PSEUDO_VARIANTS[variant] for variant in variants)
+        selector = '.%s%s%s' % (escape_class(name), pseudo, suffix)
+
+        rules[screen].append((order[utility], len(variants), selector, declarations))
+        used.append(name)
+
+    lines = [base]
+    lines.extend('%s{%s}' % (selector, declarations) for _, _, selector, declarations in sorted(rules[None]))
+
+    for screen, width in SCREENS:
+        if rules[screen]:
+            lines.append('@media (min-width:%s){%s}' % (width, ''.join('%s{%s}' % (selector, declarations) for _, _, selector, declarations in sorted(rules[screen]))))
+
+    return '\n'.join(lines) + '\n', sorted(used)
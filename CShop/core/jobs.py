@@ -0,0 +1,248 @@
+import random
+import time
+import traceback
+import uuid
+from datetime import timedelta
+
+from django.conf import settings
+from django.db import connections
+from django.db.models import F, Q
+from django.utils import timezone
+
+from .models import Job
+
+TASKS = {}
+
+def task(name, max_attempts=None):
+    """
+    Registers a function as a background task.
+
+    Args:
+        name (str): The unique name the task is enqueued under.
+        max_attempts (int, optional): The number of attempts before a job is given up
+                                      (default is the JOB_MAX_ATTEMPTS setting).
+
+    Returns:
+        function: The decorator registering the function.
+
+    """
+    def decorator(func):
+        func.task_name = name
+        func.max_attempts = max_attempts or settings.JOB_MAX_ATTEMPTS
+        TASKS[name] = func
+
+        return func
+
+    return decorator
+
+def _task_name(func_or_name):
+    """
+    Returns the registered name of a task.
+
+    Args:
+        func_or_name (function or str): A registered task function or its name.
+
+    Returns:
+        str: The name of the task.
+
+    Raises:
+        KeyError: If the task is not registered.
+
+    """
+    name = getattr(func_or_name, 'task_name', func_or_name)
+
+    if name not in TASKS:
+        raise KeyError('Unknown task %r.' % name)
+
+    return name
+
+def enqueue(func_or_name, delay=0, run_at=None, **kwargs):
+    """
+    Queues a task to run in the background.
+
+    The job is a plain row, so enqueueing inside a transaction only publishes the job if the transaction commits.
+
+    Args:
+        func_or_name (function or str): A registered task function or its name.
+        delay (int, optional): The number of seconds to wait before the job may run (default is 0).
+        run_at (datetime, optional): When the job may run, instead of a delay.
+        **kwargs: The JSON-serializable keyword arguments of the task.
+
+    Returns:
+        Job: The queued job.
+
+    """
+    name = _task_name(func_or_name)
+
+    return Job.objects.create(
+        task=name,
+        payload=kwargs,
+        max_attempts=TASKS[name].max_attempts,
+        run_at=run_at or timezone.now() + timedelta(seconds=delay),
+    )
+
+def enqueue_many(func_or_name, payloads, batch_size=1000):
+    """
+    Queues many runs of a task with bulk inserts.
+
+    Args:
+        func_or_name (function or str): A registered task function or its name.
+        payloads (iterable): The keyword arguments of every run.
+        batch_size (int, optional): The number of jobs inserted per query (default is 1000).
+
+    Returns:
+        int: The number of queued jobs.
+
+    """
+    name = _task_name(func_or_name)
+    now = timezone.now()
+    jobs = Job.objects.bulk_create(
+        (Job(task=name, payload=payload, max_attempts=TASKS[name].max_attempts, run_at=now) for payload in payloads),
+        batch_size=batch_size,
+    )
+
+    return len(jobs)
+
+def claim(batch_size, lease_seconds):
+    """
+    Claims a batch of runnable jobs for this worker.
+
+    Runnable jobs are queued jobs that are due and running jobs whose lease expired.
+    They are claimed with a single UPDATE that re-checks the same condition, so two workers can
+    never claim the same job, without holding any lock between reading and writing.
+
+    Args:
+        batch_size (int): The maximum number of jobs to claim.
+        lease_seconds (int): How long the claim lasts before other workers may take the jobs over.
+
+    Returns:
+        tuple: The lease token and the list of claimed jobs.
+
+    """
+    now = timezone.now()
+    token = uuid.uuid4().hex
+    runnable = Q(status=Job.QUEUED, run_at__lte=now) | Q(status=Job.RUNNING, locked_until__lt=now)
+    candidates = Job.objects.filter(runnable).order_by('run_at', 'pk').values('pk')[:batch_size]
+
+    claimed = Job.objects.filter(runnable, pk__in=candidates).update(
+        status=Job.RUNNING,
+        lease=token,
+        locked_until=now + timedelta(seconds=lease_seconds),
+        attempts=F('attempts') + 1,
+    )
+
+    if not claimed:
+        return token, []
+
+    return token, list(Job.objects.filter(lease=token))
+
+def retry_delay(attempts):
+    """
+    Returns the exponential backoff before the next attempt of a failed job.
+
+    Args:
+        attempts (int): The number of attempts made so far.
+
+    Returns:
+        float: The number of seconds to wait, with up to 10% jitter so retries don't run in lockstep.
+
+    """
+    delay = min(settings.JOB_RETRY_DELAY * 2 ** (attempts - 1), settings.JOB_MAX_RETRY_DELAY)
+
+    return delay * random.uniform(1, 1.1)
+
+def fail(job, error):
+    """
+    Schedules a failed job for another attempt, or gives it up after its last attempt.
+
+    Args:
+        job (Job): The claimed job.
+        error (str): The traceback of the failure.
+
+    """
+    if job.attempts >= job.max_attempts:
+        changes = {'status': Job.FAILED}
+    else:
+        changes = {'status': Job.QUEUED, 'run_at': timezone.now() + timedelta(seconds=retry_delay(job.attempts))}
+
+    Job.objects.filter(pk=job.pk, lease=job.lease).update(lease='', locked_until=None, last_error=error, **changes)
+
+def run_job(job):
+    """
+    Runs one claimed job.
+
+    Args:
+        job (Job): The claimed job.
+
+    Returns:
+        bool: Whether the job succeeded. A failed job is rescheduled or given up.
+
+    """
+    func = TASKS.get(job.task)
+
+    if func is None:
+        job.attempts = job.max_attempts
+        fail(job, 'Unknown task %r.' % job.task)
+
+        return False
+
+    try:
+        func(**job.payload)
+    except Exception:
+        fail(job, traceback.format_exc())
+
+        return False
+
+    return True
+
+def work(batch_size=None, lease_seconds=None, poll_interval=1.0, until_empty=False, stop=None):
+    """
+    Runs the worker loop: claims a batch, runs it, deletes the finished jobs, repeats.
+
+    Every thread or process of run_worker runs its own loop with its own database connection.
+
+    Args:
+        batch_size (int, optional): The number of jobs claimed at once (default is the JOB_BATCH_SIZE setting).
+        lease_seconds (int, optional): How long a claim lasts, it must cover running the whole batch
+                                       (default is the JOB_LEASE_SECONDS setting).
+        poll_interval (float, optional): The number of seconds to sleep when no job is runnable (default is 1).
+        until_empty (bool, optional): Whether to return once no job is runnable (default is False).
+        stop (Event, optional): An event that ends the loop after the current batch when set.
+
+    Returns:
+        dict: The number of 'succeeded' and 'failed' jobs.
+
+    """
+    batch_size = batch_size or settings.JOB_BATCH_SIZE
+    lease_seconds = lease_seconds or settings.JOB_LEASE_SECONDS
+    succeeded = failed = 0
+
+    try:
+        while stop is None or not stop.is_set():
+            token, jobs = claim(batch_size, lease_seconds)
+
+            if not jobs:
+                if until_empty:
+                    break
+
+                time.sleep(poll_interval)
+                continue
+
+            done = []
+
+            for job in jobs:
+                if run_job(job):
+                    done.append(job.pk)
+                else:
+                    failed += 1
+
+            # A stale worker whose lease was taken over must not delete the new claim
+            Job.objects.filter(pk__in=done, lease=token).delete()
+            succeeded += len(done)
+    finally:
+        connections.close_all()
+
+    return {
+        'succeeded': succeeded,
+        'failed': failed,
+    }
@@ -0,0 +1,402 @@
+import http.cookiejar
+import random
+import threading
+import time
+import urllib.error
+import urllib.parse
+import urllib.request
+from collections import defaultdict
+
+from django.db import connections
+from django.test import Client
+from django.urls import Resolver404, resolve
+
+ACTIONS = ('browse', 'search', 'add_to_cart', 'change_quantity', 'checkout', 'review')
+
+DEFAULT_MIX = {
+    'browse': 50,
+    'search': 20,
+    'add_to_cart': 12,
+    'change_quantity': 8,
+    'checkout': 5,
+    'review': 5,
+}
+
+CHECKOUT_FORM = {
+    'first_name': 'Load',
+    'last_name': 'Test',
+    'address': '1 Test Street',
+    'city': 'Testville',
+}
+
+def parse_mix(value):
+    """
+    Parses an action mix such as "browse=60,search=30,checkout=10".
+
+    Actions that are left out don't run.
+
+    Args:
+        value (str): The comma separated action=weight pairs.
+
+    Returns:
+        dict: The weight per action.
+
+    Raises:
+        ValueError: If an action is unknown or a weight is not a positive number.
+
+    """
+    mix = {}
+
+    for pair in value.split(','):
+        action, _, weight = pair.partition('=')
+        action = action.strip()
+
+        if action not in ACTIONS:
+            raise ValueError('Unknown action %r, expected one of %s.' % (action, ', '.join(ACTIONS)))
+
+        mix[action] = float(weight)
+
+        if mix[action] <= 0:
+            raise ValueError('The weight of %r must be positive.' % action)
+
+    return mix
+
+def percentile(values, fraction):
+    """
+    Returns a percentile of sorted values, using the nearest-rank method.
+
+    Args:
+        values (list): The sorted values.
+        fraction (float): The percentile as a fraction, e.g. 0.95.
+
+    Returns:
+        float: The percentile, or 0 if there are no values.
+
+    """
+    if not values:
+        return 0
+
+    return values[min(len(values) - 1, max(0, int(round(fraction * len(values))) - 1))]
+
+def classify_error(error):
+    """
+    Names the kind of a failed request, so lock contention stands out from other errors.
+
+    Args:
+        error (Exception or str): The exception raised in-process, or the body of an HTTP error response.
+
+    Returns:
+        str: The kind of error.
+
+    """
+    text = str(error)
+
+    if 'database is locked' in text or 'database table is locked' in text:
+        return 'sqlite_locked'
+
+    if isinstance(error, Exception):
+        return type(error).__name__
+
+    return 'server_error'
+
+class Stats:
+    """
+    Collects the latency and errors of every request, from all simulated users.
+
+    Attributes:
+        latencies (dict): The latencies in seconds per URL name.
+        errors (dict): The number of errors per URL name.
+        error_kinds (dict): The number of errors per kind.
+
+    """
+    def __init__(self):
+        self.latencies = defaultdict(list)
+        self.errors = defaultdict(int)
+        self.error_kinds = defaultdict(int)
+        self.lock = threading.Lock()
+
+    def record(self, name, seconds, error=None):
+        """
+        Records one request.
+
+        Args:
+            name (str): The URL name of the request.
+            seconds (float): The latency of the request.
+            error (str, optional): The kind of error, if the request failed.
+
+        """
+        with self.lock:
+            self.latencies[name].append(seconds)
+
+            if error:
+                self.errors[name] += 1
+                self.error_kinds[error] += 1
+
+    def report(self, elapsed):
+        """
+        Summarizes the recorded requests.
+
+        Args:
+            elapsed (float): The duration of the run in seconds.
+
+        Returns:
+            dict: The totals, the throughput, the p50/p95/p99 latency in milliseconds and
+                  the error rate per URL name, and the number of errors per kind.
+
+        """
+        urls = {}
+
+        for name, latencies in sorted(self.latencies.items()):
+            latencies = sorted(latencies)
+            urls[name] = {
+                'requests': len(latencies),
+                'errors': self.errors[name],
+                'error_rate': self.errors[name] / len(latencies),
+                'p50': percentile(latencies, 0.5) * 1000,
+                'p95': percentile(latencies, 0.95) * 1000,
+                'p99': percentile(latencies, 0.99) * 1000,
+            }
+
+        requests = sum(url['requests'] for url in urls.values())
+        errors = sum(url['errors'] for url in urls.values())
+
+        return {
+            'elapsed': elapsed,
+            'requests': requests,
+            'errors': errors,
+            'error_rate': errors / requests if requests else 0,
+            'throughput': requests / elapsed if elapsed else 0,
+            'urls': urls,
+            'error_kinds': dict(self.error_kinds),
+        }
+
+class InProcessTransport:
+    """
+    Sends requests straight to the WSGI handler of this process with the Django test client.
+
+    Attributes:
+        remote_addr (str): The IP address the requests appear to come from, so every shopper
+                           gets its own per-IP rate limits.
+
+    """
+    def __init__(self, remote_addr='127.0.0.1'):
+        self.client = Client(HTTP_HOST='localhost', REMOTE_ADDR=remote_addr)
+
+    def login(self, user, password):
+        self.client.force_login(user)
+
+    def request(self, method, path, data=None):
+        """
+        Sends a request.
+
+        Args:
+            method (str): 'GET' or 'POST'.
+            path (str): The path of the request.
+            data (dict, optional): The form data of a POST request.
+
+        Returns:
+            str: The kind of error, or None if the request succeeded.
+
+        """
+        try:
+            if method == 'POST':
+                response = self.client.post(path, data or {})
+            else:
+                response = self.client.get(path)
+
+            # Streamed listings render their products while the body is read, which is part of the latency
+            if response.streaming:
+                b''.join(response.streaming_content)
+        except Exception as error:
+            return classify_error(error)
+
+        if response.status_code == 429:
+            return 'rate_limited'
+
+        if response.status_code >= 500:
+            return 'server_error'
+
+        return None
+
+class HttpTransport:
+    """
+    Sends requests to a running server over HTTP, keeping cookies like a browser.
+
+    Attributes:
+        base_url (str): The URL of the server, e.g. http://127.0.0.1:8000.
+
+    """
+    def __init__(self, base_url):
+        self.base_url = base_url.rstrip('/')
+        self.cookies = http.cookiejar.CookieJar()
+        self.opener = urllib.request.build_opener(urllib.request.HTTPCookieProcessor(self.cookies))
+
+    def csrf_token(self):
+        for cookie in self.cookies:
+            if cookie.name == 'csrftoken':
+                return cookie.value
+
+        return ''
+
+    def login(self, user, password):
+        self.request('GET', '/login/')
+        self.request('POST', '/login/', {'username': user.username, 'password': password})
+
+    def request(self, method, path, data=None):
+        """
+        Sends a request.
+
+        Args:
+            method (str): 'GET' or 'POST'.
+            path (str): The path of the request.
+            data (dict, optional): The form data of a POST request.
+
+        Returns:
+            str: The kind of error, or None if the request succeeded.
+
+        """
+        url = self.base_url + path
+        body = None
+        headers = {}
+
+        if method == 'POST':
+            if not self.csrf_token():
+                self.opener.open(url).read()
+
+            body = urllib.parse.urlencode(dict(data or {}, csrfmiddlewaretoken=self.csrf_token())).encode()
+            headers = {'X-CSRFToken': self.csrf_token(), 'Referer': url}
+
+        try:
+            with self.opener.open(urllib.request.Request(url, data=body, headers=headers, method=method)) as response:
+                response.read()
+        except urllib.error.HTTPError as error:
+            if error.code == 429:
+                return 'rate_limited'
+
+            if error.code >= 500:
+                return classify_error(error.read().decode(errors='replace'))
+        except OSError as error:
+            return classify_error(error)
+
+        return None
+
+class Shopper:
+    """
+    A simulated shopper picking actions according to the mix.
+
+    Attributes:
+        transport (InProcessTransport or HttpTransport): How requests are sent.
+        catalogue (dict): The 'products' as (id, category slug, slug) and the 'categories' and 'terms' to pick from.
+        stats (Stats): Where requests are recorded.
+        random (Random): The shopper's own random generator.
+
+    """
+    def __init__(self, transport, catalogue, stats, mix, seed):
+        self.transport = transport
+        self.catalogue = catalogue
+        self.stats = stats
+        self.random = random.Random(seed)
+        self.actions = list(mix)
+        self.weights = [mix[action] for action in self.actions]
+        self.cart = []
+
+    def send(self, method, path, data=None):
+        try:
+            name = resolve(urllib.parse.urlsplit(path).path).url_name or path
+        except Resolver404:
+            name = path
+
+        started = time.perf_counter()
+        error = self.transport.request(method, path, data)
+        self.stats.record(name, time.perf_counter() - started, error)
+
+    def product(self):
+        return self.random.choice(self.catalogue['products'])
+
+    def browse(self):
+        page = self.random.random()
+
+        if page < 0.2:
+            self.send('GET', '/')
+        elif page < 0.5 and self.catalogue['categories']:
+            self.send('GET', '/%s/' % self.random.choice(self.catalogue['categories']))
+        else:
+            pk, category_slug, slug = self.product()
+            self.send('GET', '/%s/%s/' % (category_slug, slug))
+
+    def search(self):
+        self.send('GET', '/search/?%s' % urllib.parse.urlencode({'query': self.random.choice(self.catalogue['terms'])}))
+
+    def add_to_cart(self):
+        pk, category_slug, slug = self.product()
+        self.send('GET', '/add-to-cart/%d/' % pk)
+        self.cart.append(pk)
+
+    def change_quantity(self):
+        if not self.cart:
+            return self.add_to_cart()
+
+        action = self.random.choice(('increase', 'increase', 'decrease'))
+        self.send('GET', '/change-quantity/%d/?action=%s' % (self.random.choice(self.cart), action))
+
+    def checkout(self):
+        if not self.cart:
+            self.add_to_cart()
+
+        self.send('GET', '/cart/checkout/')
+        self.send('POST', '/cart/checkout/', CHECKOUT_FORM)
+        self.cart = []
+
+    def review(self):
+        pk, category_slug, slug = self.product()
+        self.send('POST', '/%s/%s/' % (category_slug, slug), {'rating': self.random.randint(1, 5), 'content': 'Load test review.'})
+
+    def run(self, deadline, think_time):
+        """
+        Runs actions until the deadline.
+
+        Args:
+            deadline (float): The time.perf_counter() value at which to stop.
+            think_time (float): The mean pause between actions in seconds.
+
+        """
+        try:
+            while time.perf_counter() < deadline:
+                getattr(self, self.random.choices(self.actions, self.weights)[0])()
+
+                if think_time:
+                    time.sleep(self.random.expovariate(1 / think_time))
+        finally:
+            connections.close_all()
+
+def run_load(transports, catalogue, mix, duration, think_time=0, seed=0):
+    """
+    Runs one simulated shopper per transport in its own thread for a fixed duration.
+
+    Args:
+        transports (list): One logged-in transport per shopper.
+        catalogue (dict): The products, categories and search terms to pick from.
+        mix (dict): The weight per action.
+        duration (float): How long to run in seconds.
+        think_time (float, optional): The mean pause between actions in seconds (default is 0).
+        seed (int, optional): The seed of the shoppers' random generators, for repeatable runs (default is 0).
+
+    Returns:
+        dict: The report of the run, see Stats.report().
+
+    """
+    stats = Stats()
+    started = time.perf_counter()
+    deadline = started + duration
+    threads = [
+        threading.Thread(target=Shopper(transport, catalogue, stats, mix, seed + index).run, args=(deadline, think_time))
+        for index, transport in enumerate(transports)
+    ]
+
+    for thread in threads:
+        thread.start()
+
+    for thread in threads:
+        thread.join()
+
+    return stats.report(time.perf_counter() - started)
@@ -0,0 +1,95 @@
+import os
+import time
+
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+from django.test import RequestFactory
+from django.views.static import serve
+
+from core.media import UPLOADS_PREFIX, content_hash
+from core.views import serve_media
+
+class Command(BaseCommand):
+    """
+    Benchmarks serve_media against django.views.static.serve on an uploaded file.
+
+    Every scenario calls both views directly with the same requests, so the numbers are the cost
+    of the views themselves: a full download, a revalidation by a browser holding the file,
+    and the first 64 KB of the file as a media player would request it.
+
+    """
+    help = 'Benchmarks serve_media against django.views.static.serve on an uploaded file.'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--file', default=None, help='The file below MEDIA_ROOT/uploads (default is the largest one).')
+        parser.add_argument('--requests', type=int, default=2000, help='Requests per scenario and view.')
+
+    def handle(self, *args, **options):
+        path = options['file'] or self.largest_upload()
+        name = UPLOADS_PREFIX + path
+        full_path = os.path.join(settings.MEDIA_ROOT, name)
+
+        if not os.path.isfile(full_path):
+            raise CommandError('%s does not exist.' % full_path)
+
+        factory = RequestFactory()
+        etag = '"%s"' % content_hash(name)
+        last_modified = serve(factory.get('/'), name, document_root=settings.MEDIA_ROOT)['Last-Modified']
+
+        scenarios = (
+            ('full', {}, {}),
+            ('revalidate', {'HTTP_IF_NONE_MATCH': etag}, {'HTTP_IF_MODIFIED_SINCE': last_modified}),
+            ('range 64K', {'HTTP_RANGE': 'bytes=0-65535'}, {'HTTP_RANGE': 'bytes=0-65535'}),
+        )
+
+        self.stdout.write('%s, %d bytes, %d requests per run' % (name, os.path.getsize(full_path), options['requests']))
+        self.stdout.write('%-12s %-12s %10s %12s %8s' % ('scenario', 'view', 'req/s', 'bytes/req', 'status'))
+
+        for scenario, media_headers, static_headers in scenarios:
+            runs = (
+                ('serve_media', lambda request: serve_media(request, path), media_headers),
+                ('static.serve', lambda request: serve(request, name, document_root=settings.MEDIA_ROOT), static_headers),
+            )
+
+            for view_name, view, headers in runs:
+                rate, size, status = self.run(view, factory.get('/', **headers), options['requests'])
+                self.stdout.write('%-12s %-12s %10.0f %12d %8d' % (scenario, view_name, rate, size, status))
+
+        self.stdout.write(self.style.SUCCESS('Done.'))
+
+    def largest_upload(self):
+        root = os.path.join(settings.MEDIA_ROOT, UPLOADS_PREFIX)
+        files = [os.path.join(directory, file) for directory, _, names in os.walk(root) for file in names]
+
+        if not files:
+            raise CommandError('There are no files in %s.' % root)
+
+        return os.path.relpath(max(files, key=os.path.getsize), root)
+
+    def run(self, view, request, count):
+        """
+        Calls a view repeatedly, reading every response body like a WSGI server would.
+
+        Args:
+            view (function): The view, taking the request.
+            request (HttpRequest): The request, reused for every call.
+            count (int): The number of calls.
+
+        Returns:
+            tuple: The requests per second, the bytes sent per request and the last status code.
+
+        """
+        sent = 0
+        started = time.perf_counter()
+
+        for _ in range(count):
+            response = view(request)
+
+            if response.streaming:
+                sent += sum(len(chunk) for chunk in response.streaming_content)
+            else:
+                sent += len(response.content)
+
+            response.close()
+
+        return count / (time.perf_counter() - started), sent // count, response.status_code
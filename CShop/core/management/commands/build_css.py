@@ -0,0 +1,29 @@
+from django.core.management.base import BaseCommand, CommandError
+
+from core.css import BUNDLE, build_css, find_class_names
+
+class Command(BaseCommand):
+    """
+    Builds the stylesheet bundle from the vendored Tailwind subset, keeping only the classes the templates use.
+
+    """
+    help = 'Builds the stylesheet bundle from the vendored Tailwind subset, keeping only the classes the templates use.'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--check', action='store_true', help='Fail if the bundle is out of date instead of writing it.')
+
+    def handle(self, *args, **options):
+        css, used = build_css(find_class_names())
+        current = BUNDLE.read_text(encoding='utf-8') if BUNDLE.exists() else None
+
+        if options['check']:
+            if css != current:
+                raise CommandError('%s is out of date, run build_css.' % BUNDLE)
+
+            self.stdout.write(self.style.SUCCESS('%s is up to date.' % BUNDLE))
+            return
+
+        BUNDLE.parent.mkdir(parents=True, exist_ok=True)
+        BUNDLE.write_text(css, encoding='utf-8')
+
+        self.stdout.write(self.style.SUCCESS('Wrote %d classes to %s (%d bytes).' % (len(used), BUNDLE, len(css.encode()))))
@@ -0,0 +1,108 @@
+import json
+import logging
+from contextlib import nullcontext
+
+from django.contrib.auth.models import User
+from django.core.management.base import BaseCommand, CommandError
+from django.test.utils import override_settings
+
+from core.loadtest import DEFAULT_MIX, HttpTransport, InProcessTransport, parse_mix, run_load
+from store.models import Category, Order, Product
+from store.recommendations import tokenize
+
+USERNAME_PREFIX = 'loadtest-'
+PASSWORD = 'loadtest-password'
+
+class Command(BaseCommand):
+    """
+    Replays simulated shopper sessions against the site and reports throughput and latency per URL.
+
+    Shoppers browse, search, add to cart, change quantities, check out and post reviews according
+    to --mix, either in this process through the WSGI handler or against a running server with --url.
+    Every shopper is a logged-in load test user. The orders, reviews and users created by the run
+    are deleted afterwards unless --keep-data is given, so run it against a copy of the database.
+    In-process runs turn RATE_LIMITS off unless --respect-rate-limits is given: without think time
+    a shopper goes over the per-session limits within seconds, and the run would mostly measure 429s.
+    A server given with --url applies its own limits.
+
+    """
+    help = 'Replays simulated shopper sessions against the site and reports throughput and latency per URL.'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--users', type=int, default=10, help='Number of concurrent simulated shoppers.')
+        parser.add_argument('--duration', type=float, default=30, help='Seconds to run.')
+        parser.add_argument('--mix', default=','.join('%s=%d' % item for item in DEFAULT_MIX.items()), help='Action weights, e.g. browse=60,search=30,checkout=10.')
+        parser.add_argument('--think-time', type=float, default=0, help='Mean pause between actions in seconds.')
+        parser.add_argument('--url', help='Base URL of a running server, e.g. http://127.0.0.1:8000. Runs in-process by default.')
+        parser.add_argument('--seed', type=int, default=0)
+        parser.add_argument('--output', help='Also write the report as JSON to this file, to compare releases.')
+        parser.add_argument('--keep-data', action='store_true', help='Keep the load test users and their orders and reviews.')
+        parser.add_argument('--respect-rate-limits', action='store_true', help='Keep RATE_LIMITS on for in-process runs; rejected requests are reported as rate_limited.')
+
+    def handle(self, *args, **options):
+        try:
+            mix = parse_mix(options['mix'])
+        except ValueError as error:
+            raise CommandError(error)
+
+        products = list(Product.objects.filter(status=Product.ACTIVE).values_list('pk', 'category__slug', 'slug'))
+
+        if not products:
+            raise CommandError('There are no active products to shop for.')
+
+        catalogue = {
+            'products': products,
+            'categories': list(Category.objects.values_list('slug', flat=True)),
+            'terms': sorted({term for title in Product.objects.filter(status=Product.ACTIVE).values_list('title', flat=True) for term in tokenize(title)}) or ['a'],
+        }
+
+        users = []
+
+        for index in range(options['users']):
+            user, created = User.objects.get_or_create(username='%s%d' % (USERNAME_PREFIX, index))
+
+            if created or options['url']:
+                user.set_password(PASSWORD)
+                user.save()
+
+            users.append(user)
+
+        if not options['url']:
+            # Failed requests are counted in the report, their tracebacks would drown it
+            logging.getLogger('django.request').setLevel(logging.CRITICAL)
+
+        transports = []
+
+        for index, user in enumerate(users):
+            transport = HttpTransport(options['url']) if options['url'] else InProcessTransport('10.0.%d.%d' % divmod(index, 256))
+            transport.login(user, PASSWORD)
+            transports.append(transport)
+
+        # The test clients load the middleware on their first request, so they are all sent under the override
+        rate_limits = nullcontext() if options['url'] or options['respect_rate_limits'] else override_settings(RATE_LIMITS={})
+
+        try:
+            with rate_limits:
+                report = run_load(transports, catalogue, mix, options['duration'], options['think_time'], options['seed'])
+        finally:
+            if not options['keep_data']:
+                Order.objects.filter(created_by__username__startswith=USERNAME_PREFIX).delete()
+                User.objects.filter(username__startswith=USERNAME_PREFIX).delete()
+
+        self.print_report(report)
+
+        if options['output']:
+            with open(options['output'], 'w') as output:
+                json.dump(report, output, indent=2)
+
+    def print_report(self, report):
+        self.stdout.write('%-24s %8s %8s %9s %9s %9s' % ('URL name', 'requests', 'errors', 'p50 ms', 'p95 ms', 'p99 ms'))
+
+        for name, url in report['urls'].items():
+            self.stdout.write('%-24s %8d %8d %9.1f %9.1f %9.1f' % (name, url['requests'], url['errors'], url['p50'], url['p95'], url['p99']))
+
+        for kind, count in sorted(report['error_kinds'].items()):
+            self.stdout.write('%s: %d' % (kind, count))
+
+        style = self.style.SUCCESS if not report['errors'] else self.style.WARNING
+        self.stdout.write(style('%(requests)d requests in %(elapsed).1fs, %(throughput).1f requests/s, %(errors)d errors' % report + ' (%.2f%%).' % (100 * report['error_rate'])))
@@ -0,0 +1,57 @@
+from collections import defaultdict
+from datetime import timedelta
+
+from django.core.management.base import BaseCommand
+from django.db.models import Avg, Count, Max, Q
+from django.utils import timezone
+
+from core.models import RequestMemorySample
+
+class Command(BaseCommand):
+    """
+    Summarizes the sampled memory use of requests per view, worst first.
+
+    """
+    help = 'Summarizes the sampled memory use of requests per view, worst first.'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--days', type=int, default=7, help='Only include samples from the last N days.')
+        parser.add_argument('--top', type=int, default=20, help='Number of views to list.')
+        parser.add_argument('--sites', type=int, default=3, help='Allocation sites to list per view.')
+        parser.add_argument('--prune', action='store_true', help='Delete the samples older than --days.')
+
+    def handle(self, *args, **options):
+        since = timezone.now() - timedelta(days=options['days'])
+
+        if options['prune']:
+            deleted, _ = RequestMemorySample.objects.filter(created_at__lt=since).delete()
+            self.stdout.write(self.style.SUCCESS('Deleted %d samples.' % deleted))
+
+            return
+
+        samples = RequestMemorySample.objects.filter(created_at__gte=since)
+        views = list(
+            samples
+            .values('url_name')
+            .annotate(requests=Count('id'), flagged=Count('id', filter=Q(flagged=True)), average=Avg('peak_bytes'), peak=Max('peak_bytes'))
+            .order_by('-peak')[:options['top']]
+        )
+
+        # Sites of every listed view, added up over its samples
+        sites = defaultdict(lambda: defaultdict(int))
+
+        for url_name, top_sites in samples.filter(url_name__in=[view['url_name'] for view in views]).values_list('url_name', 'top_sites').iterator():
+            for site in top_sites:
+                sites[url_name][site['site']] += site['size']
+
+        self.stdout.write('%-28s %8s %8s %12s %12s' % ('URL name', 'samples', 'flagged', 'avg peak MB', 'max peak MB'))
+
+        for view in views:
+            self.stdout.write('%-28s %8d %8d %12.2f %12.2f' % (
+                view['url_name'][:28], view['requests'], view['flagged'], view['average'] / 2 ** 20, view['peak'] / 2 ** 20,
+            ))
+
+            for site, size in sorted(sites[view['url_name']].items(), key=lambda item: -item[1])[:options['sites']]:
+                self.stdout.write('    %10.1f KB  %s' % (size / view['requests'] / 1024, site))
+
+        self.stdout.write(self.style.SUCCESS('%d views sampled since %s.' % (len(views), since.date())))
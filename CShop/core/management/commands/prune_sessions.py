@@ -0,0 +1,18 @@
+from django.core.management.base import BaseCommand
+
+from core.sessions import delete_expired_sessions
+
+class Command(BaseCommand):
+    """
+    Deletes expired sessions in small batches.
+
+    """
+    help = 'Deletes expired sessions in small batches.'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--batch-size', type=int, default=1000)
+
+    def handle(self, *args, **options):
+        deleted = delete_expired_sessions(options['batch_size'])
+
+        self.stdout.write(self.style.SUCCESS('Deleted %d expired sessions.' % deleted))
@@ -0,0 +1,89 @@
+import multiprocessing
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+from django.conf import settings
+from django.core.management.base import BaseCommand
+from django.db import connections
+
+from core.jobs import enqueue_many, work
+from core.models import Job
+from core.tasks import noop
+
+class Command(BaseCommand):
+    """
+    Runs background jobs from the database job queue.
+
+    Every thread or process claims and runs its own batches, so the pool needs no broker
+    and no coordination besides the claim UPDATE. With --benchmark, the given number of no-op jobs
+    is queued and drained and the throughput of the queue itself is reported.
+
+    """
+    help = 'Runs background jobs from the database job queue.'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--concurrency', type=int, default=4, help='Number of threads or processes.')
+        parser.add_argument('--processes', action='store_true', help='Use processes instead of threads.')
+        parser.add_argument('--batch-size', type=int, default=settings.JOB_BATCH_SIZE)
+        parser.add_argument('--lease', type=int, default=settings.JOB_LEASE_SECONDS, help='Seconds a claimed batch is leased for.')
+        parser.add_argument('--poll-interval', type=float, default=1.0)
+        parser.add_argument('--until-empty', action='store_true', help='Exit once no job is runnable.')
+        parser.add_argument('--benchmark', type=int, default=0, metavar='JOBS', help='Queue and drain this many no-op jobs.')
+
+    def handle(self, *args, **options):
+        until_empty = options['until_empty']
+
+        if options['benchmark']:
+            enqueue_many(noop, ({} for _ in range(options['benchmark'])))
+            until_empty = True
+
+        kwargs = {
+            'batch_size': options['batch_size'],
+            'lease_seconds': options['lease'],
+            'poll_interval': options['poll_interval'],
+            'until_empty': until_empty,
+        }
+        concurrency = options['concurrency']
+        started = time.perf_counter()
+
+        if options['processes']:
+            # Forked processes must not share the parent's connection
+            connections.close_all()
+
+            with multiprocessing.Pool(concurrency) as pool:
+                results = pool.map(_work, [kwargs] * concurrency)
+        else:
+            stop = threading.Event()
+
+            with ThreadPoolExecutor(concurrency) as executor:
+                futures = [executor.submit(work, stop=stop, **kwargs) for _ in range(concurrency)]
+
+                try:
+                    results = [future.result() for future in futures]
+                except KeyboardInterrupt:
+                    stop.set()
+                    results = [future.result() for future in futures]
+
+        elapsed = time.perf_counter() - started
+        succeeded = sum(result['succeeded'] for result in results)
+        failed = sum(result['failed'] for result in results)
+
+        self.stdout.write('%d jobs succeeded, %d failed in %.2fs (%.0f jobs/s)' % (succeeded, failed, elapsed, succeeded / elapsed if elapsed else 0))
+
+        if options['benchmark']:
+            left = Job.objects.filter(task=noop.task_name).count()
+            self.stdout.write(self.style.SUCCESS('Benchmark drained %d of %d jobs.' % (options['benchmark'] - left, options['benchmark'])))
+
+def _work(kwargs):
+    """
+    Runs the worker loop in a pool process.
+
+    Args:
+        kwargs (dict): The keyword arguments of work().
+
+    Returns:
+        dict: The number of succeeded and failed jobs.
+
+    """
+    return work(**kwargs)
@@ -0,0 +1,84 @@
+import os
+import re
+import subprocess
+import sys
+import time
+from collections import defaultdict
+
+from django.core.management.base import BaseCommand, CommandError
+
+IMPORT_TIME_RE = re.compile(r'^import time:\s+(\d+) \|\s+(\d+) \|\s+(\S+)$')
+
+STARTUP_CODE = '''
+import django
+django.setup()
+from django.urls import get_resolver
+get_resolver().reverse_dict
+'''
+
+WARMUP_CODE = '''
+from core.warmup import warm_up
+for name, seconds in warm_up().items():
+    print('warm-up %s %.6f' % (name, seconds))
+'''
+
+class Command(BaseCommand):
+    """
+    Reports the import cost of every module loaded while starting the site.
+
+    Starts a fresh interpreter with "python -X importtime" that sets Django up and loads the URL patterns,
+    optionally followed by warm_up(), and ranks the modules by their own or cumulative import time.
+
+    """
+    help = 'Reports the import cost of every module loaded while starting the site.'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--top', type=int, default=25, help='Number of modules to list.')
+        parser.add_argument('--sort', choices=('self', 'cumulative'), default='cumulative')
+        parser.add_argument('--packages', action='store_true', help='Add up the own import time per top-level package.')
+        parser.add_argument('--warmup', action='store_true', help='Also run and time core.warmup.warm_up().')
+
+    def handle(self, *args, **options):
+        env = dict(os.environ, DJANGO_SETTINGS_MODULE=os.environ.get('DJANGO_SETTINGS_MODULE', 'CShop.settings'))
+        code = STARTUP_CODE + (WARMUP_CODE if options['warmup'] else '')
+
+        started = time.perf_counter()
+        result = subprocess.run([sys.executable, '-X', 'importtime', '-c', code], capture_output=True, text=True, env=env)
+        elapsed = time.perf_counter() - started
+
+        if result.returncode:
+            raise CommandError(result.stderr.strip().splitlines()[-1] if result.stderr.strip() else 'Startup failed.')
+
+        modules = []
+
+        for line in result.stderr.splitlines():
+            match = IMPORT_TIME_RE.match(line)
+
+            if match:
+                modules.append((match.group(3), int(match.group(1)), int(match.group(2))))
+
+        if options['packages']:
+            totals = defaultdict(int)
+
+            for name, own, cumulative in modules:
+                totals[name.split('.')[0]] += own
+
+            self.stdout.write('%10s  %s' % ('self ms', 'package'))
+
+            for name, own in sorted(totals.items(), key=lambda item: -item[1])[:options['top']]:
+                self.stdout.write('%10.1f  %s' % (own / 1000, name))
+        else:
+            key = 1 if options['sort'] == 'self' else 2
+
+            self.stdout.write('%10s %10s  %s' % ('self ms', 'total ms', 'module'))
+
+            for name, own, cumulative in sorted(modules, key=lambda module: -module[key])[:options['top']]:
+                self.stdout.write('%10.1f %10.1f  %s' % (own / 1000, cumulative / 1000, name))
+
+        for line in result.stdout.splitlines():
+            if line.startswith('warm-up '):
+                name, seconds = line.split()[1:]
+                self.stdout.write('warm-up %-10s %8.1f ms' % (name, float(seconds) * 1000))
+
+        imports = sum(own for name, own, cumulative in modules)
+        self.stdout.write(self.style.SUCCESS('%d modules imported in %.0f ms, startup took %.0f ms.' % (len(modules), imports / 1000, elapsed * 1000)))
@@ -0,0 +1,48 @@
+import sqlite3
+import time
+
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+
+from core.routers import REPLICA_DB
+
+class Command(BaseCommand):
+    """
+    Copies the sqlite primary database to the replica database.
+
+    Uses the sqlite online backup API, so the copy is consistent while the site keeps writing
+    to the primary. With --interval, the copy is repeated forever to keep the replica fresh.
+
+    """
+    help = 'Copies the sqlite primary database to the replica database.'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--interval', type=float, default=0, help='Repeat the copy every N seconds.')
+
+    def handle(self, *args, **options):
+        if REPLICA_DB not in settings.DATABASES:
+            raise CommandError('No replica database is configured, set CSHOP_REPLICA_DB.')
+
+        primary = settings.DATABASES['default']
+        replica = settings.DATABASES[REPLICA_DB]
+
+        if 'sqlite3' not in primary['ENGINE'] or 'sqlite3' not in replica['ENGINE']:
+            raise CommandError('sync_replica only copies sqlite databases, use the database\'s own replication otherwise.')
+
+        while True:
+            started = time.perf_counter()
+            source = sqlite3.connect(primary['NAME'])
+            target = sqlite3.connect(replica['NAME'], timeout=replica.get('OPTIONS', {}).get('timeout', 5))
+
+            try:
+                source.backup(target)
+            finally:
+                source.close()
+                target.close()
+
+            self.stdout.write(self.style.SUCCESS('Copied %s to %s in %.2fs.' % (primary['NAME'], replica['NAME'], time.perf_counter() - started)))
+
+            if not options['interval']:
+                return
+
+            time.sleep(options['interval'])
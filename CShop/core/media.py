@@ -0,0 +1,143 @@
+import hashlib
+import os
+import re
+
+from django.conf import settings
+from django.core.cache import cache
+from django.core.files.storage import default_storage
+
+# Only files below this directory of MEDIA_ROOT are served, see core.views.serve_media
+UPLOADS_PREFIX = 'uploads/'
+
+# The length of the content hash in versioned URLs
+HASH_LENGTH = 16
+
+RANGE_RE = re.compile(r'^bytes=(\d*)-(\d*)$')
+
+# Files are sent in blocks of this size when the WSGI server can't use sendfile()
+BLOCK_SIZE = 64 * 1024
+
+def content_hash(name, stat=None):
+    """
+    Returns the hash of a media file's content.
+
+    Hashes are cached per file name, size and modification time, so a file is only read again
+    after it changes and every other call costs one stat() and one cache lookup.
+
+    Args:
+        name (str): The name of the file in the default storage.
+        stat (os.stat_result, optional): The stat() of the file, if the caller already has it.
+
+    Returns:
+        str: The first HASH_LENGTH hex digits of the SHA-256 of the file, or None if there is no such file.
+
+    """
+    try:
+        path = default_storage.path(name)
+        stat = stat or os.stat(path)
+    except (NotImplementedError, OSError, ValueError):
+        return None
+
+    key = 'media:hash:%s' % hashlib.md5(name.encode()).hexdigest()
+    signature = (stat.st_size, stat.st_mtime_ns)
+    cached = cache.get(key)
+
+    if cached is not None and cached[0] == signature:
+        return cached[1]
+
+    digest = hashlib.sha256()
+
+    with open(path, 'rb') as file:
+        for block in iter(lambda: file.read(1024 * 1024), b''):
+            digest.update(block)
+
+    value = digest.hexdigest()[:HASH_LENGTH]
+    cache.set(key, (signature, value), None)
+
+    return value
+
+def versioned_url(name):
+    """
+    Returns the URL of a media file with its content hash as the 'v' query parameter.
+
+    The URL changes whenever the content does, so serve_media can mark responses to it immutable.
+
+    Args:
+        name (str): The name of the file in the default storage.
+
+    Returns:
+        str: The versioned URL, the plain URL if the file can't be hashed, or None if there is no name.
+
+    """
+    if not name:
+        return None
+
+    url = default_storage.url(name)
+    version = content_hash(name)
+
+    return '%s?v=%s' % (url, version) if version else url
+
+def parse_range(header, size):
+    """
+    Parses a single byte range of a Range header.
+
+    Multiple ranges are not supported; the caller then answers with the whole file, which RFC 9110 allows.
+
+    Args:
+        header (str): The value of the Range header.
+        size (int): The size of the file.
+
+    Returns:
+        tuple: The first and last byte of the range, None if the header should be ignored,
+               or False if the range can't be satisfied.
+
+    """
+    match = RANGE_RE.match(header.strip())
+
+    if not match or match.groups() == ('', ''):
+        return None
+
+    first, last = match.groups()
+
+    if first == '':
+        # A suffix range: the last N bytes
+        length = int(last)
+
+        if not length or not size:
+            return False
+
+        return max(0, size - length), size - 1
+
+    first = int(first)
+    last = min(int(last), size - 1) if last else size - 1
+
+    if first >= size or first > last:
+        return False
+
+    return first, last
+
+class FileRange:
+    """
+    A read-only view of a byte range of an open file, for streaming a partial response.
+
+    Attributes:
+        file (file): The open file.
+        remaining (int): The number of bytes of the range left to read.
+
+    """
+    def __init__(self, file, first, last):
+        self.file = file
+        self.file.seek(first)
+        self.remaining = last - first + 1
+
+    def read(self, size=-1):
+        if size < 0 or size > self.remaining:
+            size = self.remaining
+
+        data = self.file.read(size)
+        self.remaining -= len(data)
+
+        return data
+
+    def close(self):
+        self.file.close()
@@ -0,0 +1,240 @@
+import logging
+import random
+import threading
+import time
+import tracemalloc
+
+from django.conf import settings
+from django.core.exceptions import MiddlewareNotUsed
+from django.http import HttpResponse
+
+from .ratelimit import client_address, hit
+from .routers import end_request, read_from_replica, start_request
+
+logger = logging.getLogger(__name__)
+
+class ReplicaRoutingMiddleware:
+    """
+    Serves read-only views from the replica database, except right after the visitor wrote something.
+
+    Any write to the primary sets a short-lived cookie pinning the visitor to the primary,
+    so they read their own writes (an added review, a placed order) while the replica catches up.
+
+    """
+    def __init__(self, get_response):
+        self.get_response = get_response
+
+    def __call__(self, request):
+        token = start_request()
+
+        try:
+            response = self.get_response(request)
+        finally:
+            state = end_request(token)
+
+        if state.wrote:
+            response.set_cookie(
+                settings.REPLICA_PIN_COOKIE_NAME,
+                '1',
+                max_age=settings.REPLICA_PIN_SECONDS,
+                httponly=True,
+                samesite='Lax',
+            )
+
+        return response
+
+    def process_view(self, request, view_func, view_args, view_kwargs):
+        if (
+            request.method in ('GET', 'HEAD')
+            and getattr(view_func, 'use_replica', False)
+            and settings.REPLICA_PIN_COOKIE_NAME not in request.COOKIES
+        ):
+            read_from_replica()
+
+class TracedStream:
+    """
+    Iterates over the content of a streamed response and calls a function once it is done.
+
+    The function runs after the last chunk, or when the response is closed early, for example
+    because the client went away. Django closes the response, and with it this iterator,
+    even when the content was never iterated.
+
+    Attributes:
+        content (iterator): The content of the response.
+        on_close (function): The function to call, None once it was called.
+
+    """
+    def __init__(self, content, on_close):
+        self.content = iter(content)
+        self.on_close = on_close
+
+    def __iter__(self):
+        return self
+
+    def __next__(self):
+        try:
+            return next(self.content)
+        except StopIteration:
+            self.close()
+            raise
+
+    def close(self):
+        if self.on_close is not None:
+            on_close, self.on_close = self.on_close, None
+            on_close()
+
+class MemorySamplingMiddleware:
+    """
+    Measures the memory use of a random fraction of requests with tracemalloc.
+
+    Tracing only runs during sampled requests and only one request is traced at a time, because
+    tracemalloc is process-wide: allocations of other threads running at the same time are
+    counted too, so samples from threaded servers are an upper bound.
+    Every sample is stored as a RequestMemorySample; requests peaking at MEMORY_SAMPLE_ALERT_BYTES
+    or more are flagged and logged. Disabled unless MEMORY_SAMPLE_RATE is above 0.
+
+    """
+    lock = threading.Lock()
+
+    def __init__(self, get_response):
+        if not settings.MEMORY_SAMPLE_RATE:
+            raise MiddlewareNotUsed
+
+        self.get_response = get_response
+
+    def __call__(self, request):
+        if random.random() >= settings.MEMORY_SAMPLE_RATE or tracemalloc.is_tracing() or not self.lock.acquire(blocking=False):
+            return self.get_response(request)
+
+        started = time.perf_counter()
+
+        try:
+            tracemalloc.start(settings.MEMORY_SAMPLE_FRAMES)
+            response = self.get_response(request)
+        except BaseException:
+            tracemalloc.stop()
+            self.lock.release()
+            raise
+
+        # A streamed body is rendered while it is sent, so its sample only ends after the last chunk
+        if response.streaming:
+            response.streaming_content = TracedStream(response.streaming_content, lambda: self.finish(request, response, started))
+        else:
+            self.finish(request, response, started)
+
+        return response
+
+    def finish(self, request, response, started):
+        """
+        Ends the sample of a request: stops tracing, records the sample and lets the next request be sampled.
+
+        Args:
+            request (HttpRequest): The sampled request.
+            response (HttpResponse): The response of the request.
+            started (float): The time.perf_counter() value at which the request started.
+
+        """
+        try:
+            try:
+                retained, peak = tracemalloc.get_traced_memory()
+                snapshot = tracemalloc.take_snapshot()
+            finally:
+                tracemalloc.stop()
+
+            self.record(request, response, peak, retained, snapshot, time.perf_counter() - started)
+        finally:
+            self.lock.release()
+
+    def record(self, request, response, peak, retained, snapshot, duration):
+        """
+        Stores a sample and logs it if it is above the alert threshold.
+
+        Args:
+            request (HttpRequest): The sampled request.
+            response (HttpResponse): The response of the request.
+            peak (int): The peak of traced memory in bytes.
+            retained (int): The traced memory still allocated at the end of the request, in bytes.
+            snapshot (Snapshot): The tracemalloc snapshot taken at the end of the request.
+            duration (float): The duration of the request in seconds.
+
+        """
+        from .models import RequestMemorySample
+
+        match = getattr(request, 'resolver_match', None)
+        project = str(settings.BASE_DIR)
+        sites = {}
+
+        # Every allocation is charged to the innermost frame in the project's own code, so the report
+        # points at the view or helper responsible rather than at Django or the standard library
+        for stat in snapshot.filter_traces((tracemalloc.Filter(False, tracemalloc.__file__),)).statistics('traceback'):
+            frame = next((frame for frame in reversed(stat.traceback) if frame.filename.startswith(project)), stat.traceback[-1])
+            site = sites.setdefault('%s:%d' % (frame.filename, frame.lineno), [0, 0])
+            site[0] += stat.size
+            site[1] += stat.count
+
+        flagged = peak >= settings.MEMORY_SAMPLE_ALERT_BYTES
+        sample = RequestMemorySample.objects.create(
+            url_name=(match.url_name if match and match.url_name else request.path)[:255],
+            path=request.path[:2000],
+            method=request.method,
+            status_code=response.status_code,
+            peak_bytes=peak,
+            retained_bytes=retained,
+            duration=duration,
+            top_sites=[
+                {'site': name, 'size': size, 'count': count}
+                for name, (size, count) in sorted(sites.items(), key=lambda item: -item[1][0])[:settings.MEMORY_SAMPLE_TOP_SITES]
+            ],
+            flagged=flagged,
+        )
+
+        if flagged:
+            logger.warning('%s %s peaked at %d bytes of traced memory (sample %d).', request.method, request.path, peak, sample.pk)
+
+class RateLimitMiddleware:
+    """
+    Answers requests over the RATE_LIMITS of their URL name with a 429, before the view runs.
+
+    Every limited route has a limit per IP address and a limit per session, counted in the cache
+    (see core.ratelimit.hit), so clients that drop their cookies are still caught by address and
+    shoppers sharing an address are mostly told apart by session. Behind a reverse proxy listed in
+    RATE_LIMIT_TRUSTED_PROXIES the address is taken from X-Forwarded-For. Routes without limits cost one
+    dict lookup. Disabled when RATE_LIMITS is empty.
+
+    """
+    def __init__(self, get_response):
+        if not settings.RATE_LIMITS:
+            raise MiddlewareNotUsed
+
+        self.get_response = get_response
+        self.limits = settings.RATE_LIMITS
+        self.trusted_proxies = settings.RATE_LIMIT_TRUSTED_PROXIES
+
+    def __call__(self, request):
+        return self.get_response(request)
+
+    def process_view(self, request, view_func, view_args, view_kwargs):
+        route = request.resolver_match.url_name
+        limits = self.limits.get(route)
+
+        if limits is None:
+            return None
+
+        clients = {
+            'ip': client_address(request, self.trusted_proxies),
+            'session': request.COOKIES.get(settings.SESSION_COOKIE_NAME),
+        }
+
+        for scope, (limit, period) in limits.items():
+            if not clients.get(scope):
+                continue
+
+            retry_after = hit('%s:%s:%s' % (route, scope, clients[scope]), limit, period)
+
+            if retry_after:
+                response = HttpResponse('Too many requests, please try again later.', status=429, content_type='text/plain')
+                response['Retry-After'] = str(retry_after)
+
+                return response
+
+        return None
@@ -0,0 +1,29 @@
+# Generated by Django 4.2.1 on 2026-10-18 22:53
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0002_cartsession'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='RequestMemorySample',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('url_name', models.CharField(db_index=True, max_length=255)),
+                ('path', models.CharField(max_length=2000)),
+                ('method', models.CharField(max_length=10)),
+                ('status_code', models.PositiveIntegerField()),
+                ('peak_bytes', models.BigIntegerField()),
+                ('retained_bytes', models.BigIntegerField()),
+                ('duration', models.FloatField()),
+                ('top_sites', models.JSONField(default=list)),
+                ('flagged', models.BooleanField(default=False)),
+                ('created_at', models.DateTimeField(auto_now_add=True, db_index=True)),
+            ],
+        ),
+    ]
@@ -1,3 +1,138 @@
+from django.contrib.sessions.base_session import AbstractBaseSession
 from django.db import models
+from django.utils import timezone
 
-# Create your models here.
+class Job(models.Model):
+    """
+    Represents a unit of background work waiting in the database job queue.
+
+    Workers claim queued jobs with a conditional UPDATE that sets a lease token and a lease expiry.
+    A job whose lease expires, because its worker died, is claimed again by the next worker.
+    Finished jobs are deleted; jobs that failed every attempt stay in the table for inspection.
+
+    Fields:
+        task (CharField): The registered name of the task to run.
+        payload (JSONField): The keyword arguments of the task.
+        status (CharField): The status of the job (queued, running or failed).
+        attempts (PositiveIntegerField): The number of times the job has been claimed.
+        max_attempts (PositiveIntegerField): The number of attempts before the job is given up.
+        run_at (DateTimeField): The date and time from which the job may run.
+        lease (CharField): The token of the claim currently running the job.
+        locked_until (DateTimeField): The date and time when the current claim expires.
+        last_error (TextField): The traceback of the last failed attempt.
+        created_at (DateTimeField): The date and time when the job was enqueued.
+
+    Meta:
+        indexes (list): The indexes used to claim jobs and to load a claimed batch.
+
+    """
+    QUEUED = 'queued'
+    RUNNING = 'running'
+    FAILED = 'failed'
+
+    STATUS_CHOICES = (
+        (QUEUED, 'Queued'),
+        (RUNNING, 'Running'),
+        (FAILED, 'Failed'),
+    )
+
+    task = models.CharField(max_length=255)
+    payload = models.JSONField(default=dict, blank=True)
+    status = models.CharField(max_length=20, choices=STATUS_CHOICES, default=QUEUED)
+    attempts = models.PositiveIntegerField(default=0)
+    max_attempts = models.PositiveIntegerField(default=5)
+    run_at = models.DateTimeField(default=timezone.now)
+    lease = models.CharField(max_length=32, blank=True, default='')
+    locked_until = models.DateTimeField(null=True, blank=True)
+    last_error = models.TextField(blank=True)
+    created_at = models.DateTimeField(auto_now_add=True)
+
+    class Meta:
+        """
+        Metadata for the Job model.
+
+        Attributes:
+            indexes (list): The (status, run_at) index for claiming and the lease index for loading a claim.
+
+        """
+        indexes = [
+            models.Index(fields=['status', 'run_at'], name='job_status_run_at_idx'),
+            models.Index(fields=['lease'], name='job_lease_idx'),
+        ]
+
+    def __str__(self):
+        """
+        Returns a string representation of the job.
+
+        Returns:
+            str: The task and status of the job.
+
+        """
+        return '%s (%s)' % (self.task, self.status)
+
+class CartSession(AbstractBaseSession):
+    """
+    Represents a visitor session stored by the core.sessions engine.
+
+    The payload is stored as raw bytes, zlib-compressed when it is large enough to benefit.
+    The expire_date column is indexed, so expired sessions can be pruned in small batches.
+
+    Fields:
+        session_key (CharField): The key of the session, sent in the session cookie.
+        session_data (BinaryField): The encoded session payload.
+        expire_date (DateTimeField): The date and time when the session expires.
+
+    """
+    session_data = models.BinaryField()
+
+    @classmethod
+    def get_session_store_class(cls):
+        """
+        Returns the session engine storing this model.
+
+        Returns:
+            class: The SessionStore class of core.sessions.
+
+        """
+        from .sessions import SessionStore
+
+        return SessionStore
+
+class RequestMemorySample(models.Model):
+    """
+    Represents the memory use of one request sampled by MemorySamplingMiddleware.
+
+    Fields:
+        url_name (CharField): The URL name of the view, or the path if the URL has no name.
+        path (CharField): The path of the request.
+        method (CharField): The HTTP method of the request.
+        status_code (PositiveIntegerField): The status code of the response.
+        peak_bytes (BigIntegerField): The peak of traced memory during the request.
+        retained_bytes (BigIntegerField): The traced memory still allocated when the response was ready.
+        duration (FloatField): The time spent in the request, in seconds, including the tracing overhead.
+        top_sites (JSONField): The largest allocation sites still alive when the response was ready,
+                               as a list of {'site', 'size', 'count'}.
+        flagged (BooleanField): Whether the peak reached MEMORY_SAMPLE_ALERT_BYTES.
+        created_at (DateTimeField): The date and time of the request.
+
+    """
+    url_name = models.CharField(max_length=255, db_index=True)
+    path = models.CharField(max_length=2000)
+    method = models.CharField(max_length=10)
+    status_code = models.PositiveIntegerField()
+    peak_bytes = models.BigIntegerField()
+    retained_bytes = models.BigIntegerField()
+    duration = models.FloatField()
+    top_sites = models.JSONField(default=list)
+    flagged = models.BooleanField(default=False)
+    created_at = models.DateTimeField(auto_now_add=True, db_index=True)
+
+    def __str__(self):
+        """
+        Returns a string representation of the sample.
+
+        Returns:
+            str: The URL name and peak memory of the request.
+
+        """
+        return '%s: %d bytes' % (self.url_name, self.peak_bytes)
@@ -0,0 +1,116 @@
+from django.core.paginator import EmptyPage, Paginator
+from django.db import connections
+from django.utils.functional import cached_property
+
+# Tables estimated below this many rows are counted exactly
+EXACT_COUNT_LIMIT = 10000
+
+def estimate_count(queryset):
+    """
+    Estimates the number of rows in the table of a queryset without scanning it.
+
+    Args:
+        queryset (QuerySet): The queryset whose table is estimated.
+
+    Returns:
+        int: The estimated number of rows.
+
+    """
+    connection = connections[queryset.db]
+    table = queryset.model._meta.db_table
+
+    with connection.cursor() as cursor:
+        if connection.vendor == 'postgresql':
+            cursor.execute('SELECT reltuples::bigint FROM pg_class WHERE oid = %s::regclass', [table])
+        elif connection.vendor == 'mysql':
+            cursor.execute('SELECT table_rows FROM information_schema.tables WHERE table_schema = DATABASE() AND table_name = %s', [table])
+        else:
+            # The largest rowid bounds the row count and is read from the end of the b-tree
+            cursor.execute('SELECT MAX(_rowid_) FROM %s' % connection.ops.quote_name(table))
+
+        row = cursor.fetchone()
+
+    return max(int(row[0] or 0), 0) if row else 0
+
+class EstimatedCountPaginator(Paginator):
+    """
+    A paginator that doesn't COUNT(*) large unfiltered tables.
+
+    Unfiltered querysets over large tables use the database's row estimate, which is enough
+    to draw the page links. Filtered querysets and small tables are counted exactly.
+
+    """
+    @cached_property
+    def count(self):
+        queryset = self.object_list
+
+        if hasattr(queryset, 'query') and not queryset.query.where:
+            estimate = estimate_count(queryset)
+
+            if estimate >= EXACT_COUNT_LIMIT:
+                return estimate
+
+        return super().count
+
+class CountedPaginator(Paginator):
+    """
+    A paginator whose count is known up front, e.g. from a denormalized counter, so it never runs COUNT(*).
+
+    Every page is read with one row past its end, which shows whether the known count agrees with
+    the object list. A stale count (a page missing rows, a last page followed by more rows, or a page
+    beyond the known count) is replaced with an exact count once, so pages are always cut against
+    the real objects.
+
+    Attributes:
+        known_count (int): The number of objects.
+        recounted (bool): Whether the known count turned out stale and was counted exactly.
+
+    """
+    def __init__(self, object_list, per_page, count, **kwargs):
+        super().__init__(object_list, per_page, **kwargs)
+        self.known_count = count
+        self.recounted = False
+
+    @cached_property
+    def count(self):
+        return self.known_count
+
+    def recount(self):
+        """
+        Replaces the known count with an exact count of the object list.
+
+        """
+        self.known_count = self.object_list.count() if hasattr(self.object_list, 'count') and callable(self.object_list.count) else len(self.object_list)
+        self.recounted = True
+
+        for name in ('count', 'num_pages'):
+            self.__dict__.pop(name, None)
+
+    def validate_number(self, number):
+        try:
+            return super().validate_number(number)
+        except EmptyPage:
+            if self.recounted:
+                raise
+
+            self.recount()
+
+            return super().validate_number(number)
+
+    def page(self, number):
+        number = self.validate_number(number)
+        bottom = (number - 1) * self.per_page
+        top = bottom + self.per_page
+
+        if top + self.orphans >= self.count:
+            top = self.count
+
+        objects = list(self.object_list[bottom:top + 1])
+
+        if len(objects) != top - bottom + (top < self.count) and not self.recounted:
+            self.recount()
+
+            # The page may no longer exist, like get_page() fall back to the last one
+            return self.page(min(number, self.num_pages))
+
+        return self._get_page(objects[:max(top - bottom, 0)], number, self)
@@ -0,0 +1,102 @@
+import ipaddress
+import math
+import time
+
+from django.core.cache import cache
+
+def hit(key, limit, period, now=None):
+    """
+    Counts a request against a sliding window limit and tells whether it is allowed.
+
+    The window is approximated from two fixed windows: the count of the current one plus the count
+    of the previous one weighted by how much of it still overlaps the sliding window. Like a token
+    bucket of `limit` tokens refilled over `period`, this allows short bursts while capping the
+    sustained rate, but it only needs an atomic cache.incr() and one cache.get() per request,
+    so concurrent workers never race on a read-modify-write.
+
+    Args:
+        key (str): Identifies the client and route, e.g. 'search:ip:203.0.113.7'.
+        limit (int): The number of requests allowed per period.
+        period (int): The length of the window in seconds.
+        now (float, optional): The current time.time() (default is now).
+
+    Returns:
+        int: 0 if the request is allowed, otherwise the number of seconds to wait before retrying.
+
+    """
+    now = time.time() if now is None else now
+    window = int(now // period)
+    elapsed = now - window * period
+    current_key = 'ratelimit:%s:%d' % (key, window)
+
+    try:
+        count = cache.incr(current_key)
+    except ValueError:
+        # The previous window must outlive this one by a period, it is read during the next one
+        if cache.add(current_key, 1, 2 * period):
+            count = 1
+        else:
+            count = cache.incr(current_key)
+
+    previous = cache.get('ratelimit:%s:%d' % (key, window - 1), 0)
+    weight = (period - elapsed) / period
+
+    if previous * weight + count <= limit:
+        return 0
+
+    # The wait lasts until the retried request, which counts too, fits under the limit
+    if count < limit and previous:
+        # It fits in this window once enough of the previous one has slid out
+        wait = period * (1 - (limit - count - 1) / previous) - elapsed
+    else:
+        # It fits in the next window once enough of this one has slid out
+        wait = period - elapsed + period * (1 - (limit - 1) / count)
+
+    return max(1, math.ceil(wait))
+
+def client_address(request, trusted_proxies):
+    """
+    Resolves the address of the client that sent a request, looking through trusted proxies.
+
+    REMOTE_ADDR is only replaced when it is a trusted proxy, with the rightmost address of the
+    X-Forwarded-For header that is not a trusted proxy too. Addresses left of it were written by
+    the client itself and could be forged to dodge the limits.
+
+    Args:
+        request (HttpRequest): The request.
+        trusted_proxies (list): IP addresses or networks (e.g. '10.0.0.0/8') of the proxies in front of the site.
+
+    Returns:
+        str: The client's IP address, or None if the request has none.
+
+    """
+    address = request.META.get('REMOTE_ADDR')
+
+    if not trusted_proxies or not address:
+        return address
+
+    networks = [ipaddress.ip_network(proxy, strict=False) for proxy in trusted_proxies]
+
+    def trusted(value):
+        try:
+            ip = ipaddress.ip_address(value)
+        except ValueError:
+            return False
+
+        return any(ip in network for network in networks)
+
+    if not trusted(address):
+        return address
+
+    for forwarded in reversed(request.META.get('HTTP_X_FORWARDED_FOR', '').split(',')):
+        forwarded = forwarded.strip()
+
+        if not forwarded:
+            continue
+
+        address = forwarded
+
+        if not trusted(forwarded):
+            break
+
+    return address
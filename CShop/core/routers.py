@@ -0,0 +1,142 @@
+from contextvars import ContextVar
+
+from django.conf import settings
+from django.db import connections
+
+REPLICA_DB = 'replica'
+
+# Only catalogue data is read from the replica. Sessions and users always come from the primary,
+# so a lagging replica can never log a shopper out or empty their cart.
+REPLICA_APPS = frozenset(('store', 'userprofile'))
+
+_routing = ContextVar('db_routing', default=None)
+
+class RequestRouting:
+    """
+    Holds the database routing state of the current request.
+
+    Attributes:
+        replica (bool): Whether the view may read from the replica.
+        wrote (bool): Whether the request has written to the primary.
+
+    """
+    def __init__(self):
+        self.replica = False
+        self.wrote = False
+
+def start_request():
+    """
+    Starts tracking the routing state of a request.
+
+    Returns:
+        Token: The token restoring the previous state in end_request().
+
+    """
+    return _routing.set(RequestRouting())
+
+def end_request(token):
+    """
+    Stops tracking the routing state of a request.
+
+    Args:
+        token (Token): The token returned by start_request().
+
+    Returns:
+        RequestRouting: The final routing state of the request.
+
+    """
+    state = _routing.get()
+    _routing.reset(token)
+
+    return state
+
+def read_from_replica():
+    """
+    Lets the rest of the current request read catalogue data from the replica.
+
+    """
+    state = _routing.get()
+
+    if state is not None:
+        state.replica = True
+
+def bind_routing(iterable):
+    """
+    Keeps the routing state of the current request while an iterable is consumed after the view returned.
+
+    ReplicaRoutingMiddleware ends the request's routing state as soon as the view returns, before
+    the WSGI server iterates the content of a StreamingHttpResponse, so queries run by the content
+    would otherwise lose the request's replica and read-your-writes decisions.
+
+    Args:
+        iterable (iterable): The content of the streaming response.
+
+    Returns:
+        generator: The items of the iterable, consumed with the routing state of the current request.
+
+    """
+    # Read now: the generator body only runs once the server starts iterating
+    state = _routing.get()
+
+    def generator():
+        token = _routing.set(state)
+
+        try:
+            yield from iterable
+        finally:
+            _routing.reset(token)
+
+    return generator()
+
+def use_replica(view):
+    """
+    Marks a view as safe to serve GET and HEAD requests from the replica.
+
+    Args:
+        view (function): The view function.
+
+    Returns:
+        function: The same view, marked for ReplicaRoutingMiddleware.
+
+    """
+    view.use_replica = True
+
+    return view
+
+class PrimaryReplicaRouter:
+    """
+    Sends reads of replica-safe views to the 'replica' database and everything else to 'default'.
+
+    The replica is only used when it is configured, and never once the request has written
+    to the primary or while a transaction is open on it, so a request always reads its own writes.
+
+    """
+    def db_for_read(self, model, **hints):
+        state = _routing.get()
+
+        if (
+            state is not None
+            and state.replica
+            and not state.wrote
+            and model._meta.app_label in REPLICA_APPS
+            and REPLICA_DB in settings.DATABASES
+            and not connections['default'].in_atomic_block
+        ):
+            return REPLICA_DB
+
+        return 'default'
+
+    def db_for_write(self, model, **hints):
+        state = _routing.get()
+
+        if state is not None:
+            state.wrote = True
+
+        return 'default'
+
+    def allow_relation(self, obj1, obj2, **hints):
+        # The replica is a copy of the primary, so objects from both can be related
+        return True
+
+    def allow_migrate(self, db, app_label, model_name=None, **hints):
+        return db == 'default'
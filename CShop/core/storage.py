@@ -0,0 +1,101 @@
+import gzip
+
+from django.contrib.staticfiles.storage import ManifestStaticFilesStorage
+
+# Encodings tried in order of preference when serving a precompressed file, see core.views.static_file
+ENCODINGS = (
+    ('br', '.br'),
+    ('gzip', '.gz'),
+)
+
+def accepted_encodings(header):
+    """
+    Parses an Accept-Encoding header into the encodings the client takes.
+
+    Args:
+        header (str): The value of the Accept-Encoding header.
+
+    Returns:
+        set: The names of the encodings whose quality is above zero. An acceptable '*' adds
+             every encoding of ENCODINGS that the header doesn't name.
+
+    """
+    qualities = {}
+
+    for part in header.split(','):
+        name, *params = [token.strip() for token in part.split(';')]
+        quality = 1.0
+
+        for param in params:
+            key, _, value = param.partition('=')
+
+            if key.strip().lower() == 'q':
+                try:
+                    quality = float(value)
+                except ValueError:
+                    quality = 0.0
+
+        if name:
+            qualities[name.lower()] = quality
+
+    accepted = {name for name, quality in qualities.items() if quality > 0}
+
+    if qualities.get('*', 0) > 0:
+        accepted.update(name for name, _ in ENCODINGS if name not in qualities)
+
+    return accepted
+
+class PrecompressedManifestStaticFilesStorage(ManifestStaticFilesStorage):
+    """
+    A ManifestStaticFilesStorage that also writes gzip and brotli copies of every text file.
+
+    The copies are written next to the files by collectstatic, once, so neither the web server nor
+    Django compresses static files per request. Brotli copies are only written when the brotli
+    package is installed. Copies that are not smaller than the file are skipped.
+
+    Attributes:
+        compress_extensions (tuple): The extensions of the files worth compressing.
+        compress_min_size (int): Files smaller than this many bytes are not compressed.
+
+    """
+    compress_extensions = ('.css', '.js', '.map', '.svg', '.txt', '.xml', '.json', '.html')
+    compress_min_size = 256
+
+    def post_process(self, paths, dry_run=False, **options):
+        yield from super().post_process(paths, dry_run, **options)
+
+        if dry_run:
+            return
+
+        for name in set(paths) | set(self.hashed_files.values()):
+            if name.endswith(self.compress_extensions) and self.exists(name):
+                self.compress(name)
+
+    def compress(self, name):
+        """
+        Writes the compressed copies of a file.
+
+        Args:
+            name (str): The name of the file in the storage.
+
+        """
+        with self.open(name) as file:
+            data = file.read()
+
+        if len(data) < self.compress_min_size:
+            return
+
+        try:
+            import brotli
+        except ImportError:
+            brotli = None
+
+        copies = {'.gz': gzip.compress(data, compresslevel=9, mtime=0)}
+
+        if brotli is not None:
+            copies['.br'] = brotli.compress(data, quality=11)
+
+        for suffix, compressed in copies.items():
+            if len(compressed) < len(data):
+                with open(self.path(name + suffix), 'wb') as file:
+                    file.write(compressed)
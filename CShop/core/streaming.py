@@ -0,0 +1,94 @@
+import secrets
+from itertools import islice
+
+from django.http import HttpResponse, StreamingHttpResponse
+from django.template.loader import get_template, render_to_string
+from django.utils.safestring import mark_safe
+
+from .routers import bind_routing
+
+# The number of list items rendered and sent per chunk
+STREAM_CHUNK_SIZE = 50
+
+class StreamedList:
+    """
+    Stands in for a list in the page template while the list itself is streamed.
+
+    Templates check 'streamed' and output the marker where the items go, e.g.
+    {% if products.streamed %}{{ products.marker }}{% else %}...{% endif %}.
+
+    Attributes:
+        streamed (bool): Always True.
+        marker (str): The unique HTML comment the page is split on.
+        has_items (bool): The truth value of the list, for {% if products %} checks in the page.
+
+    """
+    streamed = True
+
+    def __init__(self, has_items=True):
+        self.marker = mark_safe('<!-- stream:%s -->' % secrets.token_hex(8))
+        self.has_items = has_items
+
+    def __bool__(self):
+        return self.has_items
+
+def batched(items, size):
+    """
+    Splits an iterable into lists of at most size items.
+
+    Args:
+        items (iterable): The items.
+        size (int): The size of every list but the last.
+
+    Yields:
+        list: The next items.
+
+    """
+    items = iter(items)
+
+    while batch := list(islice(items, size)):
+        yield batch
+
+def stream_render(request, template_name, context, item_template, name='products', has_items=True, chunk_size=STREAM_CHUNK_SIZE):
+    """
+    Renders a page around a long list with a StreamingHttpResponse.
+
+    The page is rendered once with a StreamedList in place of the list, which costs no more than the
+    page without its items, and split on its marker. The part before it (head, navigation, filters)
+    is sent right away, then the items are rendered with item_template chunk by chunk while they are
+    loaded, then the rest of the page. Pass the items as a lazy iterable, e.g. a queryset's
+    .iterator(), so they are never all in memory. Item templates are rendered without context
+    processors, so they only see the chunk as 'name'.
+
+    Args:
+        request (HttpRequest): The request object.
+        template_name (str): The page template.
+        context (dict): The context of the page; context[name] holds the items.
+        item_template (str): The template rendering a chunk of items.
+        name (str, optional): The context variable of the list (default is 'products').
+        has_items (bool, optional): Whether the list is not empty, for {% if %} checks in the page (default is True).
+        chunk_size (int, optional): The number of items rendered per chunk (default is STREAM_CHUNK_SIZE).
+
+    Returns:
+        HttpResponse: The streaming response, or a regular response if the page doesn't show the list.
+
+    """
+    items = context[name]
+    placeholder = StreamedList(has_items)
+    page = render_to_string(template_name, dict(context, **{name: placeholder}), request)
+    head, marker, tail = page.partition(placeholder.marker)
+
+    if not marker:
+        return HttpResponse(page)
+
+    template = get_template(item_template)
+
+    def content():
+        yield head
+
+        for chunk in batched(items, chunk_size):
+            yield template.render({name: chunk})
+
+        yield tail
+
+    return StreamingHttpResponse(bind_routing(content()), content_type='text/html; charset=utf-8')
@@ -0,0 +1,8 @@
+from .jobs import task
+
+@task('core.noop')
+def noop(**kwargs):
+    """
+    Does nothing. Used to measure the overhead of the job queue itself.
+
+    """
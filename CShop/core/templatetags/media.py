@@ -0,0 +1,21 @@
+from django import template
+
+from core.media import versioned_url
+
+register = template.Library()
+
+@register.filter
+def media_url(file):
+    """
+    Returns the content-hashed URL of an uploaded file, which browsers may cache for good.
+
+    Usage: {{ product.image|media_url }}
+
+    Args:
+        file (FieldFile or str): The file, or its name in the default storage.
+
+    Returns:
+        str: The versioned URL of the file, or an empty string if there is no file.
+
+    """
+    return versioned_url(getattr(file, 'name', file)) or ''
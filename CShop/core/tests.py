@@ -1,3 +1,542 @@
-from django.test import TestCase
+import os
+import tempfile
+import tracemalloc
+from datetime import timedelta
+from unittest import mock
 
-# Create your tests here.
+from django.conf import settings
+from django.core.cache import cache
+from django.contrib.auth.models import User
+from django.db import connection, transaction
+from django.http import HttpResponse
+from django.test import RequestFactory, TestCase, TransactionTestCase, override_settings
+from django.test.utils import CaptureQueriesContext
+from django.urls import reverse
+from django.utils import timezone
+
+from .jobs import claim, enqueue, retry_delay, run_job, task, work
+from .loadtest import InProcessTransport
+from .media import content_hash, parse_range, versioned_url
+from .middleware import ReplicaRoutingMiddleware
+from .models import CartSession, Job, RequestMemorySample
+from .ratelimit import client_address, hit
+from .routers import REPLICA_DB, PrimaryReplicaRouter, use_replica
+from .sessions import COMPRESSED, PLAIN, SessionStore, delete_expired_sessions, sessions_expired
+
+from store.models import Category, Product
+
+@task('core.tests.broken')
+def broken(**kwargs):
+    raise RuntimeError('Broken task.')
+
+@task('core.tests.taken_over')
+def taken_over(job_id):
+    # Another worker claims the job while this one is still running it
+    Job.objects.filter(pk=job_id).update(lease='other-worker')
+
+class JobQueueTests(TestCase):
+    def run_due(self, job):
+        """
+        Makes a queued job due again, claims it and runs it, as the next worker loop would.
+
+        """
+        Job.objects.filter(pk=job.pk).update(run_at=timezone.now())
+        token, jobs = claim(10, 60)
+
+        return run_job(jobs[0])
+
+    def test_claim_leases_a_batch(self):
+        for index in range(3):
+            enqueue('core.noop', index=index)
+
+        token, jobs = claim(2, 60)
+
+        self.assertEqual(len(jobs), 2)
+        self.assertTrue(all(job.status == Job.RUNNING and job.lease == token and job.attempts == 1 for job in jobs))
+        self.assertEqual([job.payload['index'] for job in claim(2, 60)[1]], [2])
+        self.assertEqual(claim(2, 60)[1], [])
+
+    def test_claim_skips_jobs_not_due(self):
+        enqueue('core.noop', delay=60)
+
+        self.assertEqual(claim(10, 60)[1], [])
+
+    def test_expired_lease_is_claimed_again(self):
+        job = enqueue('core.noop')
+        first_token, _ = claim(10, 60)
+
+        self.assertEqual(claim(10, 60)[1], [])
+
+        Job.objects.filter(pk=job.pk).update(locked_until=timezone.now() - timedelta(seconds=1))
+        second_token, jobs = claim(10, 60)
+
+        self.assertNotEqual(first_token, second_token)
+        self.assertEqual([(job.lease, job.attempts) for job in jobs], [(second_token, 2)])
+
+    @override_settings(JOB_RETRY_DELAY=10, JOB_MAX_RETRY_DELAY=60)
+    def test_retry_delay_backs_off_exponentially(self):
+        for attempts, delay in ((1, 10), (2, 20), (3, 40), (4, 60), (10, 60)):
+            self.assertTrue(delay <= retry_delay(attempts) <= delay * 1.1)
+
+    def test_failed_job_is_retried_until_max_attempts(self):
+        job = enqueue(broken)
+
+        self.assertEqual(job.max_attempts, settings.JOB_MAX_ATTEMPTS)
+
+        for attempt in range(1, job.max_attempts):
+            started = timezone.now()
+
+            self.assertFalse(self.run_due(job))
+
+            job.refresh_from_db()
+            self.assertEqual((job.status, job.attempts, job.lease), (Job.QUEUED, attempt, ''))
+            self.assertGreaterEqual(job.run_at, started + timedelta(seconds=settings.JOB_RETRY_DELAY * 2 ** (attempt - 1)))
+            self.assertIn('Broken task.', job.last_error)
+
+        self.assertFalse(self.run_due(job))
+
+        job.refresh_from_db()
+        self.assertEqual((job.status, job.attempts), (Job.FAILED, job.max_attempts))
+        self.assertEqual(claim(10, 60)[1], [])
+
+    def test_unknown_task_is_given_up(self):
+        job = Job.objects.create(task='core.tests.missing')
+
+        self.assertFalse(run_job(claim(10, 60)[1][0]))
+
+        job.refresh_from_db()
+        self.assertEqual(job.status, Job.FAILED)
+
+    @mock.patch('core.jobs.connections')
+    def test_work_deletes_finished_jobs(self, connections):
+        enqueue('core.noop')
+        enqueue(broken)
+
+        self.assertEqual(work(until_empty=True), {'succeeded': 1, 'failed': 1})
+        self.assertEqual(list(Job.objects.values_list('task', flat=True)), ['core.tests.broken'])
+
+    @mock.patch('core.jobs.connections')
+    def test_completion_is_guarded_by_the_lease(self, connections):
+        job = enqueue(taken_over, job_id=None)
+        Job.objects.filter(pk=job.pk).update(payload={'job_id': job.pk})
+
+        work(until_empty=True)
+
+        # The job now belongs to the other worker, so the stale worker must not delete it
+        self.assertEqual(Job.objects.get(pk=job.pk).lease, 'other-worker')
+
+    def test_stale_failure_leaves_the_new_claim_alone(self):
+        job = enqueue(broken)
+        _, (stale,) = claim(10, 60)
+        Job.objects.filter(pk=job.pk).update(locked_until=timezone.now() - timedelta(seconds=1))
+        token, _ = claim(10, 60)
+
+        self.assertFalse(run_job(stale))
+
+        job.refresh_from_db()
+        self.assertEqual((job.status, job.lease), (Job.RUNNING, token))
+
+class SessionStoreTests(TestCase):
+    def create(self, **data):
+        store = SessionStore()
+        store.update(data)
+        store.save()
+
+        return store.session_key
+
+    def stored(self, session_key):
+        return bytes(CartSession.objects.get(session_key=session_key).session_data)
+
+    def updates(self, store):
+        with CaptureQueriesContext(connection) as queries:
+            store.save()
+
+        return [query for query in queries.captured_queries if query['sql'].startswith('UPDATE')]
+
+    def test_small_payload_round_trip(self):
+        session_key = self.create(greeting='hello')
+
+        self.assertEqual(self.stored(session_key)[:1], PLAIN)
+        self.assertEqual(SessionStore(session_key)['greeting'], 'hello')
+
+    def test_large_payload_is_compressed(self):
+        cart = {str(pk): {'quantity': 1, 'id': pk} for pk in range(100)}
+        session_key = self.create(cart=cart)
+
+        self.assertEqual(self.stored(session_key)[:1], COMPRESSED)
+        self.assertEqual(SessionStore(session_key)['cart'], cart)
+
+    def test_unchanged_session_is_not_written(self):
+        session_key = self.create(greeting='hello')
+        store = SessionStore(session_key)
+        store['greeting'] = 'hello'
+
+        self.assertEqual(self.updates(store), [])
+
+    def test_changed_session_is_written(self):
+        session_key = self.create(greeting='hello')
+        store = SessionStore(session_key)
+        store['greeting'] = 'goodbye'
+
+        self.assertEqual(len(self.updates(store)), 1)
+        self.assertEqual(SessionStore(session_key)['greeting'], 'goodbye')
+
+    def test_unchanged_session_near_expiry_is_extended(self):
+        session_key = self.create(greeting='hello')
+        CartSession.objects.filter(session_key=session_key).update(expire_date=timezone.now() + timedelta(seconds=60))
+        store = SessionStore(session_key)
+        store['greeting'] = 'hello'
+
+        self.assertEqual(len(self.updates(store)), 1)
+        self.assertGreater(CartSession.objects.get(session_key=session_key).expire_date, timezone.now() + timedelta(seconds=settings.SESSION_COOKIE_AGE / 2))
+
+    def test_expired_session_is_empty(self):
+        session_key = self.create(greeting='hello')
+        CartSession.objects.filter(session_key=session_key).update(expire_date=timezone.now() - timedelta(seconds=1))
+
+        self.assertNotIn('greeting', SessionStore(session_key))
+
+    def test_delete_expired_sessions_in_batches(self):
+        expired = [self.create(index=index) for index in range(5)]
+        current = self.create(index=5)
+        CartSession.objects.filter(session_key__in=expired).update(expire_date=timezone.now() - timedelta(seconds=1))
+        batches = []
+
+        def receiver(sender, sessions, **kwargs):
+            batches.append(sessions)
+
+        sessions_expired.connect(receiver, sender=CartSession)
+        self.addCleanup(sessions_expired.disconnect, receiver, sender=CartSession)
+
+        self.assertEqual(delete_expired_sessions(batch_size=2), 5)
+        self.assertEqual([len(sessions) for sessions in batches], [2, 2, 1])
+        self.assertEqual(sorted(data['index'] for sessions in batches for key, expire_date, data in sessions), [0, 1, 2, 3, 4])
+        self.assertEqual(list(CartSession.objects.values_list('session_key', flat=True)), [current])
+
+class RateLimitTests(TestCase):
+    # The start of a window of 60 seconds
+    START = 6000
+
+    def setUp(self):
+        cache.clear()
+
+    def hits(self, key, times, limit=4):
+        return [hit(key, limit, 60, now=self.START + offset) for offset in times]
+
+    def test_allows_up_to_the_limit(self):
+        results = self.hits('full', [0, 1, 2, 3, 4])
+
+        self.assertEqual(results[:4], [0, 0, 0, 0])
+        self.assertGreater(results[4], 0)
+
+    def test_retry_after_the_window_ends(self):
+        # Over the limit in its own window: the next request fits once 60% of it has slid out
+        *_, retry_after = self.hits('over', [0, 1, 2, 3, 4])
+
+        self.assertEqual(retry_after, 80)
+        self.assertEqual(self.hits('over', [4 + retry_after]), [0])
+
+        *_, retry_after = self.hits('early', [0, 1, 2, 3, 4])
+
+        self.assertGreater(self.hits('early', [4 + retry_after - 1])[0], 0)
+
+    def test_retry_after_within_the_window(self):
+        # Four requests in the previous window weigh 3 a quarter into the next, leaving room for one
+        *_, allowed, retry_after = self.hits('sliding', [0, 1, 2, 3, 75, 75])
+
+        self.assertEqual((allowed, retry_after), (0, 30))
+        self.assertEqual(self.hits('sliding', [75 + retry_after]), [0])
+
+        *_, retry_after = self.hits('early', [0, 1, 2, 3, 75, 75])
+
+        self.assertGreater(self.hits('early', [75 + retry_after - 1])[0], 0)
+
+    def test_recovers_once_the_previous_window_slid_out(self):
+        self.hits('recovered', [0, 1, 2, 3, 4, 5, 6])
+
+        self.assertEqual(self.hits('recovered', [120, 121, 122, 123]), [0, 0, 0, 0])
+
+    def test_keys_are_counted_separately(self):
+        self.hits('first', [0, 1, 2, 3, 4])
+
+        self.assertEqual(self.hits('second', [5]), [0])
+
+@override_settings(RATE_LIMITS={'search': {'ip': (2, 60)}})
+class RateLimitMiddlewareTests(TestCase):
+    def setUp(self):
+        cache.clear()
+
+    def test_rejects_requests_over_the_limit(self):
+        responses = [self.client.get('/search/', {'query': 'hammer'}) for _ in range(3)]
+
+        self.assertEqual([response.status_code for response in responses], [200, 200, 429])
+        self.assertTrue(1 <= int(responses[2]['Retry-After']) <= 120)
+
+    def test_other_routes_are_not_limited(self):
+        for _ in range(3):
+            self.assertEqual(self.client.get('/about/').status_code, 200)
+
+    def test_addresses_are_limited_separately(self):
+        for _ in range(2):
+            self.client.get('/search/', {'query': 'hammer'})
+
+        self.assertEqual(self.client.get('/search/', {'query': 'hammer'}, REMOTE_ADDR='203.0.113.7').status_code, 200)
+
+    @override_settings(RATE_LIMIT_TRUSTED_PROXIES=['127.0.0.1'])
+    def test_clients_behind_a_trusted_proxy_are_limited_separately(self):
+        for _ in range(2):
+            self.client.get('/search/', {'query': 'hammer'}, HTTP_X_FORWARDED_FOR='198.51.100.1')
+
+        self.assertEqual(self.client.get('/search/', {'query': 'hammer'}, HTTP_X_FORWARDED_FOR='198.51.100.1').status_code, 429)
+        self.assertEqual(self.client.get('/search/', {'query': 'hammer'}, HTTP_X_FORWARDED_FOR='198.51.100.2').status_code, 200)
+
+    def test_forwarded_for_is_ignored_without_trusted_proxies(self):
+        for address in ('198.51.100.1', '198.51.100.2'):
+            self.client.get('/search/', {'query': 'hammer'}, HTTP_X_FORWARDED_FOR=address)
+
+        self.assertEqual(self.client.get('/search/', {'query': 'hammer'}, HTTP_X_FORWARDED_FOR='198.51.100.3').status_code, 429)
+
+class ClientAddressTests(TestCase):
+    def address(self, remote_addr, forwarded_for=None, trusted=('10.0.0.0/8',)):
+        request = RequestFactory().get('/', REMOTE_ADDR=remote_addr, **({'HTTP_X_FORWARDED_FOR': forwarded_for} if forwarded_for else {}))
+
+        return client_address(request, list(trusted))
+
+    def test_untrusted_remote_address_is_used(self):
+        self.assertEqual(self.address('203.0.113.7', '198.51.100.1'), '203.0.113.7')
+
+    def test_rightmost_untrusted_forwarded_address_is_used(self):
+        # The client forged the first address, the trusted proxies appended the rest
+        self.assertEqual(self.address('10.0.0.2', '1.2.3.4, 198.51.100.1, 10.0.0.1'), '198.51.100.1')
+
+    def test_trusted_proxy_without_forwarded_for(self):
+        self.assertEqual(self.address('10.0.0.2'), '10.0.0.2')
+
+    def test_no_trusted_proxies(self):
+        self.assertEqual(self.address('10.0.0.2', '198.51.100.1', trusted=()), '10.0.0.2')
+
+@override_settings(MEMORY_SAMPLE_RATE=1, STREAM_LISTINGS=True, RATE_LIMITS={})
+class MemorySamplingTests(TestCase):
+    def test_buffered_response_is_sampled(self):
+        self.client.get('/about/')
+
+        self.assertFalse(tracemalloc.is_tracing())
+        self.assertEqual(RequestMemorySample.objects.get().url_name, 'about')
+
+    def test_streamed_response_is_sampled_after_the_last_chunk(self):
+        response = self.client.get('/')
+
+        self.assertTrue(response.streaming)
+        self.assertTrue(tracemalloc.is_tracing())
+        self.assertFalse(RequestMemorySample.objects.exists())
+
+        b''.join(response.streaming_content)
+
+        self.assertFalse(tracemalloc.is_tracing())
+        self.assertEqual(RequestMemorySample.objects.get().url_name, 'frontpage')
+
+    def test_closed_stream_ends_the_sample(self):
+        response = self.client.get('/')
+        response.close()
+
+        self.assertFalse(tracemalloc.is_tracing())
+        self.assertTrue(RequestMemorySample.objects.exists())
+
+    @override_settings(ALLOWED_HOSTS=['localhost'])
+    def test_load_test_reads_streamed_bodies(self):
+        self.assertIsNone(InProcessTransport().request('GET', '/'))
+
+        # The sample is only recorded once the whole body was read
+        self.assertFalse(tracemalloc.is_tracing())
+        self.assertEqual(RequestMemorySample.objects.get().url_name, 'frontpage')
+
+class ReplicaRoutingTests(TransactionTestCase):
+    # Not a TestCase: its transaction would keep every read on the primary
+    def setUp(self):
+        # Only the setting is needed, the router never opens the replica connection itself
+        replica = override_settings(DATABASES=dict(settings.DATABASES, **{REPLICA_DB: settings.DATABASES['default']}))
+        replica.enable()
+        self.addCleanup(replica.disable)
+
+    def serve(self, method='GET', replica_view=True, write=False, cookies=None):
+        """
+        Runs a request through ReplicaRoutingMiddleware and records where the view's reads were routed.
+
+        Returns:
+            tuple: The response and the databases of a store read, a session read and a store read after the optional write.
+
+        """
+        router = PrimaryReplicaRouter()
+        reads = []
+
+        def view(request):
+            reads.extend([router.db_for_read(Product), router.db_for_read(User)])
+
+            if write:
+                Category.objects.create(title='Tools', slug='tools')
+
+            reads.append(router.db_for_read(Product))
+
+            return HttpResponse()
+
+        if replica_view:
+            view = use_replica(view)
+
+        request = getattr(RequestFactory(), method.lower())('/')
+        request.COOKIES.update(cookies or {})
+        middleware = ReplicaRoutingMiddleware(lambda request: middleware.process_view(request, view, (), {}) or view(request))
+
+        return middleware(request), reads
+
+    def test_replica_view_reads_catalogue_from_the_replica(self):
+        response, reads = self.serve()
+
+        self.assertEqual(reads, [REPLICA_DB, 'default', REPLICA_DB])
+        self.assertNotIn(settings.REPLICA_PIN_COOKIE_NAME, response.cookies)
+
+    def test_other_views_and_methods_read_from_the_primary(self):
+        self.assertEqual(self.serve(replica_view=False)[1], ['default'] * 3)
+        self.assertEqual(self.serve(method='POST')[1], ['default'] * 3)
+
+    def test_write_pins_the_visitor_to_the_primary(self):
+        response, reads = self.serve(write=True)
+        cookie = response.cookies[settings.REPLICA_PIN_COOKIE_NAME]
+
+        # The request reads its own write
+        self.assertEqual(reads, [REPLICA_DB, 'default', 'default'])
+        self.assertEqual(cookie['max-age'], settings.REPLICA_PIN_SECONDS)
+        self.assertTrue(cookie['httponly'])
+
+        # Pinned requests read from the primary until the cookie expires
+        self.assertEqual(self.serve(cookies={settings.REPLICA_PIN_COOKIE_NAME: '1'})[1], ['default'] * 3)
+        self.assertEqual(self.serve()[1], [REPLICA_DB, 'default', REPLICA_DB])
+
+    def test_transactions_read_from_the_primary(self):
+        def view(request):
+            with transaction.atomic():
+                return HttpResponse(PrimaryReplicaRouter().db_for_read(Product))
+
+        middleware = ReplicaRoutingMiddleware(lambda request: middleware.process_view(request, use_replica(view), (), {}) or view(request))
+
+        self.assertEqual(middleware(RequestFactory().get('/')).content, b'default')
+
+    def test_without_replica_everything_reads_from_the_primary(self):
+        with override_settings(DATABASES={'default': settings.DATABASES['default']}):
+            self.assertEqual(self.serve()[1], ['default'] * 3)
+
+    def test_outside_requests_read_from_the_primary(self):
+        self.assertEqual(PrimaryReplicaRouter().db_for_read(Product), 'default')
+
+class ParseRangeTests(TestCase):
+    def test_ranges(self):
+        for header, expected in (
+            ('bytes=0-4', (0, 4)),
+            ('bytes=5-', (5, 9)),
+            ('bytes=5-100', (5, 9)),
+            ('bytes=-3', (7, 9)),
+            ('bytes=-20', (0, 9)),
+        ):
+            self.assertEqual(parse_range(header, 10), expected, header)
+
+    def test_unsatisfiable_ranges(self):
+        for header, size in (('bytes=10-', 10), ('bytes=5-2', 10), ('bytes=-0', 10), ('bytes=-5', 0)):
+            self.assertIs(parse_range(header, size), False, header)
+
+    def test_ignored_ranges(self):
+        for header in ('bytes=0-1,3-4', 'bytes=-', 'items=0-4', 'bytes=a-b'):
+            self.assertIsNone(parse_range(header, 10), header)
+
+@override_settings(MEDIA_ACCEL_REDIRECT='')
+class ServeMediaTests(TestCase):
+    def setUp(self):
+        directory = tempfile.TemporaryDirectory()
+        self.addCleanup(directory.cleanup)
+        os.makedirs(os.path.join(directory.name, 'uploads'))
+
+        with open(os.path.join(directory.name, 'uploads', 'notes.txt'), 'wb') as file:
+            file.write(b'0123456789')
+
+        with open(os.path.join(directory.name, 'secret.txt'), 'wb') as file:
+            file.write(b'secret')
+
+        media = override_settings(MEDIA_ROOT=directory.name)
+        media.enable()
+        self.addCleanup(media.disable)
+        cache.clear()
+
+        self.url = reverse('media', args=['notes.txt'])
+        self.version = content_hash('uploads/notes.txt')
+
+    def get(self, url=None, **headers):
+        response = self.client.get(url or self.url, headers=headers)
+        content = b''.join(response.streaming_content) if response.streaming else response.content
+        response.close()
+
+        return response, content
+
+    def test_whole_file(self):
+        response, content = self.get()
+
+        self.assertEqual((response.status_code, content), (200, b'0123456789'))
+        self.assertEqual((response['ETag'], response['Accept-Ranges']), ('"%s"' % self.version, 'bytes'))
+
+    def test_ranges(self):
+        for header, content_range, expected in (
+            ('bytes=2-4', 'bytes 2-4/10', b'234'),
+            ('bytes=7-', 'bytes 7-9/10', b'789'),
+            ('bytes=-2', 'bytes 8-9/10', b'89'),
+        ):
+            response, content = self.get(Range=header)
+
+            self.assertEqual((response.status_code, response['Content-Range'], response['Content-Length'], content), (206, content_range, str(len(expected)), expected))
+
+    def test_unsatisfiable_range(self):
+        response, content = self.get(Range='bytes=20-')
+
+        self.assertEqual((response.status_code, response['Content-Range'], content), (416, 'bytes */10', b''))
+
+    def test_multiple_ranges_send_the_whole_file(self):
+        response, content = self.get(Range='bytes=0-1,4-5')
+
+        self.assertEqual((response.status_code, content), (200, b'0123456789'))
+
+    def test_stale_if_range_sends_the_whole_file(self):
+        response, content = self.get(Range='bytes=2-4', **{'If-Range': '"stale"'})
+
+        self.assertEqual((response.status_code, content), (200, b'0123456789'))
+
+        response, content = self.get(Range='bytes=2-4', **{'If-Range': '"%s"' % self.version})
+
+        self.assertEqual((response.status_code, content), (206, b'234'))
+
+    def test_etag_answers_304(self):
+        response, content = self.get(**{'If-None-Match': '"%s"' % self.version})
+
+        self.assertEqual((response.status_code, content), (304, b''))
+        self.assertEqual(self.get(**{'If-None-Match': '"stale"'})[0].status_code, 200)
+
+    def test_versioned_url_is_immutable(self):
+        url = versioned_url('uploads/notes.txt')
+
+        self.assertEqual(url, '%s?v=%s' % (self.url, self.version))
+        self.assertIn('immutable', self.get(url)[0]['Cache-Control'])
+
+        response = self.get(self.url + '?v=stale')[0]
+
+        self.assertNotIn('immutable', response['Cache-Control'])
+        self.assertIn('max-age=60', response['Cache-Control'])
+
+    def test_changed_file_changes_the_etag(self):
+        path = os.path.join(settings.MEDIA_ROOT, 'uploads', 'notes.txt')
+
+        with open(path, 'wb') as file:
+            file.write(b'changed')
+
+        os.utime(path, ns=(0, 0))
+
+        self.assertNotEqual(self.get()[0]['ETag'], '"%s"' % self.version)
+
+    def test_missing_and_outside_files(self):
+        self.assertEqual(self.client.get(reverse('media', args=['missing.txt'])).status_code, 404)
+        self.assertEqual(self.client.get(reverse('media', args=['../secret.txt'])).status_code, 404)
+        self.assertEqual(self.client.get(reverse('media', args=['../../settings.py'])).status_code, 404)
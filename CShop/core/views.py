@@ -1,11 +1,38 @@
+import mimetypes
+import os
+import re
+from stat import S_ISREG
+from urllib.parse import quote
+
+from django.conf import settings
+from django.core.exceptions import SuspiciousFileOperation
+from django.http import FileResponse, Http404, HttpResponse
 from django.shortcuts import render
+from django.utils._os import safe_join
+from django.utils.cache import get_conditional_response, patch_cache_control, patch_vary_headers
+from django.utils.http import http_date
 
 from store.models import Product
 
+from .media import BLOCK_SIZE, UPLOADS_PREFIX, FileRange, content_hash, parse_range
+from .routers import use_replica
+from .storage import ENCODINGS, accepted_encodings
+from .streaming import STREAM_CHUNK_SIZE, stream_render
+
+# ManifestStaticFilesStorage names, e.g. core/css/site.3a2b1c4d5e6f.css
+HASHED_NAME_RE = re.compile(r'\.[0-9a-f]{12}\.\w+$')
+
+# A year, the longest lifetime caches are expected to honour
+IMMUTABLE_MAX_AGE = 31536000
+
+@use_replica
 def frontpage(request):
     """
     Display the homepage with a list of active products.
 
+    With STREAM_LISTINGS on, the page is streamed and the products are sent while they are read
+    with a chunked iterator, so the whole catalogue is never held in memory.
+
     Parameters:
         request (HttpRequest): The HttpRequest object representing the user's request.
 
@@ -14,6 +41,11 @@ def frontpage(request):
 
     """
     products = Product.objects.filter(status=Product.ACTIVE)
+
+    if settings.STREAM_LISTINGS:
+        return stream_render(request, 'core/frontpage.html', {
+            'products': products.select_related('category').iterator(chunk_size=STREAM_CHUNK_SIZE)
+        }, 'store/partials/product_cards.html')
     
     return render(request, 'core/frontpage.html', {
         'products': products
@@ -30,4 +62,141 @@ def about(request):
         HttpResponse: The HttpResponse object containing the content of the about page.
 
     """
-    return render(request, 'core/about.html')
\ No newline at end of file
+    return render(request, 'core/about.html')
+
+def static_file(request, path):
+    """
+    Serves a collected static file, for deployments without a web server in front of Django.
+
+    The brotli or gzip copy written by collectstatic is sent when the client accepts it.
+    Hashed file names never change content, so they are cached for a year without revalidation;
+    other files are cached briefly and revalidated with Last-Modified.
+
+    Parameters:
+        request (HttpRequest): The HttpRequest object representing the user's request.
+        path (str): The path of the file below STATIC_ROOT.
+
+    Returns:
+        HttpResponse: The FileResponse with the file, or a 304 response.
+
+    Raises:
+        Http404: If the file does not exist.
+
+    """
+    try:
+        full_path = safe_join(settings.STATIC_ROOT, path)
+    except SuspiciousFileOperation:
+        raise Http404
+
+    if not os.path.isfile(full_path):
+        raise Http404
+
+    last_modified = os.stat(full_path).st_mtime
+    response = get_conditional_response(request, last_modified=int(last_modified))
+
+    if response is None:
+        content_type = mimetypes.guess_type(full_path)[0] or 'application/octet-stream'
+        accepted = accepted_encodings(request.headers.get('Accept-Encoding', ''))
+        encoding = None
+
+        for name, suffix in ENCODINGS:
+            if name in accepted and os.path.isfile(full_path + suffix):
+                encoding = name
+                full_path += suffix
+                break
+
+        response = FileResponse(open(full_path, 'rb'), content_type=content_type)
+
+        if encoding:
+            response['Content-Encoding'] = encoding
+
+        response['Last-Modified'] = http_date(last_modified)
+
+    patch_vary_headers(response, ['Accept-Encoding'])
+
+    if HASHED_NAME_RE.search(path):
+        patch_cache_control(response, public=True, max_age=IMMUTABLE_MAX_AGE, immutable=True)
+    else:
+        patch_cache_control(response, public=True, max_age=60)
+
+    return response
+
+def serve_media(request, path):
+    """
+    Serves an uploaded media file with validators, range requests and long-lived caching.
+
+    The strong ETag is the content hash of the file, so conditional requests are answered with a 304
+    without sending the file. URLs carrying the current hash as 'v' (see core.media.versioned_url)
+    are cached for a year as immutable.
+    With MEDIA_ACCEL_REDIRECT set, the file is handed to nginx through X-Accel-Redirect.
+    Otherwise whole files go out as a FileResponse, which WSGI servers with a file wrapper send
+    with sendfile(), and single byte ranges are answered with a 206.
+
+    Parameters:
+        request (HttpRequest): The HttpRequest object representing the user's request.
+        path (str): The path of the file below MEDIA_ROOT/uploads.
+
+    Returns:
+        HttpResponse: The file, a part of it, a 304, a 412 or a 416 response.
+
+    Raises:
+        Http404: If the file does not exist.
+
+    """
+    name = UPLOADS_PREFIX + path
+
+    try:
+        # Joined below the uploads directory, so '..' can't reach other files of MEDIA_ROOT
+        full_path = safe_join(os.path.join(settings.MEDIA_ROOT, UPLOADS_PREFIX), path)
+    except SuspiciousFileOperation:
+        raise Http404
+
+    try:
+        stat = os.stat(full_path)
+    except OSError:
+        raise Http404
+
+    if not S_ISREG(stat.st_mode):
+        raise Http404
+
+    version = content_hash(name, stat)
+    etag = '"%s"' % version
+    response = get_conditional_response(request, etag=etag, last_modified=int(stat.st_mtime))
+
+    if response is None:
+        content_type = mimetypes.guess_type(full_path)[0] or 'application/octet-stream'
+
+        if settings.MEDIA_ACCEL_REDIRECT:
+            response = HttpResponse(content_type=content_type)
+            response['X-Accel-Redirect'] = quote(settings.MEDIA_ACCEL_REDIRECT + name)
+        else:
+            byte_range = None
+            if_range = request.headers.get('If-Range')
+
+            if 'Range' in request.headers and if_range in (None, etag, http_date(int(stat.st_mtime))):
+                byte_range = parse_range(request.headers['Range'], stat.st_size)
+
+            if byte_range is False:
+                response = HttpResponse(status=416, content_type=content_type)
+                response['Content-Range'] = 'bytes */%d' % stat.st_size
+            elif byte_range:
+                first, last = byte_range
+                response = FileResponse(FileRange(open(full_path, 'rb'), first, last), status=206, content_type=content_type)
+                response['Content-Length'] = last - first + 1
+                response['Content-Range'] = 'bytes %d-%d/%d' % (first, last, stat.st_size)
+            else:
+                response = FileResponse(open(full_path, 'rb'), content_type=content_type)
+
+            response.block_size = BLOCK_SIZE
+
+        response['Accept-Ranges'] = 'bytes'
+        response['Last-Modified'] = http_date(stat.st_mtime)
+
+    response['ETag'] = etag
+
+    if request.GET.get('v') == version:
+        patch_cache_control(response, public=True, max_age=IMMUTABLE_MAX_AGE, immutable=True)
+    else:
+        patch_cache_control(response, public=True, max_age=60)
+
+    return response
@@ -0,0 +1,83 @@
+import importlib
+import logging
+import time
+from pathlib import Path
+
+from django.apps import apps
+from django.db import connections
+from django.template import engines
+from django.urls import get_resolver
+
+logger = logging.getLogger(__name__)
+
+WARMUP_APPS = ('core', 'store', 'userprofile')
+
+# Imported lazily by the code that needs them, but worth loading once in the parent of forked workers
+PRELOAD_MODULES = ('PIL.Image', 'PIL.JpegImagePlugin', 'PIL.PngImagePlugin')
+
+def compile_templates(app_labels=WARMUP_APPS):
+    """
+    Loads every template of the given apps, so cached loaders keep them compiled.
+
+    Args:
+        app_labels (tuple, optional): The apps whose templates are compiled (default is WARMUP_APPS).
+
+    Returns:
+        int: The number of compiled templates.
+
+    """
+    compiled = 0
+
+    for label in app_labels:
+        directory = Path(apps.get_app_config(label).path) / 'templates'
+
+        for path in sorted(directory.rglob('*')):
+            if not path.is_file():
+                continue
+
+            name = path.relative_to(directory).as_posix()
+
+            for engine in engines.all():
+                engine.get_template(name)
+
+            compiled += 1
+
+    return compiled
+
+def warm_up():
+    """
+    Pays the one-off costs of the first requests before the process serves traffic.
+
+    Call it from wsgi.py or asgi.py after the application is created, before the server forks workers,
+    so every worker inherits the warm state. It preloads lazily imported modules and the URL patterns,
+    compiles the templates of the site's apps, checks the database connections and primes the
+    menu and catalogue version caches.
+
+    Database connections can't be shared with forked workers, so they are opened to check the
+    database and closed again; each worker opens its own on its first query.
+
+    Returns:
+        dict: The time spent on every step, in seconds.
+
+    """
+    from store.search import get_catalogue_version
+    from store.templatetags.menu import get_menu_categories
+
+    timings = {}
+
+    def step(name, func):
+        started = time.perf_counter()
+        func()
+        timings[name] = time.perf_counter() - started
+
+    step('imports', lambda: [importlib.import_module(module) for module in PRELOAD_MODULES])
+    step('urls', lambda: get_resolver().reverse_dict)
+    step('templates', compile_templates)
+    step('database', lambda: [connections[alias].ensure_connection() for alias in connections])
+    step('caches', lambda: (get_catalogue_version(), get_menu_categories()))
+
+    connections.close_all()
+
+    logger.info('Warm-up done in %.2fs: %s', sum(timings.values()), ', '.join('%s %.3fs' % item for item in timings.items()))
+
+    return timings
@@ -1,8 +1,121 @@
-from django.contrib import admin
+from django.contrib import admin, messages
+from django.db import transaction
+from django.utils import timezone
 
-from .models import Category, Product, Order, OrderItem
+from core.paginators import EstimatedCountPaginator
+from userprofile.stats import adjust_product_count
 
-admin.site.register(Category)
-admin.site.register(Product)
-admin.site.register(Order)
-admin.site.register(OrderItem)
\ No newline at end of file
+from .models import AbandonedCart, ArchivedOrder, Category, Product, Order, OrderItem
+from .search import bump_catalogue_version
+
+@admin.register(Category)
+class CategoryAdmin(admin.ModelAdmin):
+    list_display = ('title', 'parent', 'depth')
+    list_select_related = ('parent',)
+    search_fields = ('title',)
+    autocomplete_fields = ('parent',)
+    prepopulated_fields = {'slug': ('title',)}
+
+@admin.action(description='Approve selected products waiting for approval')
+def approve_products(modeladmin, request, queryset):
+    """
+    Activates the selected products that are waiting for approval, with a single UPDATE.
+
+    Args:
+        modeladmin (ProductAdmin): The product admin.
+        request (HttpRequest): The request object.
+        queryset (QuerySet): The selected products.
+
+    """
+    queryset = queryset.filter(status=Product.WAITING_APPROVAL)
+
+    with transaction.atomic():
+        adjust_product_count(queryset, 1)
+        updated = queryset.update(
+            status=Product.ACTIVE,
+            similar_products_stale=True,
+            updated_at=timezone.now(),
+        )
+
+    bump_catalogue_version()
+
+    modeladmin.message_user(request, '%d product%s approved.' % (updated, '' if updated == 1 else 's'), messages.SUCCESS)
+
+@admin.action(description='Restore selected deleted products')
+def restore_products(modeladmin, request, queryset):
+    """
+    Makes the selected deleted products active again, with a single UPDATE.
+
+    Args:
+        modeladmin (ProductAdmin): The product admin.
+        request (HttpRequest): The request object.
+        queryset (QuerySet): The selected products.
+
+    """
+    queryset = queryset.filter(status=Product.DELETED)
+
+    with transaction.atomic():
+        adjust_product_count(queryset, 1)
+        updated = queryset.update(
+            status=Product.ACTIVE,
+            similar_products_stale=True,
+            updated_at=timezone.now(),
+        )
+
+    bump_catalogue_version()
+
+    modeladmin.message_user(request, '%d product%s restored.' % (updated, '' if updated == 1 else 's'), messages.SUCCESS)
+
+@admin.register(Product)
+class ProductAdmin(admin.ModelAdmin):
+    list_display = ('title', 'user', 'category', 'price', 'stock', 'status', 'created_at')
+    list_select_related = ('user', 'category')
+    list_filter = ('status', 'created_at')
+    search_fields = ('title',)
+    autocomplete_fields = ('user', 'category')
+    readonly_fields = ('average_rating', 'review_count')
+    actions = (approve_products, restore_products)
+    paginator = EstimatedCountPaginator
+    show_full_result_count = False
+
+class OrderItemInline(admin.TabularInline):
+    model = OrderItem
+    raw_id_fields = ('product',)
+    extra = 0
+
+@admin.register(Order)
+class OrderAdmin(admin.ModelAdmin):
+    list_display = ('id', 'first_name', 'last_name', 'created_by', 'item_count', 'paid_amount', 'created_at')
+    list_select_related = ('created_by',)
+    list_filter = ('created_at',)
+    raw_id_fields = ('created_by',)
+    inlines = (OrderItemInline,)
+    paginator = EstimatedCountPaginator
+    show_full_result_count = False
+
+@admin.register(OrderItem)
+class OrderItemAdmin(admin.ModelAdmin):
+    list_display = ('id', 'order', 'product', 'quantity', 'price')
+    list_select_related = ('order', 'product')
+    raw_id_fields = ('order', 'product')
+    paginator = EstimatedCountPaginator
+    show_full_result_count = False
+
+@admin.register(ArchivedOrder)
+class ArchivedOrderAdmin(admin.ModelAdmin):
+    list_display = ('id', 'created_by', 'item_count', 'paid_amount', 'created_at', 'archived_at')
+    list_select_related = ('created_by',)
+    list_filter = ('created_at',)
+    raw_id_fields = ('created_by',)
+    exclude = ('data',)
+    paginator = EstimatedCountPaginator
+    show_full_result_count = False
+
+@admin.register(AbandonedCart)
+class AbandonedCartAdmin(admin.ModelAdmin):
+    list_display = ('id', 'user', 'item_count', 'value', 'abandoned_at')
+    list_select_related = ('user',)
+    list_filter = ('abandoned_at',)
+    raw_id_fields = ('user',)
+    paginator = EstimatedCountPaginator
+    show_full_result_count = False
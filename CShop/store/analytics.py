@@ -0,0 +1,180 @@
+from datetime import timedelta
+
+from django.db import transaction
+from django.db.models import Sum
+from django.db.models.functions import TruncDate
+from django.utils import timezone
+
+from .models import BatchCursor, Order, OrderItem, VendorDailySales
+from .recommendations import ORDER_SETTLE_TIME
+
+SALES_CURSOR = 'vendor-daily-sales'
+
+def add_daily_sales(order_ids):
+    """
+    Adds the sales of a batch of orders to the rollup table.
+
+    The batch is aggregated per (product, vendor, day) by a single grouped query in the database,
+    then merged into the existing rows and written back with one upsert.
+
+    Args:
+        order_ids (list): The ids of the orders to add.
+
+    Returns:
+        int: The number of rollup rows written.
+
+    """
+    sales = (
+        OrderItem.objects
+        .filter(order_id__in=order_ids)
+        .annotate(day=TruncDate('order__created_at'))
+        .values('product_id', 'product__user_id', 'day')
+        .annotate(revenue=Sum('price'), units=Sum('quantity'))
+        .order_by()
+    )
+    rows = {
+        (row['product_id'], row['day']): VendorDailySales(
+            vendor_id=row['product__user_id'],
+            product_id=row['product_id'],
+            day=row['day'],
+            revenue=row['revenue'],
+            units=row['units'],
+        )
+        for row in sales
+    }
+
+    if not rows:
+        return 0
+
+    existing = (
+        VendorDailySales.objects
+        .filter(product_id__in={product_id for product_id, day in rows}, day__in={day for product_id, day in rows})
+        .values_list('product_id', 'day', 'revenue', 'units')
+    )
+
+    for product_id, day, revenue, units in existing:
+        row = rows.get((product_id, day))
+
+        if row is not None:
+            row.revenue += revenue
+            row.units += units
+
+    VendorDailySales.objects.bulk_create(
+        rows.values(),
+        batch_size=500,
+        update_conflicts=True,
+        unique_fields=['product', 'day'],
+        update_fields=['revenue', 'units'],
+    )
+
+    return len(rows)
+
+def rollup_sales(full=False, batch_size=1000):
+    """
+    Rolls the order items of new orders up into daily sales per product.
+
+    Orders are processed in id order after the position stored in the 'vendor-daily-sales' BatchCursor,
+    one batch per transaction. Each transaction moves the cursor first and only if it still points where
+    this run read it, so two runs at the same time can never count the same orders twice.
+
+    Args:
+        full (bool, optional): Whether to discard the rollup and rebuild it from all orders (default is False).
+                               Orders moved to the archive are not part of a full rebuild.
+        batch_size (int, optional): The number of orders processed per transaction (default is 1000).
+
+    Returns:
+        dict: The number of processed orders and written rollup rows.
+
+    """
+    cursor, _ = BatchCursor.objects.get_or_create(name=SALES_CURSOR)
+
+    if full:
+        with transaction.atomic():
+            VendorDailySales.objects.all().delete()
+            cursor.position = 0
+            cursor.save()
+
+    settled = timezone.now() - ORDER_SETTLE_TIME
+    position = cursor.position
+    orders = rows = 0
+
+    while True:
+        order_ids = list(
+            Order.objects
+            .filter(pk__gt=position, created_at__lte=settled)
+            .order_by('pk')
+            .values_list('pk', flat=True)[:batch_size]
+        )
+
+        if not order_ids:
+            break
+
+        with transaction.atomic():
+            if not BatchCursor.objects.filter(name=SALES_CURSOR, position=position).update(position=order_ids[-1]):
+                # Another run already took this batch
+                break
+
+            rows += add_daily_sales(order_ids)
+
+        orders += len(order_ids)
+        position = order_ids[-1]
+
+    return {
+        'orders': orders,
+        'rows': rows,
+    }
+
+def sales_report(vendor, start, end):
+    """
+    Builds a vendor's sales report over a date range from a single query on the rollup table.
+
+    Args:
+        vendor (User): The vendor.
+        start (date): The first day of the range.
+        end (date): The last day of the range.
+
+    Returns:
+        dict: The 'days' of the range with their revenue, units and bar height (in percent of the best day),
+              the 'products' ordered by revenue, and the 'revenue' and 'units' totals.
+
+    """
+    rows = (
+        VendorDailySales.objects
+        .filter(vendor=vendor, day__range=(start, end))
+        .values_list('day', 'product_id', 'product__title', 'revenue', 'units')
+    )
+    days = {}
+    products = {}
+
+    for day, product_id, title, revenue, units in rows:
+        day_totals = days.setdefault(day, [0, 0])
+        day_totals[0] += revenue
+        day_totals[1] += units
+
+        product = products.setdefault(product_id, {'id': product_id, 'title': title, 'revenue': 0, 'units': 0})
+        product['revenue'] += revenue
+        product['units'] += units
+
+    best = max((revenue for revenue, units in days.values()), default=0)
+    series = []
+
+    # Counting the days rather than adding them up to end can't step past date.max
+    for offset in range((end - start).days + 1):
+        day = start + timedelta(days=offset)
+        revenue, units = days.get(day, (0, 0))
+        series.append({
+            'day': day,
+            'revenue': revenue / 100,
+            'units': units,
+            'height': round(100 * revenue / best) if best else 0,
+        })
+
+    for product in products.values():
+        product['revenue'] /= 100
+
+    return {
+        'days': series,
+        'products': sorted(products.values(), key=lambda product: (-product['revenue'], product['title'])),
+        'revenue': sum(revenue for revenue, units in days.values()) / 100,
+        'units': sum(units for revenue, units in days.values()),
+    }
@@ -0,0 +1,387 @@
+import base64
+import binascii
+import hashlib
+from functools import wraps
+
+from django.contrib.auth.models import User
+from django.http import Http404, JsonResponse
+from django.utils.cache import get_conditional_response, patch_cache_control
+from django.views.decorators.gzip import gzip_page
+from django.views.decorators.http import require_GET
+
+from core.media import versioned_url
+
+from .models import Category, Product, Review, subtree_filter
+from .search import get_catalogue_version
+
+DEFAULT_LIMIT = 20
+MAX_LIMIT = 100
+
+JSON_OPTIONS = {'separators': (',', ':')}
+
+# The largest id a database integer column can hold; larger values overflow the query parameters
+MAX_ID = 2 ** 63 - 1
+
+def parse_id(value):
+    """
+    Parses a database id from a client.
+
+    Args:
+        value (str, bytes or int): The id.
+
+    Returns:
+        int: The id.
+
+    Raises:
+        ValueError: If the value is not a positive integer a database column can hold.
+
+    """
+    value = int(value)
+
+    if not 0 < value <= MAX_ID:
+        raise ValueError('Id out of range: %d.' % value)
+
+    return value
+
+# Every public field maps to the columns it needs and a function building its value from a values() row,
+# so a sparse fieldset only selects and joins what it returns.
+PRODUCT_FIELDS = {
+    'id': (('id',), lambda row: row['id']),
+    'title': (('title',), lambda row: row['title']),
+    'slug': (('slug',), lambda row: row['slug']),
+    'description': (('description',), lambda row: row['description']),
+    'price': (('price',), lambda row: row['price']),
+    'rating': (('average_rating',), lambda row: round(row['average_rating'], 2)),
+    'review_count': (('review_count',), lambda row: row['review_count']),
+    'image': (('image',), lambda row: versioned_url(row['image'])),
+    'thumbnail': (('thumbnail',), lambda row: versioned_url(row['thumbnail'])),
+    'category': (
+        ('category__id', 'category__slug', 'category__title'),
+        lambda row: {'id': row['category__id'], 'slug': row['category__slug'], 'title': row['category__title']},
+    ),
+    'vendor': (
+        ('user__id', 'user__username'),
+        lambda row: {'id': row['user__id'], 'username': row['user__username']},
+    ),
+    'created_at': (('created_at',), lambda row: row['created_at'].isoformat()),
+    'updated_at': (('updated_at',), lambda row: row['updated_at'].isoformat()),
+}
+
+CATEGORY_FIELDS = {
+    'id': (('id',), lambda row: row['id']),
+    'title': (('title',), lambda row: row['title']),
+    'slug': (('slug',), lambda row: row['slug']),
+    'parent': (('parent_id',), lambda row: row['parent_id']),
+    'path': (('path',), lambda row: row['path']),
+    'depth': (('depth',), lambda row: row['depth']),
+}
+
+REVIEW_FIELDS = {
+    'id': (('id',), lambda row: row['id']),
+    'rating': (('rating',), lambda row: row['rating']),
+    'content': (('content',), lambda row: row['content']),
+    'author': (('created_by__username',), lambda row: row['created_by__username']),
+    'created_at': (('created_at',), lambda row: row['created_at'].isoformat()),
+}
+
+VENDOR_FIELDS = {
+    'id': (('id',), lambda row: row['id']),
+    'username': (('username',), lambda row: row['username']),
+    'name': (('first_name', 'last_name'), lambda row: ('%s %s' % (row['first_name'], row['last_name'])).strip()),
+}
+
+class ApiError(Exception):
+    """
+    An error returned to the API client as a JSON response.
+
+    Attributes:
+        status (int): The HTTP status code of the response.
+        message (str): The error message.
+
+    """
+    def __init__(self, message, status=400):
+        super().__init__(message)
+        self.message = message
+        self.status = status
+
+def api_view(view):
+    """
+    Turns a view returning a plain dict into a read-only, cacheable JSON endpoint.
+
+    The ETag is derived from the catalogue version and the full request path, so a matching
+    If-None-Match is answered with a 304 before the view runs any query.
+    Responses are compact JSON, gzipped when the client accepts it.
+
+    Args:
+        view (function): The view, returning the response payload as a dict.
+
+    Returns:
+        function: The wrapped view.
+
+    """
+    @gzip_page
+    @require_GET
+    @wraps(view)
+    def wrapper(request, *args, **kwargs):
+        etag = '"%s"' % hashlib.md5(('%s:%s' % (get_catalogue_version(), request.get_full_path())).encode()).hexdigest()
+        response = get_conditional_response(request, etag=etag)
+
+        if response is None:
+            try:
+                # Ids too large for the database can't exist
+                if 'pk' in kwargs:
+                    try:
+                        kwargs['pk'] = parse_id(kwargs['pk'])
+                    except ValueError:
+                        raise Http404
+
+                response = JsonResponse(view(request, *args, **kwargs), json_dumps_params=JSON_OPTIONS)
+            except ApiError as error:
+                return JsonResponse({'error': error.message}, status=error.status, json_dumps_params=JSON_OPTIONS)
+            except Http404:
+                return JsonResponse({'error': 'Not found.'}, status=404, json_dumps_params=JSON_OPTIONS)
+
+        response['ETag'] = etag
+        patch_cache_control(response, public=True, max_age=60)
+
+        return response
+
+    return wrapper
+
+def get_fields(request, field_map):
+    """
+    Reads the sparse fieldset from the 'fields' query parameter.
+
+    Args:
+        request (HttpRequest): The request object.
+        field_map (dict): The available fields of the resource.
+
+    Returns:
+        list: The requested field names, or all fields if none were requested.
+
+    Raises:
+        ApiError: If an unknown field is requested.
+
+    """
+    fields = [field for field in request.GET.get('fields', '').split(',') if field]
+
+    if not fields:
+        return list(field_map)
+
+    unknown = [field for field in fields if field not in field_map]
+
+    if unknown:
+        raise ApiError('Unknown fields: %s.' % ', '.join(unknown))
+
+    return fields
+
+def serialize(queryset, fields, field_map):
+    """
+    Selects only the columns behind the requested fields and serializes every row to a dict.
+
+    Args:
+        queryset (QuerySet): The rows to serialize.
+        fields (list): The requested field names.
+        field_map (dict): The available fields of the resource.
+
+    Returns:
+        list: The serialized rows.
+
+    """
+    columns = {'id'}
+
+    for field in fields:
+        columns.update(field_map[field][0])
+
+    getters = [(field, field_map[field][1]) for field in fields]
+
+    return [{field: getter(row) for field, getter in getters} for row in queryset.values(*columns)]
+
+def paginate(request, queryset, fields, field_map):
+    """
+    Returns one page of a resource, using keyset pagination on the primary key.
+
+    The cursor is the opaque encoded id of the last row of the previous page, so every page is an
+    indexed range scan no matter how deep the client paginates.
+
+    Args:
+        request (HttpRequest): The request object.
+        queryset (QuerySet): The rows to paginate.
+        fields (list): The requested field names.
+        field_map (dict): The available fields of the resource.
+
+    Returns:
+        dict: The 'results' of the page and the 'next' cursor, or None on the last page.
+
+    Raises:
+        ApiError: If the cursor or limit is invalid.
+
+    """
+    try:
+        limit = min(int(request.GET.get('limit', DEFAULT_LIMIT)), MAX_LIMIT)
+    except ValueError:
+        raise ApiError('Invalid limit.')
+
+    if limit < 1:
+        raise ApiError('Invalid limit.')
+
+    cursor = request.GET.get('cursor')
+
+    if cursor:
+        try:
+            queryset = queryset.filter(pk__lt=parse_id(base64.urlsafe_b64decode(cursor.encode())))
+        except (binascii.Error, ValueError):
+            raise ApiError('Invalid cursor.')
+
+    results = serialize(queryset.order_by('-pk')[:limit + 1], fields if 'id' in fields else ['id'] + fields, field_map)
+    next_cursor = None
+
+    if len(results) > limit:
+        results = results[:limit]
+        next_cursor = base64.urlsafe_b64encode(str(results[-1]['id']).encode()).decode()
+
+    if 'id' not in fields:
+        for result in results:
+            del result['id']
+
+    return {
+        'results': results,
+        'next': next_cursor,
+    }
+
+@api_view
+def product_list(request):
+    """
+    Lists the active products.
+
+    Supports filtering by category slug (including its subcategories) and vendor id,
+    a sparse fieldset and cursor pagination.
+
+    Args:
+        request (HttpRequest): The request object.
+
+    Returns:
+        dict: The page of products.
+
+    """
+    fields = get_fields(request, PRODUCT_FIELDS)
+    products = Product.objects.filter(status=Product.ACTIVE)
+
+    if request.GET.get('category'):
+        category = Category.objects.filter(slug=request.GET['category']).first()
+
+        if category is None:
+            raise ApiError('Unknown category.', status=404)
+
+        products = products.filter(subtree_filter(category.path, 'category__path'))
+
+    if request.GET.get('vendor'):
+        try:
+            products = products.filter(user_id=parse_id(request.GET['vendor']))
+        except ValueError:
+            raise ApiError('Invalid vendor.')
+
+    return paginate(request, products, fields, PRODUCT_FIELDS)
+
+@api_view
+def product_detail(request, pk):
+    """
+    Returns one active product.
+
+    Args:
+        request (HttpRequest): The request object.
+        pk (int): The primary key of the product.
+
+    Returns:
+        dict: The product.
+
+    Raises:
+        Http404: If the product does not exist or is not active.
+
+    """
+    fields = get_fields(request, PRODUCT_FIELDS)
+    products = serialize(Product.objects.filter(pk=pk, status=Product.ACTIVE), fields, PRODUCT_FIELDS)
+
+    if not products:
+        raise Http404
+
+    return products[0]
+
+@api_view
+def product_reviews(request, pk):
+    """
+    Lists the reviews of an active product.
+
+    Args:
+        request (HttpRequest): The request object.
+        pk (int): The primary key of the product.
+
+    Returns:
+        dict: The page of reviews.
+
+    Raises:
+        Http404: If the product does not exist or is not active.
+
+    """
+    fields = get_fields(request, REVIEW_FIELDS)
+
+    if not Product.objects.filter(pk=pk, status=Product.ACTIVE).exists():
+        raise Http404
+
+    return paginate(request, Review.objects.filter(product_id=pk), fields, REVIEW_FIELDS)
+
+@api_view
+def category_list(request):
+    """
+    Lists the categories.
+
+    Args:
+        request (HttpRequest): The request object.
+
+    Returns:
+        dict: The page of categories.
+
+    """
+    fields = get_fields(request, CATEGORY_FIELDS)
+
+    return paginate(request, Category.objects.all(), fields, CATEGORY_FIELDS)
+
+@api_view
+def vendor_list(request):
+    """
+    Lists the vendors.
+
+    Args:
+        request (HttpRequest): The request object.
+
+    Returns:
+        dict: The page of vendors.
+
+    """
+    fields = get_fields(request, VENDOR_FIELDS)
+
+    return paginate(request, User.objects.filter(userprofile__is_vendor=True), fields, VENDOR_FIELDS)
+
+@api_view
+def vendor_detail(request, pk):
+    """
+    Returns one vendor.
+
+    Args:
+        request (HttpRequest): The request object.
+        pk (int): The primary key of the vendor.
+
+    Returns:
+        dict: The vendor.
+
+    Raises:
+        Http404: If the user does not exist or is not a vendor.
+
+    """
+    fields = get_fields(request, VENDOR_FIELDS)
+    vendors = serialize(User.objects.filter(pk=pk, userprofile__is_vendor=True), fields, VENDOR_FIELDS)
+
+    if not vendors:
+        raise Http404
+
+    return vendors[0]
@@ -0,0 +1,116 @@
+import json
+import zlib
+from itertools import groupby
+from operator import itemgetter
+
+from django.contrib.auth.models import User
+from django.db import transaction
+from django.utils.dateparse import parse_datetime
+
+from .models import ArchivedOrder, Order, OrderItem, Product
+
+ORDER_FIELDS = ('id', 'first_name', 'last_name', 'address', 'city', 'paid_amount', 'is_paid', 'item_count', 'created_by_id', 'created_at')
+ITEM_FIELDS = ('id', 'order_id', 'product_id', 'price', 'quantity')
+
+def archive_orders(cutoff, batch_size=500):
+    """
+    Moves the orders created before a cutoff, with their items, into ArchivedOrder.
+
+    Orders are streamed in id order, one batch per transaction: one query for the orders,
+    one for their items, one bulk insert and two deletes.
+
+    Args:
+        cutoff (datetime): Orders created before this are archived.
+        batch_size (int, optional): The number of orders moved per transaction (default is 500).
+
+    Returns:
+        int: The number of archived orders.
+
+    """
+    archived = 0
+
+    while True:
+        with transaction.atomic():
+            orders = list(Order.objects.filter(created_at__lt=cutoff).order_by('pk').values(*ORDER_FIELDS)[:batch_size])
+
+            if not orders:
+                return archived
+
+            ids = [order['id'] for order in orders]
+            items = OrderItem.objects.filter(order_id__in=ids).order_by('order_id', 'pk').values(*ITEM_FIELDS)
+            items_by_order = {order_id: list(rows) for order_id, rows in groupby(items, key=itemgetter('order_id'))}
+
+            ArchivedOrder.objects.bulk_create([
+                ArchivedOrder(
+                    id=order['id'],
+                    created_by_id=order['created_by_id'],
+                    created_at=order['created_at'],
+                    paid_amount=order['paid_amount'],
+                    item_count=order['item_count'],
+                    data=zlib.compress(json.dumps(
+                        {'order': order, 'items': items_by_order.get(order['id'], [])},
+                        # isoformat() keeps the microseconds that DjangoJSONEncoder would cut off
+                        default=lambda value: value.isoformat(),
+                        separators=(',', ':'),
+                    ).encode()),
+                )
+                for order in orders
+            ])
+
+            OrderItem.objects.filter(order_id__in=ids).delete()
+            Order.objects.filter(pk__in=ids).delete()
+
+        archived += len(ids)
+
+def restore_orders(since=None, batch_size=500):
+    """
+    Moves archived orders back into Order and OrderItem, with their original ids.
+
+    Items of products that were deleted since the order was archived can't be restored and are dropped.
+    Orders of users that were deleted are restored without a user, as deleting a user does to their orders.
+
+    Args:
+        since (datetime, optional): Only orders created at or after this are restored (default is all).
+        batch_size (int, optional): The number of orders moved per transaction (default is 500).
+
+    Returns:
+        dict: The number of restored orders, of dropped items and of orders restored without their deleted user.
+
+    """
+    restored = dropped = orphaned = 0
+    archive = ArchivedOrder.objects.all()
+
+    if since is not None:
+        archive = archive.filter(created_at__gte=since)
+
+    while True:
+        with transaction.atomic():
+            batch = list(archive.order_by('pk').values_list('pk', 'data')[:batch_size])
+
+            if not batch:
+                return {'restored': restored, 'dropped': dropped, 'orphaned': orphaned}
+
+            payloads = [json.loads(zlib.decompress(bytes(data))) for pk, data in batch]
+            items = [item for payload in payloads for item in payload['items']]
+            existing = set(Product.objects.filter(pk__in={item['product_id'] for item in items}).values_list('pk', flat=True))
+            users = set(User.objects.filter(pk__in={payload['order']['created_by_id'] for payload in payloads}).values_list('pk', flat=True))
+            missing_users = 0
+
+            for payload in payloads:
+                if payload['order']['created_by_id'] is not None and payload['order']['created_by_id'] not in users:
+                    payload['order']['created_by_id'] = None
+                    missing_users += 1
+
+            orders = Order.objects.bulk_create([Order(**payload['order']) for payload in payloads])
+
+            # created_at is auto_now_add, so the original dates are written back after the insert
+            for order, payload in zip(orders, payloads):
+                order.created_at = parse_datetime(payload['order']['created_at'])
+
+            Order.objects.bulk_update(orders, ['created_at'])
+            OrderItem.objects.bulk_create([OrderItem(**item) for item in items if item['product_id'] in existing])
+            ArchivedOrder.objects.filter(pk__in=[pk for pk, data in batch]).delete()
+
+        restored += len(batch)
+        dropped += sum(1 for item in items if item['product_id'] not in existing)
+        orphaned += missing_users
@@ -17,41 +17,44 @@ class Cart(object):
         save(self): Saves the cart to the session.
         add(self, product_id, quantity=1, update_quantity=False): Adds a product to the cart.
         remove(self, product_id): Removes a product from the cart.
+        apply(self, operations): Applies a batch of line operations with a single session write.
         clear(self): Clears the cart.
         get_total_cost(self): Returns the total cost of all items in the cart.
+        get_products(self): Returns the products in the cart, loaded with a single query.
 
     """
     def __init__(self, request):
         """
         Initializes the Cart object.
 
+        An empty cart is not written to the session until something is added,
+        so browsing without a cart never creates a session row.
+
         Parameters:
             request (HttpRequest): The HttpRequest object representing the user's request.
 
         """
         self.session = request.session
-        cart = self.session.get(settings.CART_SESSION_ID)
-
-        if not cart:
-            cart = self.session[settings.CART_SESSION_ID] = {}
-
-        self.cart = cart
+        self.cart = self.session.get(settings.CART_SESSION_ID) or {}
 
     def __iter__(self):
         """
         Returns an iterator over the items in the cart.
 
+        The products of all items are loaded with a single query. The items are copies,
+        so the product objects never end up in the session.
+
         Yields:
             dict: A dictionary representing an item in the cart.
 
         """
-        for p in self.cart.keys():
-            self.cart[str(p)]['product'] = Product.objects.get(pk=p)
+        products = self.get_products()
 
-        for item in self.cart.values():
-            item['total_price'] = int(item['product'].price * item['quantity']) / 100
+        for product_id, item in self.cart.items():
+            if product_id in products:
+                product = products[product_id]
 
-            yield item
+                yield dict(item, product=product, total_price=int(product.price * item['quantity']) / 100)
 
     def __len__(self):
         """
@@ -108,12 +111,41 @@ class Cart(object):
 
             self.save()
 
+    def apply(self, operations):
+        """
+        Applies a batch of line operations and saves the cart once.
+
+        Parameters:
+            operations (list): The operations, each a dict with an 'op' of 'set', 'add' or 'remove',
+                               a 'product_id' and, for 'set' and 'add', a 'quantity'.
+                               Lines whose quantity drops to zero or below are removed.
+
+        """
+        for operation in operations:
+            product_id = str(operation['product_id'])
+
+            if operation['op'] == 'remove':
+                self.cart.pop(product_id, None)
+                continue
+
+            quantity = operation['quantity']
+
+            if operation['op'] == 'add':
+                quantity += self.cart.get(product_id, {}).get('quantity', 0)
+
+            if quantity > 0:
+                self.cart[product_id] = {'quantity': quantity, 'id': product_id}
+            else:
+                self.cart.pop(product_id, None)
+
+        self.save()
+
     def clear(self):
         """
         Clears the cart.
 
         """
-        del self.session[settings.CART_SESSION_ID]
+        self.session.pop(settings.CART_SESSION_ID, None)
         self.session.modified = True
 
     def get_total_cost(self):
@@ -124,7 +156,19 @@ class Cart(object):
             int: The total cost of all items in the cart.
 
         """
-        for p in self.cart.keys():
-            self.cart[str(p)]['product'] = Product.objects.get(pk=p)
+        products = self.get_products()
+
+        return int(sum(products[p].price * item['quantity'] for p, item in self.cart.items() if p in products)) / 100
+
+    def get_products(self):
+        """
+        Returns the products in the cart, loaded with a single query.
+
+        Returns:
+            dict: The products keyed by their id as a string, like the cart itself.
+
+        """
+        if not self.cart:
+            return {}
 
-        return int(sum(item['product'].price * item['quantity'] for item in self.cart.values())) / 100
\ No newline at end of file
+        return {str(pk): product for pk, product in Product.objects.select_related('category').in_bulk(list(self.cart)).items()}
\ No newline at end of file
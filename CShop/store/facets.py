@@ -0,0 +1,212 @@
+import math
+
+from django.db.models import Case, Count, IntegerField, Value, When
+
+SORT_OPTIONS = {
+    'newest': ('-created_at',),
+    'price': ('price', '-created_at'),
+    '-price': ('-price', '-created_at'),
+    'rating': ('-average_rating', '-created_at'),
+}
+
+SORT_CHOICES = (
+    ('newest', 'Newest'),
+    ('price', 'Price: low to high'),
+    ('-price', 'Price: high to low'),
+    ('rating', 'Rating'),
+)
+
+# Price buckets in cents, the upper bound is exclusive
+PRICE_BUCKETS = (
+    (0, 1000),
+    (1000, 2500),
+    (2500, 5000),
+    (5000, None),
+)
+
+RATING_BUCKETS = (4, 3, 2, 1)
+
+VENDOR_FACET_LIMIT = 20
+
+# The largest value a database integer column can hold; larger filter values are ignored
+MAX_INT = 2 ** 63 - 1
+
+def _to_int(value):
+    """
+    Converts a query string value to an int, ignoring invalid values.
+
+    Args:
+        value (str): The raw value.
+
+    Returns:
+        int: The value, or None if it is missing, invalid or out of range.
+
+    """
+    try:
+        value = int(value)
+    except (TypeError, ValueError):
+        return None
+
+    return value if abs(value) <= MAX_INT else None
+
+def _to_cents(value):
+    """
+    Converts a dollar amount from the query string to cents, ignoring invalid values.
+
+    Args:
+        value (str): The raw dollar amount.
+
+    Returns:
+        int: The amount in cents, or None if it is missing, invalid, not finite or out of range.
+
+    """
+    try:
+        value = float(value) * 100
+    except (TypeError, ValueError):
+        return None
+
+    return int(round(value)) if math.isfinite(value) and abs(value) <= MAX_INT else None
+
+def parse_filters(params):
+    """
+    Reads the product filters and sort order from the query string.
+
+    Prices are given in dollars, either as min_price/max_price or as a price=min-max range;
+    both bounds are inclusive. Invalid and out-of-range values are ignored rather than rejected.
+
+    Args:
+        params (QueryDict): The request's GET parameters.
+
+    Returns:
+        dict: The cleaned min_price and max_price (in cents), min_rating, vendor and sort values.
+
+    """
+    min_price = _to_cents(params.get('min_price'))
+    max_price = _to_cents(params.get('max_price'))
+
+    if '-' in params.get('price', ''):
+        low, high = params['price'].split('-', 1)
+        min_price = _to_cents(low) if min_price is None else min_price
+        max_price = _to_cents(high) if max_price is None else max_price
+
+    sort = params.get('sort', '')
+
+    return {
+        'min_price': min_price,
+        'max_price': max_price,
+        'min_rating': _to_int(params.get('min_rating')),
+        'vendor': _to_int(params.get('vendor')),
+        'sort': sort if sort in SORT_OPTIONS else '',
+    }
+
+def apply_filters(queryset, filters):
+    """
+    Narrows a product queryset down to the given filters.
+
+    Args:
+        queryset (QuerySet): The products to filter.
+        filters (dict): The cleaned filters from parse_filters().
+
+    Returns:
+        QuerySet: The filtered products.
+
+    """
+    if filters['min_price'] is not None:
+        queryset = queryset.filter(price__gte=filters['min_price'])
+
+    if filters['max_price'] is not None:
+        queryset = queryset.filter(price__lte=filters['max_price'])
+
+    if filters['min_rating']:
+        queryset = queryset.filter(average_rating__gte=filters['min_rating'])
+
+    if filters['vendor']:
+        queryset = queryset.filter(user_id=filters['vendor'])
+
+    return queryset
+
+def apply_sort(queryset, sort, default='newest'):
+    """
+    Orders a product queryset by one of the SORT_OPTIONS.
+
+    Each sort matches one of the (status, ...) and (category, status, ...) indexes on Product.
+
+    Args:
+        queryset (QuerySet): The products to order.
+        sort (str): The requested sort key.
+        default (str, optional): The sort key used when none is requested (default is 'newest').
+
+    Returns:
+        QuerySet: The ordered products.
+
+    """
+    return queryset.order_by(*SORT_OPTIONS[sort or default])
+
+def compute_facets(queryset):
+    """
+    Counts the products per vendor, price bucket and minimum rating.
+
+    Every facet is computed with a single grouped aggregate query.
+
+    Args:
+        queryset (QuerySet): The products to count, before any facet filter is applied.
+
+    Returns:
+        dict: The 'vendors', 'prices' and 'ratings' facets, each a list of options with a count.
+
+    """
+    queryset = queryset.order_by()
+
+    vendors = [
+        {'id': row['user_id'], 'name': row['user__username'], 'count': row['count']}
+        for row in queryset
+        .values('user_id', 'user__username')
+        .annotate(count=Count('id'))
+        .order_by('-count', 'user__username')[:VENDOR_FACET_LIMIT]
+    ]
+
+    price_bucket = Case(
+        *[
+            When(price__gte=low, price__lt=high, then=Value(index)) if high is not None else When(price__gte=low, then=Value(index))
+            for index, (low, high) in enumerate(PRICE_BUCKETS)
+        ],
+        default=Value(-1),
+        output_field=IntegerField(),
+    )
+    price_counts = dict(
+        queryset.annotate(bucket=price_bucket).values('bucket').annotate(count=Count('id')).values_list('bucket', 'count')
+    )
+    prices = []
+
+    for index, (low, high) in enumerate(PRICE_BUCKETS):
+        if price_counts.get(index):
+            prices.append({
+                # The bucket excludes its upper bound, while the price filter includes it
+                'value': '%d-%s' % (low // 100, '' if high is None else '%.2f' % ((high - 1) / 100)),
+                'label': '$%d+' % (low // 100) if high is None else '$%d - $%d' % (low // 100, high // 100),
+                'count': price_counts[index],
+            })
+
+    rating_bucket = Case(
+        *[When(average_rating__gte=rating, then=Value(rating)) for rating in RATING_BUCKETS],
+        default=Value(0),
+        output_field=IntegerField(),
+    )
+    rating_counts = dict(
+        queryset.annotate(bucket=rating_bucket).values('bucket').annotate(count=Count('id')).values_list('bucket', 'count')
+    )
+    ratings = []
+    cumulative = 0
+
+    # The buckets are disjoint, "N stars & up" is the running total from the top bucket down
+    for rating in RATING_BUCKETS:
+        cumulative += rating_counts.get(rating, 0)
+
+        if cumulative:
+            ratings.append({'value': rating, 'count': cumulative})
+
+    return {
+        'vendors': vendors,
+        'prices': prices,
+        'ratings': ratings,
+    }
@@ -41,7 +41,7 @@ class ProductForm(forms.ModelForm):
 
         """
         model = Product
-        fields = ('category', 'title', 'description', 'price', 'image',)
+        fields = ('category', 'title', 'description', 'price', 'stock', 'image',)
         widgets = {
             'category': forms.Select(attrs={
                 'class': 'w-full p-4 border border-gray-200'
@@ -55,6 +55,9 @@ class ProductForm(forms.ModelForm):
             'price': forms.TextInput(attrs={
                 'class': 'w-full p-4 border border-gray-200'
             }),
+            'stock': forms.NumberInput(attrs={
+                'class': 'w-full p-4 border border-gray-200'
+            }),
             'image': forms.FileInput(attrs={
                 'class': 'w-full p-4 border border-gray-200'
             }),
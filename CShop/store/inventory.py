@@ -0,0 +1,173 @@
+from datetime import timedelta
+
+from django.db import transaction
+from django.db.models import F, Q, Sum
+from django.utils import timezone
+
+from .models import Product, StockReservation
+
+class OutOfStock(Exception):
+    """
+    Raised when there are not enough units in stock for a purchase or reservation.
+
+    Attributes:
+        product_ids (list): The ids of the products without enough stock.
+
+    """
+    def __init__(self, product_ids):
+        super().__init__('Not enough stock for products %s.' % ', '.join(str(pk) for pk in product_ids))
+        self.product_ids = product_ids
+
+def take_stock(quantities):
+    """
+    Takes units out of stock with one conditional UPDATE per product.
+
+    Each UPDATE only matches while enough units are left (or stock isn't tracked), so the check
+    and the decrement happen atomically in the database without reading the row first.
+    Products are updated in id order so concurrent checkouts always lock rows in the same order.
+    Call this inside a transaction, so a shortage rolls back the units already taken.
+
+    Args:
+        quantities (dict): The number of units to take per product id.
+
+    Raises:
+        OutOfStock: If any product does not have enough units left.
+
+    """
+    missing = []
+
+    for product_id, quantity in sorted(quantities.items()):
+        if quantity <= 0:
+            continue
+
+        updated = (
+            Product.objects
+            .filter(Q(stock__isnull=True) | Q(stock__gte=quantity), pk=product_id)
+            .update(stock=F('stock') - quantity)
+        )
+
+        if not updated:
+            missing.append(product_id)
+
+    if missing:
+        raise OutOfStock(missing)
+
+def return_stock(quantities):
+    """
+    Puts units back into stock.
+
+    Args:
+        quantities (dict): The number of units to return per product id.
+
+    """
+    for product_id, quantity in sorted(quantities.items()):
+        if quantity > 0:
+            Product.objects.filter(pk=product_id, stock__isnull=False).update(stock=F('stock') + quantity)
+
+def reserve(session_key, quantities, seconds):
+    """
+    Replaces the reservations of a session with holds on the given quantities.
+
+    The previous reservations of the session are returned to stock first, then the new quantities
+    are taken from stock, all in one transaction.
+
+    Args:
+        session_key (str): The session of the shopper.
+        quantities (dict): The number of units to reserve per product id.
+        seconds (int): How long the reservation lasts.
+
+    Raises:
+        OutOfStock: If any product does not have enough units left. The previous reservations are kept.
+
+    """
+    with transaction.atomic():
+        release(session_key)
+        take_stock(quantities)
+
+        expires_at = timezone.now() + timedelta(seconds=seconds)
+
+        StockReservation.objects.bulk_create([
+            StockReservation(product_id=product_id, session_key=session_key, quantity=quantity, expires_at=expires_at)
+            for product_id, quantity in quantities.items()
+            if quantity > 0
+        ])
+
+def release(session_key):
+    """
+    Returns the reserved units of a session to stock and deletes its reservations.
+
+    Args:
+        session_key (str): The session of the shopper.
+
+    """
+    with transaction.atomic():
+        return_stock(consume(session_key))
+
+def consume(session_key):
+    """
+    Deletes the reservations of a session without returning their units to stock.
+
+    Used at checkout, where the reserved units are sold.
+
+    Args:
+        session_key (str): The session of the shopper.
+
+    Returns:
+        dict: The number of reserved units per product id.
+
+    """
+    reservations = StockReservation.objects.filter(session_key=session_key)
+    quantities = dict(reservations.select_for_update().values_list('product_id', 'quantity'))
+    reservations.filter(product_id__in=list(quantities)).delete()
+
+    return quantities
+
+def purchase(session_key, quantities):
+    """
+    Takes the units of a checkout out of stock, using the session's reservations first.
+
+    Reserved units count towards the purchase; any shortfall is taken from stock and any
+    surplus reservation is returned. Call this inside the checkout transaction.
+
+    Args:
+        session_key (str): The session of the shopper.
+        quantities (dict): The number of units bought per product id.
+
+    Raises:
+        OutOfStock: If any product does not have enough units left.
+
+    """
+    reserved = consume(session_key) if session_key else {}
+
+    take_stock({pk: quantity - reserved.get(pk, 0) for pk, quantity in quantities.items()})
+    return_stock({pk: quantity - quantities.get(pk, 0) for pk, quantity in reserved.items()})
+
+def sweep_expired_reservations(batch_size=1000):
+    """
+    Returns the units of expired reservations to stock, one batch at a time.
+
+    Every batch is one grouped query for the quantities, one UPDATE per product and one DELETE,
+    in a short transaction, so the sweeper never holds locks for long.
+
+    Args:
+        batch_size (int, optional): The number of reservations handled per transaction (default is 1000).
+
+    Returns:
+        int: The number of expired reservations.
+
+    """
+    swept = 0
+    now = timezone.now()
+
+    while True:
+        with transaction.atomic():
+            ids = list(StockReservation.objects.filter(expires_at__lte=now).select_for_update(skip_locked=True).values_list('pk', flat=True)[:batch_size])
+
+            if not ids:
+                return swept
+
+            expired = StockReservation.objects.filter(pk__in=ids)
+            return_stock(dict(expired.values('product_id').annotate(total=Sum('quantity')).values_list('product_id', 'total')))
+            expired.delete()
+
+        swept += len(ids)
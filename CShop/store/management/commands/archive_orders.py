@@ -0,0 +1,33 @@
+from datetime import timedelta
+
+from django.conf import settings
+from django.core.management.base import BaseCommand
+from django.utils import timezone
+
+from store.archive import archive_orders, restore_orders
+
+class Command(BaseCommand):
+    """
+    Moves old orders out of the order tables into the archive, or back with --restore.
+
+    """
+    help = 'Moves old orders out of the order tables into the archive, or back with --restore.'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--days', type=int, default=None, help='Archive orders older than this many days (default ORDER_ARCHIVE_DAYS), or with --restore, restore orders newer than this.')
+        parser.add_argument('--restore', action='store_true', help='Move archived orders back into the order tables.')
+        parser.add_argument('--batch-size', type=int, default=500)
+
+    def handle(self, *args, **options):
+        days = options['days']
+
+        if options['restore']:
+            since = timezone.now() - timedelta(days=days) if days is not None else None
+            result = restore_orders(since, batch_size=options['batch_size'])
+
+            self.stdout.write(self.style.SUCCESS('Restored %(restored)d orders, dropped %(dropped)d items of deleted products, %(orphaned)d orders of deleted users.' % result))
+        else:
+            cutoff = timezone.now() - timedelta(days=settings.ORDER_ARCHIVE_DAYS if days is None else days)
+            archived = archive_orders(cutoff, batch_size=options['batch_size'])
+
+            self.stdout.write(self.style.SUCCESS('Archived %d orders created before %s.' % (archived, cutoff.date())))
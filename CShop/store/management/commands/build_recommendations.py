@@ -0,0 +1,27 @@
+from django.conf import settings
+from django.core.management.base import BaseCommand
+
+from store.recommendations import build_bought_together
+
+class Command(BaseCommand):
+    """
+    Updates the "frequently bought together" recommendations from new orders.
+
+    """
+    help = 'Updates the "frequently bought together" recommendations from new orders.'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--full', action='store_true', help='Rebuild from all orders instead of only new ones.')
+        parser.add_argument('--top-k', type=int, default=settings.RECOMMENDATIONS_TOP_K)
+        parser.add_argument('--batch-size', type=int, default=1000)
+        parser.add_argument('--max-pairs', type=int, default=200000, help='Pending pair counts kept in memory before a flush.')
+
+    def handle(self, *args, **options):
+        result = build_bought_together(
+            options['top_k'],
+            full=options['full'],
+            batch_size=options['batch_size'],
+            max_pairs=options['max_pairs'],
+        )
+
+        self.stdout.write(self.style.SUCCESS('Processed %(orders)d orders, refreshed %(products)d products.' % result))
@@ -0,0 +1,21 @@
+from django.conf import settings
+from django.core.management.base import BaseCommand
+
+from store.recommendations import build_similar_products
+
+class Command(BaseCommand):
+    """
+    Precomputes the "similar products" recommendations from product titles and descriptions.
+
+    """
+    help = 'Precomputes the "similar products" recommendations from product titles and descriptions.'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--full', action='store_true', help='Refresh every product instead of only edited ones.')
+        parser.add_argument('--top-k', type=int, default=settings.RECOMMENDATIONS_TOP_K)
+        parser.add_argument('--block-size', type=int, default=256)
+
+    def handle(self, *args, **options):
+        result = build_similar_products(options['top_k'], full=options['full'], block_size=options['block_size'])
+
+        self.stdout.write(self.style.SUCCESS('Vectorized %(vectorized)d products, refreshed %(refreshed)d.' % result))
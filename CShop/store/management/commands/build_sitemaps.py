@@ -0,0 +1,21 @@
+from django.conf import settings
+from django.core.management.base import BaseCommand
+
+from store.sitemaps import MAX_URLS, build_sitemaps
+
+class Command(BaseCommand):
+    """
+    Writes the sitemap index and its chunk files, rewriting only the chunks that changed since the last run.
+
+    """
+    help = 'Writes the sitemap index and its chunk files, rewriting only the chunks that changed since the last run.'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--base-url', default=None, help='The scheme and host of the site (default SITE_URL).')
+        parser.add_argument('--full', action='store_true', help='Rewrite every file.')
+        parser.add_argument('--chunk-size', type=int, default=MAX_URLS, help='The maximum number of URLs per file.')
+
+    def handle(self, *args, **options):
+        result = build_sitemaps(options['base_url'] or settings.SITE_URL, full=options['full'], chunk_size=options['chunk_size'])
+
+        self.stdout.write(self.style.SUCCESS('%(files)d sitemap files, %(written)d rewritten, %(removed)d removed.' % result))
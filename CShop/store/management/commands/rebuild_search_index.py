@@ -0,0 +1,41 @@
+from django.core.management.base import BaseCommand
+
+from store.models import Product, ProductTrigram
+from store.search import trigrams
+
+class Command(BaseCommand):
+    """
+    Rebuilds the trigram index used by the fuzzy product search.
+
+    Products are read in primary key batches, so memory use stays bounded for any catalogue size.
+
+    """
+    help = 'Rebuilds the trigram index used by the fuzzy product search.'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--batch-size', type=int, default=1000)
+
+    def handle(self, *args, **options):
+        batch_size = options['batch_size']
+
+        ProductTrigram.objects.all().delete()
+
+        last_pk = 0
+        count = 0
+
+        while True:
+            batch = list(
+                Product.objects.filter(pk__gt=last_pk).order_by('pk').values_list('pk', 'title')[:batch_size]
+            )
+
+            if not batch:
+                break
+
+            ProductTrigram.objects.bulk_create([
+                ProductTrigram(trigram=gram, product_id=pk) for pk, title in batch for gram in trigrams(title)
+            ])
+
+            last_pk = batch[-1][0]
+            count += len(batch)
+
+        self.stdout.write(self.style.SUCCESS('Indexed %d products.' % count))
@@ -0,0 +1,19 @@
+from django.core.management.base import BaseCommand
+
+from store.analytics import rollup_sales
+
+class Command(BaseCommand):
+    """
+    Rolls new orders up into the daily sales per product shown on the vendor analytics page.
+
+    """
+    help = 'Rolls new orders up into the daily sales per product shown on the vendor analytics page.'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--full', action='store_true', help='Rebuild from all orders instead of only new ones.')
+        parser.add_argument('--batch-size', type=int, default=1000)
+
+    def handle(self, *args, **options):
+        result = rollup_sales(full=options['full'], batch_size=options['batch_size'])
+
+        self.stdout.write(self.style.SUCCESS('Processed %(orders)d orders, wrote %(rows)d rollup rows.' % result))
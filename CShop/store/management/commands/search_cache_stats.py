@@ -0,0 +1,21 @@
+from django.core.management.base import BaseCommand
+
+from store.search import reset_search_cache_stats, search_cache_stats
+
+class Command(BaseCommand):
+    """
+    Prints the hit and miss counters of the search result cache.
+
+    """
+    help = 'Prints the hit and miss counters of the search result cache.'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--reset', action='store_true', help='Reset the counters after printing them.')
+
+    def handle(self, *args, **options):
+        stats = search_cache_stats()
+
+        self.stdout.write('Hits: %(hits)d\nMisses: %(misses)d\nHit ratio: %(hit_ratio).2f' % stats)
+
+        if options['reset']:
+            reset_search_cache_stats()
@@ -0,0 +1,89 @@
+import multiprocessing
+import time
+
+from django.contrib.auth.models import User
+from django.core.management.base import BaseCommand
+from django.db import connections, transaction
+
+from store.inventory import OutOfStock, take_stock
+from store.models import Category, Product
+
+def buy_until_sold_out(product_id, quantity):
+    """
+    Buys units of a product in separate transactions until it is sold out.
+
+    Runs in a worker process, so it opens its own database connection.
+
+    Args:
+        product_id (int): The id of the product to buy.
+        quantity (int): The number of units bought per checkout.
+
+    Returns:
+        int: The number of units bought.
+
+    """
+    connections.close_all()
+    bought = 0
+
+    while True:
+        try:
+            with transaction.atomic():
+                take_stock({product_id: quantity})
+        except OutOfStock:
+            return bought
+
+        bought += quantity
+
+class Command(BaseCommand):
+    """
+    Runs concurrent checkouts against one product to check that stock is never oversold.
+
+    A temporary product is created with the given stock, then every process buys units until
+    it is sold out. The units sold must equal the initial stock and the stock must end at zero.
+    The temporary product, category and vendor are deleted afterwards.
+
+    """
+    help = 'Runs concurrent checkouts against one product to check that stock is never oversold.'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--processes', type=int, default=8)
+        parser.add_argument('--stock', type=int, default=2000)
+        parser.add_argument('--quantity', type=int, default=1, help='Units bought per checkout.')
+
+    def handle(self, *args, **options):
+        user = User.objects.create_user(username='stress-inventory-%d' % time.time_ns())
+        category = Category.objects.create(title='Stress inventory', slug=user.username)
+        product = Product.objects.create(
+            user=user,
+            category=category,
+            title='Stress inventory',
+            slug=user.username,
+            price=100,
+            stock=options['stock'],
+        )
+
+        try:
+            # Forked processes must not share the parent's connection
+            connections.close_all()
+            started = time.perf_counter()
+
+            with multiprocessing.Pool(options['processes']) as pool:
+                sold = sum(pool.starmap(buy_until_sold_out, [(product.id, options['quantity'])] * options['processes']))
+
+            elapsed = time.perf_counter() - started
+            product.refresh_from_db()
+        finally:
+            product.delete()
+            category.delete()
+            user.delete()
+
+        checkouts = sold // options['quantity']
+        expected = options['stock'] - options['stock'] % options['quantity']
+
+        self.stdout.write('Initial stock: %d, sold: %d, left: %d' % (options['stock'], sold, product.stock))
+        self.stdout.write('%d checkouts in %.2fs (%.0f checkouts/s) with %d processes' % (checkouts, elapsed, checkouts / elapsed, options['processes']))
+
+        if sold == expected and product.stock == options['stock'] - sold:
+            self.stdout.write(self.style.SUCCESS('No overselling.'))
+        else:
+            self.stdout.write(self.style.ERROR('Stock was oversold or lost.'))
@@ -0,0 +1,18 @@
+from django.core.management.base import BaseCommand
+
+from store.inventory import sweep_expired_reservations
+
+class Command(BaseCommand):
+    """
+    Returns the units of expired stock reservations to stock.
+
+    """
+    help = 'Returns the units of expired stock reservations to stock.'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--batch-size', type=int, default=1000)
+
+    def handle(self, *args, **options):
+        swept = sweep_expired_reservations(options['batch_size'])
+
+        self.stdout.write(self.style.SUCCESS('Released %d expired reservations.' % swept))
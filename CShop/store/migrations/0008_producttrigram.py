@@ -0,0 +1,26 @@
+# Generated by Django 4.2.1 on 2026-10-18 22:28
+
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('store', '0007_review'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='ProductTrigram',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('trigram', models.CharField(max_length=3)),
+                ('product', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='trigrams', to='store.product')),
+            ],
+        ),
+        migrations.AddConstraint(
+            model_name='producttrigram',
+            constraint=models.UniqueConstraint(fields=('trigram', 'product'), name='unique_product_trigram'),
+        ),
+    ]
@@ -0,0 +1,62 @@
+# Generated by Django 4.2.1 on 2026-10-18 22:30
+
+from django.db import migrations, models
+
+
+def backfill_ratings(apps, schema_editor):
+    Product = apps.get_model('store', 'Product')
+    Review = apps.get_model('store', 'Review')
+
+    stats = Review.objects.values('product').annotate(average=models.Avg('rating'), count=models.Count('id'))
+
+    for row in stats:
+        Product.objects.filter(pk=row['product']).update(average_rating=row['average'], review_count=row['count'])
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('store', '0008_producttrigram'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='product',
+            name='average_rating',
+            field=models.FloatField(default=0),
+        ),
+        migrations.AddField(
+            model_name='product',
+            name='review_count',
+            field=models.IntegerField(default=0),
+        ),
+        migrations.AddIndex(
+            model_name='product',
+            index=models.Index(fields=['status', '-created_at'], name='product_status_newest_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='product',
+            index=models.Index(fields=['status', 'price'], name='product_status_price_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='product',
+            index=models.Index(fields=['status', '-average_rating'], name='product_status_rating_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='product',
+            index=models.Index(fields=['category', 'status', '-created_at'], name='product_cat_newest_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='product',
+            index=models.Index(fields=['category', 'status', 'price'], name='product_cat_price_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='product',
+            index=models.Index(fields=['category', 'status', '-average_rating'], name='product_cat_rating_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='product',
+            index=models.Index(fields=['user', 'status'], name='product_vendor_status_idx'),
+        ),
+        migrations.RunPython(backfill_ratings, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,43 @@
+# Generated by Django 4.2.1 on 2026-10-18 22:32
+
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+def place_categories_at_root(apps, schema_editor):
+    Category = apps.get_model('store', 'Category')
+
+    for category in Category.objects.all():
+        category.path = '%08d/' % category.pk
+        category.depth = 0
+        category.save(update_fields=['path', 'depth'])
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('store', '0009_product_rating_and_indexes'),
+    ]
+
+    operations = [
+        migrations.AlterModelOptions(
+            name='category',
+            options={'ordering': ('path',), 'verbose_name_plural': 'Categories'},
+        ),
+        migrations.AddField(
+            model_name='category',
+            name='depth',
+            field=models.IntegerField(default=0, editable=False),
+        ),
+        migrations.AddField(
+            model_name='category',
+            name='parent',
+            field=models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.CASCADE, related_name='children', to='store.category'),
+        ),
+        migrations.AddField(
+            model_name='category',
+            name='path',
+            field=models.CharField(db_index=True, default='', editable=False, max_length=255),
+        ),
+        migrations.RunPython(place_categories_at_root, migrations.RunPython.noop),
+    ]
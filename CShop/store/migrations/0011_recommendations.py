@@ -0,0 +1,53 @@
+# Generated by Django 4.2.1 on 2026-10-18 22:33
+
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('store', '0010_category_tree'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='BatchCursor',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('name', models.CharField(max_length=50, unique=True)),
+                ('position', models.BigIntegerField(default=0)),
+                ('updated_at', models.DateTimeField(auto_now=True)),
+            ],
+        ),
+        migrations.CreateModel(
+            name='ProductRecommendation',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('kind', models.CharField(choices=[('bought_together', 'Frequently bought together')], max_length=50)),
+                ('rank', models.IntegerField()),
+                ('score', models.FloatField()),
+                ('product', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='recommendations', to='store.product')),
+                ('recommended', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='recommended_for', to='store.product')),
+            ],
+            options={
+                'indexes': [models.Index(fields=['product', 'kind', 'rank'], name='recommendation_lookup_idx')],
+            },
+        ),
+        migrations.CreateModel(
+            name='ProductCooccurrence',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('count', models.IntegerField(default=0)),
+                ('product', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='cooccurrences', to='store.product')),
+                ('related', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='+', to='store.product')),
+            ],
+            options={
+                'indexes': [models.Index(fields=['product', '-count'], name='cooccurrence_top_idx')],
+            },
+        ),
+        migrations.AddConstraint(
+            model_name='productcooccurrence',
+            constraint=models.UniqueConstraint(fields=('product', 'related'), name='unique_product_cooccurrence'),
+        ),
+    ]
@@ -0,0 +1,23 @@
+# Generated by Django 4.2.1 on 2026-10-18 22:34
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('store', '0011_recommendations'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='product',
+            name='similar_products_stale',
+            field=models.BooleanField(db_index=True, default=True),
+        ),
+        migrations.AlterField(
+            model_name='productrecommendation',
+            name='kind',
+            field=models.CharField(choices=[('bought_together', 'Frequently bought together'), ('similar', 'Similar products')], max_length=50),
+        ),
+    ]
@@ -0,0 +1,39 @@
+# Generated by Django 4.2.1 on 2026-10-18 22:37
+
+from django.db import migrations, models
+from django.db.models.functions import Coalesce
+
+
+def backfill_item_counts(apps, schema_editor):
+    Order = apps.get_model('store', 'Order')
+    OrderItem = apps.get_model('store', 'OrderItem')
+
+    quantities = (
+        OrderItem.objects
+        .filter(order=models.OuterRef('pk'))
+        .order_by()
+        .values('order')
+        .annotate(total=models.Sum('quantity'))
+        .values('total')
+    )
+    Order.objects.update(item_count=Coalesce(models.Subquery(quantities), 0))
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('store', '0012_similar_products'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='order',
+            name='item_count',
+            field=models.IntegerField(default=0),
+        ),
+        migrations.AddIndex(
+            model_name='order',
+            index=models.Index(fields=['created_by', '-created_at'], name='order_user_newest_idx'),
+        ),
+        migrations.RunPython(backfill_item_counts, migrations.RunPython.noop),
+    ]
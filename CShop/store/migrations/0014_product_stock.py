@@ -0,0 +1,33 @@
+# Generated by Django 4.2.1 on 2026-10-18 22:38
+
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('store', '0013_order_item_count'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='product',
+            name='stock',
+            field=models.PositiveIntegerField(blank=True, help_text='Leave empty for unlimited stock.', null=True),
+        ),
+        migrations.CreateModel(
+            name='StockReservation',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('session_key', models.CharField(db_index=True, max_length=40)),
+                ('quantity', models.PositiveIntegerField()),
+                ('expires_at', models.DateTimeField(db_index=True)),
+                ('product', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='reservations', to='store.product')),
+            ],
+        ),
+        migrations.AddConstraint(
+            model_name='stockreservation',
+            constraint=models.UniqueConstraint(fields=('session_key', 'product'), name='unique_session_reservation'),
+        ),
+    ]
@@ -0,0 +1,39 @@
+# Generated by Django 4.2.1 on 2026-10-18 22:46
+
+from django.conf import settings
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+        ('store', '0014_product_stock'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='ArchivedOrder',
+            fields=[
+                ('id', models.BigIntegerField(primary_key=True, serialize=False)),
+                ('created_at', models.DateTimeField(db_index=True)),
+                ('paid_amount', models.IntegerField(blank=True, null=True)),
+                ('item_count', models.IntegerField(default=0)),
+                ('data', models.BinaryField()),
+                ('archived_at', models.DateTimeField(auto_now_add=True)),
+                ('created_by', models.ForeignKey(null=True, on_delete=django.db.models.deletion.SET_NULL, related_name='archived_orders', to=settings.AUTH_USER_MODEL)),
+            ],
+        ),
+        migrations.CreateModel(
+            name='AbandonedCart',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('items', models.JSONField(default=dict)),
+                ('item_count', models.IntegerField(default=0)),
+                ('value', models.IntegerField(default=0)),
+                ('abandoned_at', models.DateTimeField(db_index=True)),
+                ('user', models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.SET_NULL, related_name='abandoned_carts', to=settings.AUTH_USER_MODEL)),
+            ],
+        ),
+    ]
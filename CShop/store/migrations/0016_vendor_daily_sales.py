@@ -0,0 +1,34 @@
+# Generated by Django 4.2.1 on 2026-10-18 22:47
+
+from django.conf import settings
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+        ('store', '0015_archived_orders'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='VendorDailySales',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('day', models.DateField()),
+                ('revenue', models.IntegerField(default=0)),
+                ('units', models.IntegerField(default=0)),
+                ('product', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='daily_sales', to='store.product')),
+                ('vendor', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='daily_sales', to=settings.AUTH_USER_MODEL)),
+            ],
+            options={
+                'indexes': [models.Index(fields=['vendor', 'day'], name='sales_vendor_day_idx')],
+            },
+        ),
+        migrations.AddConstraint(
+            model_name='vendordailysales',
+            constraint=models.UniqueConstraint(fields=('product', 'day'), name='unique_product_day_sales'),
+        ),
+    ]
@@ -0,0 +1,21 @@
+# Generated by Django 4.2.1 on 2026-10-18 22:49
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('store', '0016_vendor_daily_sales'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='order',
+            index=models.Index(fields=['created_at'], name='order_created_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='product',
+            index=models.Index(fields=['-created_at'], name='product_newest_idx'),
+        ),
+    ]
@@ -1,28 +1,65 @@
 from statistics import mode
 from django.contrib.auth.models import User
+from django.core.exceptions import ValidationError
 from django.db import models
+from django.db.models.functions import Concat, Substr
 from django.core.files import File
 
 from io import BytesIO
-from PIL import Image
+
+from core.media import versioned_url
+
+def subtree_filter(path, field='path'):
+    """
+    Builds a filter matching every materialized path that starts with the given path.
+
+    Paths only contain digits and '/', and '/' sorts right before '0', so the subtree is the
+    range [path, path with its trailing '/' replaced by '0'). Unlike a LIKE prefix match,
+    this range can always be answered from the index on the path column.
+
+    Args:
+        path (str): The materialized path of the subtree root.
+        field (str, optional): The lookup path of the path column (default is 'path').
+
+    Returns:
+        Q: The filter matching the subtree, including its root.
+
+    """
+    return models.Q(**{field + '__gte': path, field + '__lt': path[:-1] + '0'})
 
 class Category(models.Model):
     """
     Represents a category.
 
+    Categories form a tree. Every category stores its materialized path, the zero-padded ids of
+    its ancestors and itself, so subtrees and ancestors can be fetched without recursive lookups.
+
     Attributes:
+        PATH_STEP_LENGTH (int): The number of digits of one path step.
+        parent (ForeignKey): The parent category, or None for a root category.
         title (CharField): The title of the category.
         slug (SlugField): The slug field for the category's URL.
+        path (CharField): The materialized path of the category, for example '00000001/00000004/'.
+        depth (IntegerField): The depth of the category, 0 for root categories.
 
     Meta:
         verbose_name_plural (str): The plural name for the category model.
+        ordering (tuple): Specifies the default ordering for the categories.
 
     Methods:
         __str__(self): Returns a string representation of the category.
+        get_ancestor_ids(self): Returns the ids of the category's ancestors and itself.
+        get_breadcrumbs(self): Returns the category's ancestors and itself, root first.
+        get_descendants(self): Returns the category and every category below it.
 
     """
+    PATH_STEP_LENGTH = 8
+
+    parent = models.ForeignKey('self', related_name='children', on_delete=models.CASCADE, blank=True, null=True)
     title = models.CharField(max_length=50)
     slug = models.SlugField(max_length=50)
+    path = models.CharField(max_length=255, db_index=True, editable=False, default='')
+    depth = models.IntegerField(default=0, editable=False)
 
     class Meta:
         """
@@ -30,9 +67,11 @@ class Category(models.Model):
 
         Attributes:
             verbose_name_plural (str): The plural name for the category model.
+            ordering (tuple): Specifies the default ordering for the categories.
 
         """
         verbose_name_plural = 'Categories'
+        ordering = ('path',)
 
     def __str__(self):
         """
@@ -44,6 +83,94 @@ class Category(models.Model):
         """
         return self.title
 
+    def clean(self):
+        """
+        Prevents a category from being moved below itself.
+
+        Raises:
+            ValidationError: If the parent is the category itself or one of its descendants.
+
+        """
+        if self.path and self.parent_id and self.parent.path.startswith(self.path):
+            raise ValidationError({'parent': 'A category cannot be moved below itself.'})
+
+    def save(self, *args, **kwargs):
+        """
+        Saves the category and keeps the materialized paths of it and its descendants up to date.
+
+        A new category is inserted first, because its own id is part of its path.
+        When a category is moved, all its descendants are rewritten with a single UPDATE.
+        Saves limited to update_fields without the parent leave the paths alone and cost no extra query.
+
+        Raises:
+            ValueError: If the parent is the category itself or one of its descendants.
+
+        """
+        update_fields = kwargs.get('update_fields')
+
+        if self.pk is not None and update_fields is not None:
+            update_fields = set(update_fields)
+
+            if not update_fields & {'parent', 'parent_id'}:
+                super().save(*args, **kwargs)
+                return
+
+            kwargs['update_fields'] = update_fields | {'path', 'depth'}
+
+        old_path = self.path
+        old_depth = self.depth
+
+        # Read the parent's path from the database, an in-memory parent may be stale after a move
+        parent_path = Category.objects.values_list('path', flat=True).get(pk=self.parent_id) if self.parent_id else ''
+
+        if self.path and parent_path.startswith(self.path):
+            raise ValueError('A category cannot be moved below itself.')
+
+        if self.pk is None:
+            super().save(*args, **kwargs)
+            args, kwargs = (), {}
+
+        self.path = '%s%0*d/' % (parent_path, self.PATH_STEP_LENGTH, self.pk)
+        self.depth = self.path.count('/') - 1
+
+        super().save(*args, **kwargs)
+
+        if old_path and old_path != self.path:
+            Category.objects.filter(subtree_filter(old_path)).exclude(pk=self.pk).update(
+                path=Concat(models.Value(self.path), Substr('path', len(old_path) + 1)),
+                depth=models.F('depth') + (self.depth - old_depth),
+            )
+
+    def get_ancestor_ids(self):
+        """
+        Returns the ids of the category's ancestors and itself, parsed from the materialized path.
+
+        Returns:
+            list: The category ids, root first.
+
+        """
+        return [int(step) for step in self.path.split('/') if step]
+
+    def get_breadcrumbs(self):
+        """
+        Returns the category's ancestors and itself with a single query.
+
+        Returns:
+            QuerySet: The categories, root first.
+
+        """
+        return Category.objects.filter(pk__in=self.get_ancestor_ids()).order_by('path')
+
+    def get_descendants(self):
+        """
+        Returns the category and every category below it with a single indexed range query.
+
+        Returns:
+            QuerySet: The categories of the subtree.
+
+        """
+        return Category.objects.filter(subtree_filter(self.path))
+
 class Product(models.Model):
     """
     Represents a product.
@@ -65,14 +192,21 @@ class Product(models.Model):
         created_at (DateTimeField): The date and time when the product was created.
         updated_at (DateTimeField): The date and time when the product was last updated.
         status (CharField): The status of the product.
+        stock (PositiveIntegerField): The number of units in stock, or None if stock isn't tracked.
+        average_rating (FloatField): The average review rating, maintained when reviews are written.
+        review_count (IntegerField): The number of reviews, maintained when reviews are written.
+        similar_products_stale (BooleanField): Whether the title or description changed since the similar
+                                               products were last computed.
 
     Meta:
         ordering (tuple): Specifies the default ordering for the products.
+        indexes (list): Indexes backing the category and search sorts and filters, and the admin changelist.
 
     Methods:
         __str__(self): Returns a string representation of the product.
         get_display_price(self): Returns the display price of the product.
         get_thumbnail(self): Returns the URL of the product's thumbnail image.
+        is_in_stock(self): Returns whether the product can be bought.
         make_thumbnail(self, image, size=(300, 300)): Creates a thumbnail image for the product.
 
     """
@@ -99,6 +233,10 @@ class Product(models.Model):
     created_at = models.DateTimeField(auto_now_add=True)
     updated_at = models.DateTimeField(auto_now=True)
     status = models.CharField(max_length=50, choices=STATUS_CHOICES, default=ACTIVE)
+    stock = models.PositiveIntegerField(blank=True, null=True, help_text='Leave empty for unlimited stock.')
+    average_rating = models.FloatField(default=0)
+    review_count = models.IntegerField(default=0)
+    similar_products_stale = models.BooleanField(default=True, db_index=True)
 
     class Meta:
         """
@@ -106,9 +244,20 @@ class Product(models.Model):
 
         Attributes:
             ordering (tuple): Specifies the default ordering for the products.
+            indexes (list): Indexes backing the category and search sorts and filters, and the admin changelist.
 
         """
         ordering = ('-created_at',)
+        indexes = [
+            models.Index(fields=['status', '-created_at'], name='product_status_newest_idx'),
+            models.Index(fields=['status', 'price'], name='product_status_price_idx'),
+            models.Index(fields=['status', '-average_rating'], name='product_status_rating_idx'),
+            models.Index(fields=['category', 'status', '-created_at'], name='product_cat_newest_idx'),
+            models.Index(fields=['category', 'status', 'price'], name='product_cat_price_idx'),
+            models.Index(fields=['category', 'status', '-average_rating'], name='product_cat_rating_idx'),
+            models.Index(fields=['user', 'status'], name='product_vendor_status_idx'),
+            models.Index(fields=['-created_at'], name='product_newest_idx'),
+        ]
 
     def __str__(self):
         """
@@ -130,22 +279,37 @@ class Product(models.Model):
         """
         return self.price / 100
 
+    def is_in_stock(self):
+        """
+        Returns whether the product can be bought.
+
+        Returns:
+            bool: False if stock is tracked and no units are left, True otherwise.
+
+        """
+        return self.stock is None or self.stock > 0
+
     def get_thumbnail(self):
         """
         Returns the URL of the product's thumbnail image.
 
+        A missing thumbnail is made on the spot and only its column is written, with an UPDATE that
+        sends no signals: this runs while rendering, often on an instance read from a replica, whose
+        stock and rating may already be out of date.
+
         Returns:
-            str: The URL of the product's thumbnail image.
+            str: The content-hashed URL of the product's thumbnail image.
 
         """
         if self.thumbnail:
-            return self.thumbnail.url
+            return versioned_url(self.thumbnail.name)
         else:
             if self.image:
-                self.thumbnail = self.make_thumbnail(self.image)
-                self.save()
+                thumbnail = self.make_thumbnail(self.image)
+                self.thumbnail.save(thumbnail.name, thumbnail, save=False)
+                Product.objects.filter(pk=self.pk).update(thumbnail=self.thumbnail.name)
 
-                return self.thumbnail.url
+                return versioned_url(self.thumbnail.name)
 
     def make_thumbnail(self, image, size=(300, 300)):
         """
@@ -159,6 +323,9 @@ class Product(models.Model):
             File: The thumbnail image file.
 
         """
+        # Imported here so loading the models doesn't pay for Pillow, warm_up() preloads it for workers
+        from PIL import Image
+
         img = Image.open(image)
         img.convert('RGB')
         img.thumbnail(size)
@@ -172,21 +339,27 @@ class Product(models.Model):
 
     def get_rating(self):
         """
-        Calculates and returns the average rating for the object.
+        Returns the average rating for the object.
+
+        The average is kept up to date whenever a review is written, so no reviews are loaded here.
         
         Returns:
             float: The average rating, rounded to 2 decimal places.
         
         """
-        reviews_total = 0
+        return round(self.average_rating, 2)
 
-        for review in self.reviews.all():
-            reviews_total += review.rating
-        
-        if reviews_total > 0:
-            return reviews_total / self.reviews.count()
-        
-        return 0
+    def update_rating(self):
+        """
+        Recomputes the denormalized average rating and review count from the product's reviews.
+
+        """
+        stats = self.reviews.aggregate(average=models.Avg('rating'), count=models.Count('id'))
+
+        self.average_rating = stats['average'] or 0
+        self.review_count = stats['count']
+
+        Product.objects.filter(pk=self.pk).update(average_rating=self.average_rating, review_count=self.review_count)
 
 class Order(models.Model):
     """
@@ -197,11 +370,18 @@ class Order(models.Model):
         last_name (CharField): The last name of the order's recipient.
         address (CharField): The address of the order's recipient.
         city (CharField): The city of the order's recipient.
-        paid_amount (IntegerField): The amount paid for the order. Can be blank and null.
+        paid_amount (IntegerField): The amount paid for the order, which is the order total. Can be blank and null.
         is_paid (CharField): Indicates whether the order is paid or not.
+        item_count (IntegerField): The number of units in the order, stored at checkout.
         created_by (ForeignKey): Foreign key to the User model representing the user who created the order.
         created_at (DateTimeField): The date and time when the order was created.
 
+    Meta:
+        indexes (list): The indexes used to list a user's orders, newest first, and to filter orders by date.
+
+    Methods:
+        get_display_paid_amount(): Returns the display total of the order, which is the paid amount divided by 100.
+
     """
     first_name = models.CharField(max_length=255)
     last_name = models.CharField(max_length=255)
@@ -209,9 +389,33 @@ class Order(models.Model):
     city = models.CharField(max_length=255)
     paid_amount = models.IntegerField(blank=True, null=True)
     is_paid = models.CharField(max_length=255)
+    item_count = models.IntegerField(default=0)
     created_by = models.ForeignKey(User, related_name='orders', on_delete=models.SET_NULL, null=True)
     created_at = models.DateTimeField(auto_now_add=True)
 
+    class Meta:
+        """
+        Metadata for the Order model.
+
+        Attributes:
+            indexes (list): The indexes used to list a user's orders, newest first, and to filter orders by date.
+
+        """
+        indexes = [
+            models.Index(fields=['created_by', '-created_at'], name='order_user_newest_idx'),
+            models.Index(fields=['created_at'], name='order_created_idx'),
+        ]
+
+    def get_display_paid_amount(self):
+        """
+        Returns the display total of the order.
+
+        Returns:
+            float: The display total of the order.
+
+        """
+        return (self.paid_amount or 0) / 100
+
 class OrderItem(models.Model):
     """
     Represents an item in an order.
@@ -259,4 +463,261 @@ class Review(models.Model):
     rating = models.IntegerField(default=3)
     content = models.TextField()
     created_by = models.ForeignKey(User, related_name='reviews', on_delete=models.CASCADE)
-    created_at = models.DateTimeField(auto_now_add=True)
\ No newline at end of file
+    created_at = models.DateTimeField(auto_now_add=True)
+
+class ProductTrigram(models.Model):
+    """
+    Represents one trigram of a product title in the fuzzy search index.
+
+    Fields:
+        trigram (CharField): The three character trigram.
+        product (ForeignKey): The product whose title contains the trigram.
+
+    """
+    trigram = models.CharField(max_length=3)
+    product = models.ForeignKey(Product, related_name='trigrams', on_delete=models.CASCADE)
+
+    class Meta:
+        """
+        Metadata for the ProductTrigram model.
+
+        Attributes:
+            constraints (list): The unique (trigram, product) pair, which also serves as the lookup index.
+
+        """
+        constraints = [
+            models.UniqueConstraint(fields=['trigram', 'product'], name='unique_product_trigram'),
+        ]
+
+class ProductCooccurrence(models.Model):
+    """
+    Represents one cell of the sparse product co-occurrence matrix.
+
+    Fields:
+        product (ForeignKey): The product of the matrix row.
+        related (ForeignKey): The product of the matrix column.
+        count (IntegerField): The number of orders containing both products.
+
+    """
+    product = models.ForeignKey(Product, related_name='cooccurrences', on_delete=models.CASCADE)
+    related = models.ForeignKey(Product, related_name='+', on_delete=models.CASCADE)
+    count = models.IntegerField(default=0)
+
+    class Meta:
+        """
+        Metadata for the ProductCooccurrence model.
+
+        Attributes:
+            constraints (list): One row per (product, related) pair.
+            indexes (list): The index used to select the strongest pairs of a product.
+
+        """
+        constraints = [
+            models.UniqueConstraint(fields=['product', 'related'], name='unique_product_cooccurrence'),
+        ]
+        indexes = [
+            models.Index(fields=['product', '-count'], name='cooccurrence_top_idx'),
+        ]
+
+class ProductRecommendation(models.Model):
+    """
+    Represents a precomputed recommendation shown on a product's detail page.
+
+    Fields:
+        BOUGHT_TOGETHER (str): Constant for products frequently bought together.
+        SIMILAR (str): Constant for products with a similar title and description.
+        KIND_CHOICES (tuple): Choices for the kind field.
+        product (ForeignKey): The product the recommendation is shown for.
+        recommended (ForeignKey): The recommended product.
+        kind (CharField): The kind of recommendation.
+        rank (IntegerField): The position of the recommendation, starting at 1.
+        score (FloatField): The score the recommendation was ranked by.
+
+    """
+    BOUGHT_TOGETHER = 'bought_together'
+    SIMILAR = 'similar'
+
+    KIND_CHOICES = (
+        (BOUGHT_TOGETHER, 'Frequently bought together'),
+        (SIMILAR, 'Similar products'),
+    )
+
+    product = models.ForeignKey(Product, related_name='recommendations', on_delete=models.CASCADE)
+    recommended = models.ForeignKey(Product, related_name='recommended_for', on_delete=models.CASCADE)
+    kind = models.CharField(max_length=50, choices=KIND_CHOICES)
+    rank = models.IntegerField()
+    score = models.FloatField()
+
+    class Meta:
+        """
+        Metadata for the ProductRecommendation model.
+
+        Attributes:
+            indexes (list): The index used to serve the recommendations of a product.
+
+        """
+        indexes = [
+            models.Index(fields=['product', 'kind', 'rank'], name='recommendation_lookup_idx'),
+        ]
+
+class BatchCursor(models.Model):
+    """
+    Remembers how far an incremental batch job has processed its input.
+
+    Fields:
+        name (CharField): The name of the batch job.
+        position (BigIntegerField): The id of the last processed row.
+        updated_at (DateTimeField): The date and time when the cursor last moved.
+
+    """
+    name = models.CharField(max_length=50, unique=True)
+    position = models.BigIntegerField(default=0)
+    updated_at = models.DateTimeField(auto_now=True)
+
+    def __str__(self):
+        """
+        Returns a string representation of the cursor.
+
+        Returns:
+            str: The name and position of the cursor.
+
+        """
+        return '%s: %d' % (self.name, self.position)
+
+class StockReservation(models.Model):
+    """
+    Represents units of a product held for a shopper during checkout.
+
+    The units are taken from the product's stock when the reservation is made and given back
+    when it expires, unless the checkout completes first.
+
+    Fields:
+        product (ForeignKey): The reserved product.
+        session_key (CharField): The session of the shopper holding the reservation.
+        quantity (PositiveIntegerField): The number of reserved units.
+        expires_at (DateTimeField): The date and time when the units return to stock.
+
+    """
+    product = models.ForeignKey(Product, related_name='reservations', on_delete=models.CASCADE)
+    session_key = models.CharField(max_length=40, db_index=True)
+    quantity = models.PositiveIntegerField()
+    expires_at = models.DateTimeField(db_index=True)
+
+    class Meta:
+        """
+        Metadata for the StockReservation model.
+
+        Attributes:
+            constraints (list): One reservation per product and session.
+
+        """
+        constraints = [
+            models.UniqueConstraint(fields=['session_key', 'product'], name='unique_session_reservation'),
+        ]
+
+class ArchivedOrder(models.Model):
+    """
+    Represents an order moved out of the Order and OrderItem tables by the archive_orders command.
+
+    The summary columns stay queryable for reporting, while the full order and its items are kept
+    as zlib-compressed JSON so the order can be restored exactly, with its original id.
+
+    Fields:
+        id (BigIntegerField): The id of the original order.
+        created_by (ForeignKey): The user who created the order.
+        created_at (DateTimeField): The date and time when the order was created.
+        paid_amount (IntegerField): The amount paid for the order, in cents.
+        item_count (IntegerField): The number of units in the order.
+        data (BinaryField): The compressed JSON of the order and its items.
+        archived_at (DateTimeField): The date and time when the order was archived.
+
+    Methods:
+        get_display_paid_amount(): Returns the display total of the order, which is the paid amount divided by 100.
+
+    """
+    id = models.BigIntegerField(primary_key=True)
+    created_by = models.ForeignKey(User, related_name='archived_orders', on_delete=models.SET_NULL, null=True)
+    created_at = models.DateTimeField(db_index=True)
+    paid_amount = models.IntegerField(blank=True, null=True)
+    item_count = models.IntegerField(default=0)
+    data = models.BinaryField()
+    archived_at = models.DateTimeField(auto_now_add=True)
+
+    def get_display_paid_amount(self):
+        """
+        Returns the display total of the order.
+
+        Returns:
+            float: The display total of the order.
+
+        """
+        return (self.paid_amount or 0) / 100
+
+class AbandonedCart(models.Model):
+    """
+    Represents a snapshot of a non-empty cart whose session expired without a checkout.
+
+    Fields:
+        user (ForeignKey): The user the session belonged to, if they were logged in.
+        items (JSONField): The quantity per product id.
+        item_count (IntegerField): The number of units in the cart.
+        value (IntegerField): The price of the cart in cents when it was abandoned.
+        abandoned_at (DateTimeField): The date and time when the session expired.
+
+    """
+    user = models.ForeignKey(User, related_name='abandoned_carts', on_delete=models.SET_NULL, null=True, blank=True)
+    items = models.JSONField(default=dict)
+    item_count = models.IntegerField(default=0)
+    value = models.IntegerField(default=0)
+    abandoned_at = models.DateTimeField(db_index=True)
+
+class VendorDailySales(models.Model):
+    """
+    Represents the sales of one product on one day, rolled up from order items by the rollup_sales command.
+
+    Fields:
+        vendor (ForeignKey): The vendor of the product.
+        product (ForeignKey): The sold product.
+        day (DateField): The day the orders were placed, in the site's time zone.
+        revenue (IntegerField): The revenue of the product on that day, in cents.
+        units (IntegerField): The number of units sold on that day.
+
+    Meta:
+        constraints (list): One row per product and day.
+        indexes (list): The index used to load a vendor's sales over a date range.
+
+    Methods:
+        get_display_revenue(): Returns the display revenue, which is the revenue divided by 100.
+
+    """
+    vendor = models.ForeignKey(User, related_name='daily_sales', on_delete=models.CASCADE)
+    product = models.ForeignKey(Product, related_name='daily_sales', on_delete=models.CASCADE)
+    day = models.DateField()
+    revenue = models.IntegerField(default=0)
+    units = models.IntegerField(default=0)
+
+    class Meta:
+        """
+        Metadata for the VendorDailySales model.
+
+        Attributes:
+            constraints (list): One row per product and day.
+            indexes (list): The (vendor, day) index used to load a vendor's sales over a date range.
+
+        """
+        constraints = [
+            models.UniqueConstraint(fields=['product', 'day'], name='unique_product_day_sales'),
+        ]
+        indexes = [
+            models.Index(fields=['vendor', 'day'], name='sales_vendor_day_idx'),
+        ]
+
+    def get_display_revenue(self):
+        """
+        Returns the display revenue of the row.
+
+        Returns:
+            float: The display revenue.
+
+        """
+        return self.revenue / 100
@@ -0,0 +1,389 @@
+import heapq
+import math
+import re
+from collections import Counter
+from datetime import timedelta
+from itertools import combinations, groupby
+from operator import itemgetter
+
+from django.db import transaction
+from django.db.models import F, Window
+from django.db.models.functions import RowNumber
+from django.utils import timezone
+
+from .models import BatchCursor, Order, OrderItem, Product, ProductCooccurrence, ProductRecommendation
+
+COOCCURRENCE_CURSOR = 'cooccurrence'
+
+# Orders with more distinct products than this only count their first products,
+# so one huge basket can't add a quadratic number of pairs
+MAX_BASKET_SIZE = 50
+
+# Orders younger than this may still be receiving their items at checkout
+ORDER_SETTLE_TIME = timedelta(minutes=5)
+
+TOKEN_RE = re.compile(r'[^\W_]{2,}')
+
+STOP_WORDS = frozenset((
+    'and', 'are', 'for', 'from', 'has', 'have', 'in', 'is', 'it', 'its', 'of', 'on', 'or',
+    'that', 'the', 'this', 'to', 'with', 'you', 'your',
+))
+
+# Terms found in more than this share of the catalogue carry almost no weight
+# but would make every product a neighbour of every other one
+MAX_DOCUMENT_FREQUENCY = 0.5
+
+def stream_baskets(after_order_id, batch_size=1000):
+    """
+    Streams the products of every order after a given order id, one batch of orders at a time.
+
+    Args:
+        after_order_id (int): Only orders with a higher id are streamed.
+        batch_size (int, optional): The number of orders loaded per query (default is 1000).
+
+    Yields:
+        tuple: The order id and the sorted list of distinct product ids in the order.
+
+    """
+    settled = timezone.now() - ORDER_SETTLE_TIME
+
+    while True:
+        order_ids = list(
+            Order.objects
+            .filter(pk__gt=after_order_id, created_at__lte=settled)
+            .order_by('pk')
+            .values_list('pk', flat=True)[:batch_size]
+        )
+
+        if not order_ids:
+            return
+
+        items = (
+            OrderItem.objects
+            .filter(order_id__in=order_ids)
+            .order_by('order_id')
+            .values_list('order_id', 'product_id')
+        )
+        baskets = {order_id: sorted({product_id for _, product_id in rows}) for order_id, rows in groupby(items, key=itemgetter(0))}
+
+        for order_id in order_ids:
+            yield order_id, baskets.get(order_id, [])
+
+        after_order_id = order_ids[-1]
+
+def add_cooccurrences(counts, batch_size=500):
+    """
+    Adds a batch of sparse pair counts to the stored co-occurrence matrix.
+
+    Args:
+        counts (Counter): The counts keyed by (product id, related product id).
+        batch_size (int, optional): The number of matrix rows merged per query (default is 500).
+
+    """
+    rows = {}
+
+    for (product_id, related_id), count in counts.items():
+        rows.setdefault(product_id, {})[related_id] = count
+
+    product_ids = sorted(rows)
+
+    for start in range(0, len(product_ids), batch_size):
+        batch = product_ids[start:start + batch_size]
+        existing = ProductCooccurrence.objects.filter(product_id__in=batch).values_list('product_id', 'related_id', 'count')
+
+        for product_id, related_id, count in existing.iterator():
+            if related_id in rows[product_id]:
+                rows[product_id][related_id] += count
+
+        ProductCooccurrence.objects.bulk_create(
+            [
+                ProductCooccurrence(product_id=product_id, related_id=related_id, count=count)
+                for product_id in batch
+                for related_id, count in rows[product_id].items()
+            ],
+            batch_size=500,
+            update_conflicts=True,
+            unique_fields=['product', 'related'],
+            update_fields=['count'],
+        )
+
+def refresh_bought_together(product_ids, top_k, batch_size=500):
+    """
+    Rewrites the "frequently bought together" recommendations of the given products.
+
+    The top K related products of every product are selected in the database with a window function,
+    so only K rows per product are ever loaded.
+
+    Args:
+        product_ids (iterable): The ids of the products to refresh.
+        top_k (int): The number of recommendations to keep per product.
+        batch_size (int, optional): The number of products refreshed per query (default is 500).
+
+    """
+    product_ids = sorted(product_ids)
+
+    for start in range(0, len(product_ids), batch_size):
+        batch = product_ids[start:start + batch_size]
+        rows = (
+            ProductCooccurrence.objects
+            .filter(product_id__in=batch)
+            .annotate(rank=Window(RowNumber(), partition_by=F('product_id'), order_by=(F('count').desc(), F('related_id').asc())))
+            .filter(rank__lte=top_k)
+            .values_list('product_id', 'related_id', 'count', 'rank')
+        )
+
+        recommendations = [
+            ProductRecommendation(
+                product_id=product_id,
+                recommended_id=related_id,
+                kind=ProductRecommendation.BOUGHT_TOGETHER,
+                rank=rank,
+                score=count,
+            )
+            for product_id, related_id, count, rank in rows
+        ]
+
+        with transaction.atomic():
+            ProductRecommendation.objects.filter(product_id__in=batch, kind=ProductRecommendation.BOUGHT_TOGETHER).delete()
+            ProductRecommendation.objects.bulk_create(recommendations, batch_size=500)
+
+def build_bought_together(top_k, full=False, batch_size=1000, max_pairs=200000):
+    """
+    Updates the co-occurrence matrix from new orders and refreshes the affected recommendations.
+
+    Orders are streamed in batches after the position stored in the 'cooccurrence' BatchCursor.
+    Pair counts are accumulated in memory as a sparse (row, column) -> count map and flushed to the
+    database whenever it holds more than max_pairs cells, so memory stays bounded for any order history.
+
+    Args:
+        top_k (int): The number of recommendations to keep per product.
+        full (bool, optional): Whether to discard the matrix and rebuild it from all orders (default is False).
+        batch_size (int, optional): The number of orders loaded per query (default is 1000).
+        max_pairs (int, optional): The number of pending pair counts that triggers a flush (default is 200000).
+
+    Returns:
+        dict: The number of processed orders and refreshed products.
+
+    """
+    cursor, _ = BatchCursor.objects.get_or_create(name=COOCCURRENCE_CURSOR)
+
+    if full:
+        ProductCooccurrence.objects.all().delete()
+        ProductRecommendation.objects.filter(kind=ProductRecommendation.BOUGHT_TOGETHER).delete()
+        cursor.position = 0
+        cursor.save()
+
+    counts = Counter()
+    touched = set()
+    orders = 0
+
+    def flush(position):
+        with transaction.atomic():
+            add_cooccurrences(counts)
+            cursor.position = position
+            cursor.save()
+
+        counts.clear()
+
+    for order_id, basket in stream_baskets(cursor.position, batch_size):
+        basket = basket[:MAX_BASKET_SIZE]
+
+        for a, b in combinations(basket, 2):
+            counts[(a, b)] += 1
+            counts[(b, a)] += 1
+
+        touched.update(basket)
+        orders += 1
+
+        if len(counts) >= max_pairs:
+            flush(order_id)
+
+        last_order_id = order_id
+
+    if orders:
+        flush(last_order_id)
+
+    refresh_bought_together(touched, top_k)
+
+    return {
+        'orders': orders,
+        'products': len(touched),
+    }
+
+def tokenize(text):
+    """
+    Splits a text into lowercase terms, dropping stop words and single characters.
+
+    Args:
+        text (str): The text to split.
+
+    Returns:
+        list: The terms of the text.
+
+    """
+    return [term for term in TOKEN_RE.findall(text.lower()) if term not in STOP_WORDS]
+
+def build_tfidf_vectors():
+    """
+    Builds L2-normalized TF-IDF vectors for every active product.
+
+    Each vector is a sparse {term index: weight} map over the title and description.
+    The inverted index holds the same matrix column by column.
+
+    Returns:
+        tuple: The vectors keyed by product id and the inverted index, a list of
+               (product id, weight) postings per term index.
+
+    """
+    term_ids = {}
+    term_counts = {}
+    document_frequency = Counter()
+
+    products = Product.objects.filter(status=Product.ACTIVE).order_by('pk').values_list('pk', 'title', 'description')
+
+    for pk, title, description in products.iterator(chunk_size=2000):
+        counts = Counter(term_ids.setdefault(term, len(term_ids)) for term in tokenize('%s %s' % (title, description)))
+        term_counts[pk] = counts
+        document_frequency.update(counts.keys())
+
+    total = len(term_counts)
+    max_frequency = max(1, MAX_DOCUMENT_FREQUENCY * total)
+    idf = {
+        term: math.log((1 + total) / (1 + frequency)) + 1
+        for term, frequency in document_frequency.items()
+        if frequency <= max_frequency or total < 3
+    }
+
+    vectors = {}
+    postings = [[] for _ in range(len(term_ids))]
+
+    for pk, counts in term_counts.items():
+        vector = {term: (1 + math.log(count)) * idf[term] for term, count in counts.items() if term in idf}
+        norm = math.sqrt(sum(weight * weight for weight in vector.values()))
+
+        if not norm:
+            continue
+
+        vector = {term: weight / norm for term, weight in vector.items()}
+        vectors[pk] = vector
+
+        for term, weight in vector.items():
+            postings[term].append((pk, weight))
+
+    return vectors, postings
+
+def nearest_neighbours(product_ids, vectors, postings, top_k):
+    """
+    Finds the most similar products of the given products by cosine similarity.
+
+    This is the sparse product of the rows of the given products with the transposed TF-IDF matrix,
+    accumulated through the inverted index so only products sharing a term are ever scored.
+
+    Args:
+        product_ids (list): The ids of the products to find neighbours for.
+        vectors (dict): The TF-IDF vectors keyed by product id.
+        postings (list): The inverted index of the TF-IDF matrix.
+        top_k (int): The number of neighbours to keep per product.
+
+    Returns:
+        dict: The list of (similarity, product id) neighbours per product id, most similar first.
+
+    """
+    neighbours = {}
+
+    for pk in product_ids:
+        scores = Counter()
+
+        for term, weight in vectors.get(pk, {}).items():
+            for other, other_weight in postings[term]:
+                scores[other] += weight * other_weight
+
+        scores.pop(pk, None)
+        neighbours[pk] = heapq.nlargest(top_k, ((score, other) for other, score in scores.items()))
+
+    return neighbours
+
+def store_similar_products(neighbours):
+    """
+    Replaces the stored "similar products" recommendations of the given products.
+
+    Args:
+        neighbours (dict): The list of (similarity, product id) neighbours per product id.
+
+    """
+    with transaction.atomic():
+        ProductRecommendation.objects.filter(product_id__in=list(neighbours), kind=ProductRecommendation.SIMILAR).delete()
+        ProductRecommendation.objects.bulk_create(
+            [
+                ProductRecommendation(
+                    product_id=pk,
+                    recommended_id=other,
+                    kind=ProductRecommendation.SIMILAR,
+                    rank=rank,
+                    score=score,
+                )
+                for pk, matches in neighbours.items()
+                for rank, (score, other) in enumerate(matches, 1)
+            ],
+            batch_size=500,
+        )
+
+def build_similar_products(top_k, full=False, block_size=256):
+    """
+    Precomputes the "similar products" recommendations from product titles and descriptions.
+
+    The TF-IDF matrix of the active catalogue is built in memory, then neighbours are computed
+    and stored one block of products at a time.
+    A full build refreshes every active product. An incremental build only refreshes products whose
+    text changed since the last build (similar_products_stale), the products currently recommending them,
+    and their new neighbours, since similarity is symmetric.
+
+    Args:
+        top_k (int): The number of recommendations to keep per product.
+        full (bool, optional): Whether to refresh every active product (default is False).
+        block_size (int, optional): The number of products scored and stored per block (default is 256).
+
+    Returns:
+        dict: The number of vectorized and refreshed products.
+
+    """
+    started = timezone.now()
+    stale = list(Product.objects.filter(similar_products_stale=True).values_list('pk', flat=True))
+
+    if not full and not stale:
+        return {'vectorized': 0, 'refreshed': 0}
+
+    vectors, postings = build_tfidf_vectors()
+
+    if full:
+        targets = sorted(vectors)
+    else:
+        targets = set(stale)
+
+        for block_start in range(0, len(stale), block_size):
+            block = stale[block_start:block_start + block_size]
+
+            targets.update(
+                ProductRecommendation.objects
+                .filter(recommended_id__in=block, kind=ProductRecommendation.SIMILAR)
+                .values_list('product_id', flat=True)
+            )
+
+            for matches in nearest_neighbours(block, vectors, postings, top_k).values():
+                targets.update(other for score, other in matches)
+
+        targets = sorted(targets)
+
+    for block_start in range(0, len(targets), block_size):
+        block = targets[block_start:block_start + block_size]
+        store_similar_products(nearest_neighbours(block, vectors, postings, top_k))
+
+    # Products edited while the build was running stay stale for the next run
+    for block_start in range(0, len(stale), block_size):
+        block = stale[block_start:block_start + block_size]
+        Product.objects.filter(pk__in=block, updated_at__lte=started).update(similar_products_stale=False)
+
+    return {
+        'vectorized': len(vectors),
+        'refreshed': len(targets),
+    }
@@ -0,0 +1,277 @@
+import hashlib
+import math
+import re
+import time
+import unicodedata
+
+from django.conf import settings
+from django.core.cache import cache
+from django.db.models import Count, Q
+
+from .facets import apply_filters, apply_sort, compute_facets
+from .models import Product, ProductTrigram
+
+WORD_RE = re.compile(r'\w+')
+
+CATALOGUE_VERSION_KEY = 'store:catalogue-version'
+SEARCH_HITS_KEY = 'store:search-cache-hits'
+SEARCH_MISSES_KEY = 'store:search-cache-misses'
+
+def normalize_query(query):
+    """
+    Normalizes a search query so equivalent queries share one cache entry.
+
+    Applies unicode NFKC normalization, case folding and whitespace collapsing.
+
+    Args:
+        query (str): The raw search query.
+
+    Returns:
+        str: The normalized query.
+
+    """
+    return ' '.join(unicodedata.normalize('NFKC', query).casefold().split())
+
+def get_catalogue_version():
+    """
+    Returns the current catalogue version.
+
+    The version is seeded from the clock, so an evicted version never falls back to a value
+    that older cache entries were stored under.
+
+    Returns:
+        int: The catalogue version.
+
+    """
+    version = cache.get(CATALOGUE_VERSION_KEY)
+
+    if version is None:
+        cache.add(CATALOGUE_VERSION_KEY, time.time_ns(), None)
+        version = cache.get(CATALOGUE_VERSION_KEY)
+
+    return version
+
+def bump_catalogue_version():
+    """
+    Invalidates every cached search result by moving to a new catalogue version.
+
+    """
+    try:
+        cache.incr(CATALOGUE_VERSION_KEY)
+    except ValueError:
+        cache.set(CATALOGUE_VERSION_KEY, time.time_ns(), None)
+
+def _count(key):
+    """
+    Increments a cache counter, creating it if needed.
+
+    Args:
+        key (str): The cache key of the counter.
+
+    """
+    try:
+        cache.incr(key)
+    except ValueError:
+        cache.add(key, 0, None)
+        cache.incr(key)
+
+def search_cache_stats():
+    """
+    Returns the hit and miss counters of the search result cache.
+
+    Returns:
+        dict: The number of hits and misses and the hit ratio.
+
+    """
+    hits = cache.get(SEARCH_HITS_KEY, 0)
+    misses = cache.get(SEARCH_MISSES_KEY, 0)
+    total = hits + misses
+
+    return {
+        'hits': hits,
+        'misses': misses,
+        'hit_ratio': hits / total if total else 0,
+    }
+
+def reset_search_cache_stats():
+    """
+    Resets the hit and miss counters of the search result cache.
+
+    """
+    cache.delete_many([SEARCH_HITS_KEY, SEARCH_MISSES_KEY])
+
+def trigrams(text):
+    """
+    Splits a text into its set of trigrams.
+
+    Every word is lowercased and padded with two leading spaces and one trailing space,
+    so short words and word boundaries still produce trigrams.
+
+    Args:
+        text (str): The text to split.
+
+    Returns:
+        set: The trigrams of the text.
+
+    """
+    grams = set()
+
+    for word in WORD_RE.findall(text.lower()):
+        padded = '  %s ' % word
+
+        for i in range(len(padded) - 2):
+            grams.add(padded[i:i + 3])
+
+    return grams
+
+def similarity(a, b):
+    """
+    Returns the trigram similarity of two trigram sets.
+
+    The similarity is the number of shared trigrams divided by the number of distinct trigrams in both sets.
+
+    Args:
+        a (set): The first set of trigrams.
+        b (set): The second set of trigrams.
+
+    Returns:
+        float: The similarity between 0 and 1.
+
+    """
+    if not a or not b:
+        return 0
+
+    shared = len(a & b)
+
+    return shared / (len(a) + len(b) - shared)
+
+def index_product(product):
+    """
+    Rebuilds the trigram index rows of a product.
+
+    Args:
+        product (Product): The product to index.
+
+    """
+    ProductTrigram.objects.filter(product=product).delete()
+    ProductTrigram.objects.bulk_create([
+        ProductTrigram(trigram=gram, product=product) for gram in trigrams(product.title)
+    ])
+
+def fuzzy_search(query, limit=20, threshold=0.2):
+    """
+    Finds active products whose title is similar to the query.
+
+    Candidates are generated from the trigram index by counting shared trigrams per product,
+    so only products sharing enough trigrams with the query are ever loaded.
+    The candidates are then ranked by their exact trigram similarity.
+
+    Args:
+        query (str): The search query.
+        limit (int, optional): The maximum number of product ids to return (default is 20).
+        threshold (float, optional): The minimum similarity of a match (default is 0.2).
+
+    Returns:
+        list: The ids of the matching products, best match first.
+
+    """
+    grams = trigrams(query)
+
+    if not grams:
+        return []
+
+    # similarity <= shared / len(grams), so anything below this can never reach the threshold
+    min_shared = max(1, math.ceil(threshold * len(grams)))
+
+    candidates = (
+        ProductTrigram.objects
+        .filter(trigram__in=grams, product__status=Product.ACTIVE)
+        .values('product_id')
+        .annotate(shared=Count('id'))
+        .filter(shared__gte=min_shared)
+        .order_by('-shared')
+        .values_list('product_id', flat=True)[:limit * 5]
+    )
+
+    titles = Product.objects.filter(pk__in=list(candidates)).values_list('pk', 'title')
+    scored = []
+
+    for pk, title in titles:
+        score = similarity(grams, trigrams(title))
+
+        if score >= threshold:
+            scored.append((score, pk))
+
+    scored.sort(key=lambda match: (-match[0], match[1]))
+
+    return [pk for score, pk in scored[:limit]]
+
+def search_products(query, filters):
+    """
+    Runs a product search.
+
+    Active products whose title or description contains the query are matched.
+    If there are fewer than SEARCH_FUZZY_MIN_RESULTS of them, typo-tolerant matches
+    from the trigram index are matched as well.
+    Without an explicit sort, substring matches come first and fuzzy matches follow by similarity.
+
+    Args:
+        query (str): The normalized search query.
+        filters (dict): The cleaned filters and sort from parse_filters().
+
+    Returns:
+        dict: The ordered 'ids' of the matching products after filtering,
+              and the 'facets' of all matches before filtering.
+
+    """
+    active = Product.objects.filter(status=Product.ACTIVE)
+    exact = Q(title__icontains=query) | Q(description__icontains=query)
+    fuzzy_ids = []
+
+    if query and active.filter(exact)[:settings.SEARCH_FUZZY_MIN_RESULTS].count() < settings.SEARCH_FUZZY_MIN_RESULTS:
+        fuzzy_ids = fuzzy_search(query)
+
+    matches = active.filter(exact | Q(pk__in=fuzzy_ids))
+    results = apply_filters(matches, filters)
+
+    if filters['sort'] or not fuzzy_ids:
+        ids = list(apply_sort(results, filters['sort']).values_list('pk', flat=True))
+    else:
+        ids = list(apply_sort(results.filter(exact), '').values_list('pk', flat=True))
+        allowed = set(results.filter(pk__in=fuzzy_ids).values_list('pk', flat=True)) - set(ids)
+        ids += [pk for pk in fuzzy_ids if pk in allowed]
+
+    return {
+        'ids': ids,
+        'facets': compute_facets(matches),
+    }
+
+def cached_search_products(query, filters):
+    """
+    Runs a product search through the search result cache.
+
+    Entries are keyed on the normalized query, the filters and the catalogue version,
+    so any product write invalidates them all at once.
+
+    Args:
+        query (str): The raw search query.
+        filters (dict): The cleaned filters and sort from parse_filters().
+
+    Returns:
+        dict: The ordered 'ids' of the matching products and the 'facets' of the search.
+
+    """
+    query = normalize_query(query)
+    fingerprint = '%s|%s' % (query, sorted(filters.items()))
+    digest = hashlib.md5(fingerprint.encode()).hexdigest()
+    key = 'store:search:%s:%s' % (get_catalogue_version(), digest)
+    result = cache.get(key)
+
+    if result is None:
+        _count(SEARCH_MISSES_KEY)
+        result = search_products(query, filters)
+        cache.set(key, result, settings.SEARCH_CACHE_TIMEOUT)
+    else:
+        _count(SEARCH_HITS_KEY)
+
+    return result
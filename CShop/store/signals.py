@@ -0,0 +1,139 @@
+from django.conf import settings
+from django.contrib.auth.models import User
+from django.db.models.signals import post_delete, post_save
+from django.dispatch import receiver
+
+from core.models import CartSession
+from core.sessions import sessions_expired
+from userprofile.models import Userprofile
+
+from .models import AbandonedCart, Category, Product, Review
+from .search import bump_catalogue_version, index_product
+
+@receiver(post_save, sender=Product)
+def update_search_index(sender, instance, update_fields=None, **kwargs):
+    """
+    Keeps the trigram index in sync with the product title.
+
+    Args:
+        sender (Model): The Product model class.
+        instance (Product): The saved product.
+        update_fields (frozenset, optional): The fields passed to save(), if any.
+
+    """
+    if update_fields is None or 'title' in update_fields:
+        index_product(instance)
+
+@receiver(post_save, sender=Product)
+@receiver(post_delete, sender=Product)
+@receiver(post_save, sender=Category)
+@receiver(post_delete, sender=Category)
+def invalidate_catalogue(sender, instance, **kwargs):
+    """
+    Bumps the catalogue version whenever a product or category is written or deleted.
+
+    Args:
+        sender (Model): The Product or Category model class.
+        instance (Product or Category): The saved or deleted product or category.
+
+    """
+    bump_catalogue_version()
+
+# The user fields shown as a vendor by the API and the vendor pages
+VENDOR_USER_FIELDS = frozenset(('username', 'first_name', 'last_name'))
+
+@receiver(post_save, sender=User)
+@receiver(post_delete, sender=User)
+def invalidate_vendor(sender, instance, created=False, update_fields=None, **kwargs):
+    """
+    Bumps the catalogue version when a user's public name changes or the user is deleted,
+    so the ETags of the vendor API endpoints change with it.
+
+    Saves of other fields only, such as last_login on every login, and new users, who can't be
+    vendors yet, leave the version alone.
+
+    Args:
+        sender (Model): The User model class.
+        instance (User): The saved or deleted user.
+        created (bool, optional): Whether the user was just created.
+        update_fields (frozenset, optional): The fields passed to save(), if any.
+
+    """
+    if not created and (update_fields is None or VENDOR_USER_FIELDS & update_fields):
+        bump_catalogue_version()
+
+@receiver(post_save, sender=Userprofile)
+@receiver(post_delete, sender=Userprofile)
+def invalidate_vendor_profile(sender, instance, **kwargs):
+    """
+    Bumps the catalogue version when a user profile changes, as users become vendors through it.
+
+    Args:
+        sender (Model): The Userprofile model class.
+        instance (Userprofile): The saved or deleted user profile.
+
+    """
+    bump_catalogue_version()
+
+@receiver(post_save, sender=Review)
+@receiver(post_delete, sender=Review)
+def update_product_rating(sender, instance, **kwargs):
+    """
+    Refreshes the denormalized rating of the reviewed product.
+
+    Args:
+        sender (Model): The Review model class.
+        instance (Review): The saved or deleted review.
+
+    """
+    instance.product.update_rating()
+    bump_catalogue_version()
+
+@receiver(sessions_expired, sender=CartSession)
+def snapshot_abandoned_carts(sender, sessions, **kwargs):
+    """
+    Keeps a compact snapshot of every non-empty cart in a batch of expired sessions.
+
+    The cart value is priced with one query for the whole batch. Carts of users deleted since
+    their session started are kept without a user.
+
+    Args:
+        sender (Model): The CartSession model class.
+        sessions (list): The (session key, expire date, decoded payload) of every expired session.
+
+    """
+    carts = []
+
+    for session_key, expire_date, data in sessions:
+        items = {
+            int(product_id): int(item['quantity'])
+            for product_id, item in (data.get(settings.CART_SESSION_ID) or {}).items()
+            if int(item['quantity']) > 0
+        }
+
+        if items:
+            carts.append((data.get('_auth_user_id'), expire_date, items))
+
+    if not carts:
+        return
+
+    # The session may outlive its user, whose id would break the foreign key of the whole batch
+    user_ids = {int(user_id) for user_id, expire_date, items in carts if user_id}
+    existing = set(User.objects.filter(pk__in=user_ids).values_list('pk', flat=True))
+
+    prices = dict(
+        Product.objects
+        .filter(pk__in={product_id for user_id, expire_date, items in carts for product_id in items})
+        .values_list('pk', 'price')
+    )
+
+    AbandonedCart.objects.bulk_create([
+        AbandonedCart(
+            user_id=int(user_id) if user_id and int(user_id) in existing else None,
+            items={str(product_id): quantity for product_id, quantity in items.items()},
+            item_count=sum(items.values()),
+            value=sum(prices.get(product_id, 0) * quantity for product_id, quantity in items.items()),
+            abandoned_at=expire_date,
+        )
+        for user_id, expire_date, items in carts
+    ])
@@ -0,0 +1,360 @@
+import hashlib
+import json
+import os
+from xml.sax.saxutils import escape
+
+from django.conf import settings
+from django.contrib.auth.models import User
+from django.db.models import Count, Max, Q
+from django.urls import reverse
+
+from .models import Category, Product
+
+# The sitemaps.org limit of URLs per sitemap file
+MAX_URLS = 50000
+
+INDEX_NAME = 'sitemap.xml'
+MANIFEST_NAME = 'manifest.json'
+
+XML_HEADER = '<?xml version="1.0" encoding="UTF-8"?>\n'
+XMLNS = 'http://www.sitemaps.org/schemas/sitemap/0.9'
+
+class Section:
+    """
+    The URLs of one kind of page, split into chunk files by primary key range.
+
+    Every chunk covers the rows with after_id < pk <= last_id, so a row always falls into the
+    same chunk and new rows are only ever appended to the last one.
+    The signature of a chunk tells whether its file has to be rewritten; by default it is a digest
+    of its entries, which suits small tables.
+
+    Attributes:
+        name (str): The name of the section, used for its chunk files.
+
+    """
+    name = None
+
+    def queryset(self):
+        raise NotImplementedError
+
+    def entry(self, row):
+        """
+        Builds the sitemap entry of a row.
+
+        Args:
+            row (tuple): A row of queryset().
+
+        Returns:
+            tuple: The path of the page and its last modification datetime, or None.
+
+        """
+        raise NotImplementedError
+
+    def entries(self, after_id, last_id=None, limit=None):
+        """
+        Returns the entries of a primary key range, in primary key order.
+
+        Args:
+            after_id (int): Only rows with a higher primary key are included.
+            last_id (int, optional): Only rows up to this primary key are included (default is no limit).
+            limit (int, optional): The maximum number of entries (default is no limit).
+
+        Returns:
+            list: The (primary key, path, lastmod) entries.
+
+        """
+        rows = self.queryset().filter(pk__gt=after_id)
+
+        if last_id is not None:
+            rows = rows.filter(pk__lte=last_id)
+
+        rows = rows.order_by('pk')
+
+        if limit is not None:
+            rows = rows[:limit]
+
+        return [(row[0],) + self.entry(row) for row in rows.iterator(chunk_size=2000)]
+
+    def signature(self, after_id, last_id):
+        """
+        Summarizes a chunk, so an unchanged chunk is recognized without rewriting its file.
+
+        Args:
+            after_id (int): The primary key before the chunk.
+            last_id (int): The last primary key of the chunk.
+
+        Returns:
+            tuple: The number of URLs, the signature and the latest modification datetime of the chunk.
+
+        """
+        entries = self.entries(after_id, last_id)
+        digest = hashlib.md5(repr(entries).encode()).hexdigest()
+        lastmods = [lastmod for _, _, lastmod in entries if lastmod]
+
+        return len(entries), digest, max(lastmods) if lastmods else None
+
+    def has_rows_after(self, last_id):
+        return self.queryset().filter(pk__gt=last_id).exists()
+
+class CategorySection(Section):
+    name = 'categories'
+
+    def queryset(self):
+        return Category.objects.values_list('pk', 'slug')
+
+    def entry(self, row):
+        return reverse('category_detail', args=[row[1]]), None
+
+class ProductSection(Section):
+    """
+    The active products.
+
+    Any change to a product moves its updated_at, and deactivating or deleting one changes the
+    number of active products in its chunk. Product URLs also hold the category slug, which can
+    change without touching the products, so the signature of a chunk is a digest of the count and
+    latest updated_at of its products per category slug, computed with one grouped query on the
+    primary key range.
+
+    """
+    name = 'products'
+
+    def queryset(self):
+        return Product.objects.filter(status=Product.ACTIVE).values_list('pk', 'slug', 'category__slug', 'updated_at')
+
+    def entry(self, row):
+        return reverse('product_detail', args=[row[2], row[1]]), row[3]
+
+    def signature(self, after_id, last_id):
+        groups = list(
+            Product.objects
+            .filter(status=Product.ACTIVE, pk__gt=after_id, pk__lte=last_id)
+            .order_by('category__slug')
+            .values_list('category__slug')
+            .annotate(count=Count('pk'), lastmod=Max('updated_at'))
+        )
+        count = sum(group_count for _, group_count, _ in groups)
+        lastmod = max((group_lastmod for _, _, group_lastmod in groups), default=None)
+        digest = hashlib.md5(repr([(slug, group_count, group_lastmod.isoformat()) for slug, group_count, group_lastmod in groups]).encode()).hexdigest()
+
+        return count, digest, lastmod
+
+class VendorSection(Section):
+    """
+    The vendors, last modified when their latest active product was.
+
+    """
+    name = 'vendors'
+
+    def queryset(self):
+        return (
+            User.objects
+            .filter(userprofile__is_vendor=True)
+            .annotate(lastmod=Max('products__updated_at', filter=Q(products__status=Product.ACTIVE)))
+            .values_list('pk', 'lastmod')
+        )
+
+    def entry(self, row):
+        return reverse('vendor_detail', args=[row[0]]), row[1]
+
+SECTIONS = (CategorySection(), ProductSection(), VendorSection())
+
+def _path(name):
+    return os.path.join(settings.SITEMAP_ROOT, name)
+
+def _write(name, content):
+    """
+    Replaces a file in the sitemap directory atomically, so the web server never serves a half written file.
+
+    Args:
+        name (str): The name of the file.
+        content (str): The content of the file.
+
+    """
+    path = _path(name)
+    temporary = '%s.tmp' % path
+
+    with open(temporary, 'w', encoding='utf-8') as file:
+        file.write(content)
+
+    os.replace(temporary, path)
+
+def _lastmod(value):
+    return value.isoformat(timespec='seconds') if value else None
+
+def render_urlset(entries, base_url):
+    """
+    Renders a sitemap file.
+
+    Args:
+        entries (list): The (primary key, path, lastmod) entries of the file.
+        base_url (str): The scheme and host the paths are relative to.
+
+    Returns:
+        str: The XML of the sitemap.
+
+    """
+    lines = [XML_HEADER, '<urlset xmlns="%s">\n' % XMLNS]
+
+    for _, path, lastmod in entries:
+        if lastmod:
+            lines.append('<url><loc>%s</loc><lastmod>%s</lastmod></url>\n' % (escape(base_url + path), _lastmod(lastmod)))
+        else:
+            lines.append('<url><loc>%s</loc></url>\n' % escape(base_url + path))
+
+    lines.append('</urlset>\n')
+
+    return ''.join(lines)
+
+def render_index(chunks, base_url):
+    """
+    Renders the sitemap index.
+
+    Args:
+        chunks (list): The manifest entries of every chunk file.
+        base_url (str): The scheme and host of the site.
+
+    Returns:
+        str: The XML of the sitemap index.
+
+    """
+    lines = [XML_HEADER, '<sitemapindex xmlns="%s">\n' % XMLNS]
+
+    for chunk in chunks:
+        loc = escape(base_url + settings.SITEMAP_URL + chunk['file'])
+
+        if chunk['lastmod']:
+            lines.append('<sitemap><loc>%s</loc><lastmod>%s</lastmod></sitemap>\n' % (loc, chunk['lastmod']))
+        else:
+            lines.append('<sitemap><loc>%s</loc></sitemap>\n' % loc)
+
+    lines.append('</sitemapindex>\n')
+
+    return ''.join(lines)
+
+def build_section(section, chunks, base_url, chunk_size):
+    """
+    Brings the chunk files of one section up to date.
+
+    Existing chunks keep their primary key range and are only rewritten when their signature changed.
+    A chunk that grew past chunk_size is split again together with every chunk after it.
+    Rows added after the last chunk are appended to it while it has room, then to new chunks.
+
+    Args:
+        section (Section): The section to build.
+        chunks (list): The manifest entries of the section from the previous build.
+        base_url (str): The scheme and host of the site.
+        chunk_size (int): The maximum number of URLs per file.
+
+    Returns:
+        tuple: The manifest entries of the section and the number of rewritten files.
+
+    """
+    kept = []
+    written = 0
+
+    def write_chunk(after_id, last_id, entries, signature, lastmod):
+        chunk = {
+            'file': '%s-%d.xml' % (section.name, len(kept) + 1),
+            'after_id': after_id,
+            'last_id': last_id,
+            'count': len(entries),
+            'signature': signature,
+            'lastmod': _lastmod(lastmod),
+        }
+        _write(chunk['file'], render_urlset(entries, base_url))
+        kept.append(chunk)
+
+    for chunk in chunks:
+        count, signature, lastmod = section.signature(chunk['after_id'], chunk['last_id'])
+
+        if count > chunk_size:
+            break
+
+        if signature != chunk['signature'] or not os.path.exists(_path(chunk['file'])):
+            write_chunk(chunk['after_id'], chunk['last_id'], section.entries(chunk['after_id'], chunk['last_id']), signature, lastmod)
+            written += 1
+        else:
+            kept.append(chunk)
+
+    after_id = kept[-1]['last_id'] if kept else 0
+
+    if kept and len(kept) == len(chunks) and kept[-1]['count'] < chunk_size and section.has_rows_after(after_id):
+        after_id = kept.pop()['after_id']
+    elif len(kept) < len(chunks):
+        after_id = chunks[len(kept)]['after_id']
+
+    while True:
+        entries = section.entries(after_id, limit=chunk_size)
+
+        if not entries:
+            break
+
+        last_id = entries[-1][0]
+        count, signature, lastmod = section.signature(after_id, last_id)
+        write_chunk(after_id, last_id, entries, signature, lastmod)
+        written += 1
+        after_id = last_id
+
+        if len(entries) < chunk_size:
+            break
+
+    return kept, written
+
+def build_sitemaps(base_url, full=False, chunk_size=MAX_URLS):
+    """
+    Writes the sitemap index and its chunk files to SITEMAP_ROOT, rewriting only what changed.
+
+    The primary key range and signature of every chunk are kept in a manifest next to the files,
+    so an incremental build costs one summary query per chunk plus the rows of the changed chunks.
+    The files are served by the web server as static files, no request ever renders them.
+
+    Args:
+        base_url (str): The scheme and host of the site, e.g. https://shop.example.com.
+        full (bool, optional): Whether to ignore the manifest and rewrite every file (default is False).
+        chunk_size (int, optional): The maximum number of URLs per file (default is MAX_URLS).
+
+    Returns:
+        dict: The number of chunk files, rewritten files and removed files.
+
+    """
+    base_url = base_url.rstrip('/')
+    os.makedirs(settings.SITEMAP_ROOT, exist_ok=True)
+
+    try:
+        with open(_path(MANIFEST_NAME), encoding='utf-8') as file:
+            manifest = json.load(file)
+    except (OSError, ValueError):
+        manifest = {}
+
+    # Chunks built for another host or chunk size can't be reused
+    if full or manifest.get('base_url') != base_url or manifest.get('chunk_size') != chunk_size:
+        manifest = {}
+
+    previous = manifest.get('sections', {})
+    sections = {}
+    written = 0
+
+    for section in SECTIONS:
+        sections[section.name], section_written = build_section(section, previous.get(section.name, []), base_url, chunk_size)
+        written += section_written
+
+    chunks = [chunk for section in SECTIONS for chunk in sections[section.name]]
+    files = {chunk['file'] for chunk in chunks}
+    stale = {chunk['file'] for section_chunks in previous.values() for chunk in section_chunks} - files
+
+    if written or stale or not os.path.exists(_path(INDEX_NAME)):
+        _write(INDEX_NAME, render_index(chunks, base_url))
+
+    for name in stale:
+        try:
+            os.remove(_path(name))
+        except FileNotFoundError:
+            pass
+
+    _write(MANIFEST_NAME, json.dumps({'base_url': base_url, 'chunk_size': chunk_size, 'sections': sections}, indent=1))
+
+    return {
+        'files': len(chunks),
+        'written': written,
+        'removed': len(stale),
+    }
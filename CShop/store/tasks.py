@@ -0,0 +1,53 @@
+import math
+from datetime import datetime, timezone
+
+from django.conf import settings
+
+from core.jobs import enqueue, task
+from core.models import Job
+
+from .inventory import sweep_expired_reservations
+from .models import Product
+
+@task('store.generate_thumbnail')
+def generate_thumbnail(product_id):
+    """
+    Generates the thumbnail of a product from its uploaded image.
+
+    Args:
+        product_id (int): The id of the product.
+
+    """
+    product = Product.objects.filter(pk=product_id).first()
+
+    if product is None or not product.image or product.thumbnail:
+        return
+
+    product.thumbnail = product.make_thumbnail(product.image)
+    product.save(update_fields=['thumbnail'])
+
+@task('store.sweep_reservations')
+def sweep_reservations():
+    """
+    Returns the units of expired stock reservations to stock.
+
+    """
+    sweep_expired_reservations()
+
+def schedule_reservation_sweep(seconds):
+    """
+    Makes sure a sweep runs once reservations made now have expired.
+
+    Sweeps are due at multiples of STOCK_RESERVATION_SWEEP_SECONDS, so every reservation expiring in
+    the same interval shares one job and a busy checkout queues at most one sweep per interval.
+
+    Args:
+        seconds (int): How long the reservations last.
+
+    """
+    interval = settings.STOCK_RESERVATION_SWEEP_SECONDS
+    expires_at = datetime.now(timezone.utc).timestamp() + seconds
+    run_at = datetime.fromtimestamp(math.ceil(expires_at / interval) * interval, timezone.utc)
+
+    if not Job.objects.filter(task=sweep_reservations.task_name, status=Job.QUEUED, run_at=run_at).exists():
+        enqueue(sweep_reservations, run_at=run_at)
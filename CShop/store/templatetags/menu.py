@@ -1,18 +1,45 @@
 from django import template
+from django.conf import settings
+from django.core.cache import cache
 
 from store.models import Category
+from store.search import get_catalogue_version
 
 register = template.Library()
 
+MENU_KEY = 'store:menu'
+
+def get_menu_categories():
+    """
+    Returns the root categories shown in the menu, from the cache when possible.
+
+    A single cache entry holds the menu together with the catalogue version it was built for,
+    so any category write refreshes the menu without leaving an entry behind per version.
+    The entry also expires after SEARCH_CACHE_TIMEOUT, which bounds how stale the menu of another
+    worker can be when the cache is not shared between workers.
+
+    Returns:
+        list: The title and slug of every root category.
+
+    """
+    version = get_catalogue_version()
+    cached = cache.get(MENU_KEY)
+
+    if cached is not None and cached[0] == version:
+        return cached[1]
+
+    categories = list(Category.objects.filter(depth=0).values('title', 'slug'))
+    cache.set(MENU_KEY, (version, categories), settings.SEARCH_CACHE_TIMEOUT)
+
+    return categories
+
 @register.inclusion_tag('core/menu.html')
 def menu():
     """
-    Retrieve the list of categories for the menu.
+    Retrieve the list of root categories for the menu.
 
     Returns:
         dict: A dictionary containing the list of categories.
 
     """
-    categories = Category.objects.all()
-
-    return {'categories': categories}
\ No newline at end of file
+    return {'categories': get_menu_categories()}
@@ -1,3 +1,542 @@
-from django.test import TestCase
+import base64
+import json
+from datetime import timedelta
 
-# Create your tests here.
+from django.conf import settings
+from django.core.cache import cache
+from django.contrib.auth.models import User
+from django.http import QueryDict
+from django.test import RequestFactory, TestCase, override_settings
+from django.urls import reverse
+from django.utils import timezone
+
+from core.models import Job
+from core.sessions import SessionStore
+from userprofile.models import Userprofile
+
+from .archive import archive_orders, restore_orders
+from .cart import Cart
+from .facets import apply_filters, compute_facets, parse_filters
+from .inventory import OutOfStock, consume, purchase, release, reserve, sweep_expired_reservations, take_stock
+from .models import ArchivedOrder, Category, Order, OrderItem, Product, ProductTrigram, StockReservation
+from .search import bump_catalogue_version, cached_search_products, fuzzy_search, normalize_query, reset_search_cache_stats, search_cache_stats
+from .tasks import sweep_reservations
+
+CHECKOUT_FORM = {
+    'first_name': 'Test',
+    'last_name': 'Shopper',
+    'address': '1 Test Street',
+    'city': 'Testville',
+}
+
+class InventoryTestCase(TestCase):
+    """
+    Creates a vendor, a category and products with tracked and untracked stock.
+
+    """
+    @classmethod
+    def setUpTestData(cls):
+        cls.vendor = User.objects.create_user('vendor', password='password')
+        cls.category = Category.objects.create(title='Tools', slug='tools')
+        cls.hammer = Product.objects.create(user=cls.vendor, category=cls.category, title='Hammer', slug='hammer', price=1000, stock=5)
+        cls.saw = Product.objects.create(user=cls.vendor, category=cls.category, title='Saw', slug='saw', price=2000, stock=1)
+        cls.manual = Product.objects.create(user=cls.vendor, category=cls.category, title='Manual', slug='manual', price=500, stock=None)
+
+    def stock(self, product):
+        return Product.objects.values_list('stock', flat=True).get(pk=product.pk)
+
+class TakeStockTests(InventoryTestCase):
+    def test_takes_units(self):
+        take_stock({self.hammer.pk: 2, self.saw.pk: 1})
+
+        self.assertEqual(self.stock(self.hammer), 3)
+        self.assertEqual(self.stock(self.saw), 0)
+
+    def test_untracked_stock_is_unlimited(self):
+        take_stock({self.manual.pk: 1000})
+
+        self.assertIsNone(self.stock(self.manual))
+
+    def test_ignores_non_positive_quantities(self):
+        take_stock({self.hammer.pk: 0, self.saw.pk: -1})
+
+        self.assertEqual(self.stock(self.hammer), 5)
+        self.assertEqual(self.stock(self.saw), 1)
+
+    def test_shortage_names_the_products(self):
+        with self.assertRaises(OutOfStock) as context:
+            take_stock({self.hammer.pk: 6, self.saw.pk: 2, self.manual.pk: 1})
+
+        self.assertEqual(context.exception.product_ids, [self.hammer.pk, self.saw.pk])
+
+class ReservationTests(InventoryTestCase):
+    def test_reserve_holds_units(self):
+        reserve('session', {self.hammer.pk: 2}, 600)
+
+        self.assertEqual(self.stock(self.hammer), 3)
+        self.assertEqual(StockReservation.objects.get(session_key='session').quantity, 2)
+
+    def test_reserve_replaces_previous_reservations(self):
+        reserve('session', {self.hammer.pk: 2}, 600)
+        reserve('session', {self.hammer.pk: 4, self.saw.pk: 1}, 600)
+
+        self.assertEqual(self.stock(self.hammer), 1)
+        self.assertEqual(self.stock(self.saw), 0)
+        self.assertEqual(dict(StockReservation.objects.values_list('product_id', 'quantity')), {self.hammer.pk: 4, self.saw.pk: 1})
+
+    def test_failed_reserve_keeps_previous_reservations(self):
+        reserve('session', {self.hammer.pk: 2}, 600)
+
+        with self.assertRaises(OutOfStock):
+            reserve('session', {self.hammer.pk: 1, self.saw.pk: 2}, 600)
+
+        self.assertEqual(self.stock(self.hammer), 3)
+        self.assertEqual(self.stock(self.saw), 1)
+        self.assertEqual(dict(StockReservation.objects.values_list('product_id', 'quantity')), {self.hammer.pk: 2})
+
+    def test_release_returns_units(self):
+        reserve('session', {self.hammer.pk: 2}, 600)
+        release('session')
+
+        self.assertEqual(self.stock(self.hammer), 5)
+        self.assertFalse(StockReservation.objects.exists())
+
+    def test_consume_keeps_units_out_of_stock(self):
+        reserve('session', {self.hammer.pk: 2}, 600)
+
+        self.assertEqual(consume('session'), {self.hammer.pk: 2})
+        self.assertEqual(self.stock(self.hammer), 3)
+        self.assertFalse(StockReservation.objects.exists())
+
+    def test_purchase_uses_reservation_first(self):
+        reserve('session', {self.hammer.pk: 2, self.saw.pk: 1}, 600)
+        purchase('session', {self.hammer.pk: 3})
+
+        # One more hammer is taken from stock and the unbought saw goes back
+        self.assertEqual(self.stock(self.hammer), 2)
+        self.assertEqual(self.stock(self.saw), 1)
+        self.assertFalse(StockReservation.objects.exists())
+
+    def test_sweep_returns_expired_reservations(self):
+        reserve('expired', {self.hammer.pk: 2}, 600)
+        reserve('current', {self.hammer.pk: 1}, 600)
+        StockReservation.objects.filter(session_key='expired').update(expires_at=timezone.now() - timedelta(seconds=1))
+
+        self.assertEqual(sweep_expired_reservations(batch_size=1), 1)
+        self.assertEqual(self.stock(self.hammer), 4)
+        self.assertEqual(list(StockReservation.objects.values_list('session_key', flat=True)), ['current'])
+
+@override_settings(RATE_LIMITS={})
+class CheckoutTests(InventoryTestCase):
+    def setUp(self):
+        self.shopper = User.objects.create_user('shopper', password='password')
+        self.client.force_login(self.shopper)
+
+    def add_to_cart(self, *products):
+        for product in products:
+            self.client.get(reverse('add_to_cart', args=[product.pk]))
+
+    def test_checkout_takes_stock(self):
+        self.add_to_cart(self.hammer, self.manual)
+
+        response = self.client.post(reverse('checkout'), CHECKOUT_FORM)
+
+        self.assertRedirects(response, reverse('myaccount'), fetch_redirect_response=False)
+        self.assertEqual(self.stock(self.hammer), 4)
+        self.assertEqual(Order.objects.get(created_by=self.shopper).item_count, 2)
+
+    # An hour long, so the three checkouts all but never straddle two intervals
+    @override_settings(STOCK_RESERVATION_SWEEP_SECONDS=3600)
+    def test_checkout_schedules_one_sweep_per_interval(self):
+        self.add_to_cart(self.hammer)
+
+        for _ in range(3):
+            self.client.get(reverse('checkout'))
+
+        job = Job.objects.get(task=sweep_reservations.task_name)
+
+        self.assertEqual(self.stock(self.hammer), 4)
+        self.assertGreaterEqual(job.run_at, StockReservation.objects.get().expires_at)
+        self.assertLess(job.run_at, StockReservation.objects.get().expires_at + timedelta(seconds=settings.STOCK_RESERVATION_SWEEP_SECONDS))
+
+        StockReservation.objects.update(expires_at=timezone.now())
+        sweep_reservations(**job.payload)
+
+        self.assertEqual(self.stock(self.hammer), 5)
+
+    def test_out_of_stock_rolls_back(self):
+        self.add_to_cart(self.hammer, self.saw)
+        Product.objects.filter(pk=self.saw.pk).update(stock=0)
+
+        response = self.client.post(reverse('checkout'), CHECKOUT_FORM)
+
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.context['sold_out'], [self.saw])
+        self.assertEqual(self.stock(self.hammer), 5)
+        self.assertFalse(Order.objects.exists())
+
+class ArchiveTests(InventoryTestCase):
+    def setUp(self):
+        self.buyer = User.objects.create_user('buyer', password='password')
+        self.order = Order.objects.create(created_by=self.buyer, paid_amount=4000, item_count=3, **CHECKOUT_FORM)
+        OrderItem.objects.create(order=self.order, product=self.hammer, price=2000, quantity=2)
+        OrderItem.objects.create(order=self.order, product=self.saw, price=2000, quantity=1)
+
+    def archive(self):
+        return archive_orders(timezone.now() + timedelta(seconds=1))
+
+    def test_round_trip(self):
+        self.assertEqual(self.archive(), 1)
+        self.assertFalse(Order.objects.exists())
+        self.assertFalse(OrderItem.objects.exists())
+        self.assertEqual(ArchivedOrder.objects.get().item_count, 3)
+
+        self.assertEqual(restore_orders(), {'restored': 1, 'dropped': 0, 'orphaned': 0})
+
+        order = Order.objects.get()
+        self.assertEqual((order.pk, order.created_by, order.created_at, order.paid_amount), (self.order.pk, self.buyer, self.order.created_at, 4000))
+        self.assertEqual(sorted(order.items.values_list('product_id', 'quantity')), [(self.hammer.pk, 2), (self.saw.pk, 1)])
+        self.assertFalse(ArchivedOrder.objects.exists())
+
+    def test_archive_keeps_recent_orders(self):
+        self.assertEqual(archive_orders(self.order.created_at), 0)
+        self.assertTrue(Order.objects.exists())
+
+    def test_restore_without_deleted_user(self):
+        self.archive()
+        self.buyer.delete()
+
+        self.assertEqual(restore_orders(), {'restored': 1, 'dropped': 0, 'orphaned': 1})
+        self.assertIsNone(Order.objects.get().created_by)
+
+    def test_restore_drops_items_of_deleted_products(self):
+        self.archive()
+        self.saw.delete()
+
+        self.assertEqual(restore_orders(), {'restored': 1, 'dropped': 1, 'orphaned': 0})
+        self.assertEqual(list(OrderItem.objects.values_list('product_id', flat=True)), [self.hammer.pk])
+
+@override_settings(RATE_LIMITS={})
+class ApiTests(InventoryTestCase):
+    @classmethod
+    def setUpTestData(cls):
+        super().setUpTestData()
+        Userprofile.objects.create(user=cls.vendor, is_vendor=True)
+        cls.other_vendor = User.objects.create_user('other', password='password')
+        cls.drill = Product.objects.create(user=cls.other_vendor, category=cls.category, title='Drill', slug='drill', price=5000)
+
+    def get(self, path, status=200, **params):
+        response = self.client.get(path, params)
+
+        self.assertEqual(response.status_code, status)
+
+        return response.json()
+
+    def cursor(self, value):
+        return base64.urlsafe_b64encode(str(value).encode()).decode()
+
+    def test_cursor_pagination(self):
+        first = self.get('/api/products/', limit=2, fields='id,title')
+
+        self.assertEqual(first['results'], [{'id': self.drill.pk, 'title': 'Drill'}, {'id': self.manual.pk, 'title': 'Manual'}])
+
+        second = self.get('/api/products/', limit=2, fields='title', cursor=first['next'])
+
+        self.assertEqual(second, {'results': [{'title': 'Saw'}, {'title': 'Hammer'}], 'next': None})
+
+    def test_invalid_cursor(self):
+        for cursor in ('not base64!', self.cursor('abc'), self.cursor(0), self.cursor(10 ** 30)):
+            self.assertEqual(self.get('/api/products/', status=400, cursor=cursor), {'error': 'Invalid cursor.'})
+
+    def test_vendor_filter(self):
+        results = self.get('/api/products/', vendor=self.other_vendor.pk, fields='title')['results']
+
+        self.assertEqual(results, [{'title': 'Drill'}])
+
+        for vendor in ('abc', '-1', str(10 ** 20)):
+            self.assertEqual(self.get('/api/products/', status=400, vendor=vendor), {'error': 'Invalid vendor.'})
+
+    def test_unknown_field(self):
+        self.assertEqual(self.get('/api/products/', status=400, fields='title,secret'), {'error': 'Unknown fields: secret.'})
+
+    def test_detail_of_missing_ids(self):
+        self.get('/api/products/%d/' % self.hammer.pk)
+
+        for pk in (10 ** 6, 10 ** 20):
+            self.get('/api/products/%d/' % pk, status=404)
+            self.get('/api/vendors/%d/' % pk, status=404)
+
+    def test_vendor_endpoints(self):
+        self.assertEqual(self.get('/api/vendors/')['results'], [{'id': self.vendor.pk, 'username': 'vendor', 'name': ''}])
+        self.get('/api/vendors/%d/' % self.other_vendor.pk, status=404)
+
+    def test_etag_answers_304_until_the_catalogue_changes(self):
+        response = self.client.get('/api/products/')
+        etag = response['ETag']
+
+        self.assertEqual(self.client.get('/api/products/', HTTP_IF_NONE_MATCH=etag).status_code, 304)
+        self.assertNotEqual(self.client.get('/api/products/?limit=1')['ETag'], etag)
+
+        self.hammer.title = 'Claw hammer'
+        self.hammer.save()
+
+        response = self.client.get('/api/products/', HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, 200)
+        self.assertIn('Claw hammer', response.content.decode())
+
+    def test_vendor_rename_changes_the_etag(self):
+        etag = self.client.get('/api/vendors/%d/' % self.vendor.pk)['ETag']
+
+        self.vendor.first_name = 'Ada'
+        self.vendor.save()
+
+        self.assertEqual(self.client.get('/api/vendors/%d/' % self.vendor.pk, HTTP_IF_NONE_MATCH=etag).status_code, 200)
+
+@override_settings(RATE_LIMITS={})
+class FacetTests(InventoryTestCase):
+    def filtered(self, query):
+        return sorted(apply_filters(Product.objects.all(), parse_filters(QueryDict(query))).values_list('title', flat=True))
+
+    def test_parse_filters(self):
+        filters = parse_filters(QueryDict('min_price=5&max_price=19.99&min_rating=4&vendor=3&sort=price'))
+
+        self.assertEqual(filters, {'min_price': 500, 'max_price': 1999, 'min_rating': 4, 'vendor': 3, 'sort': 'price'})
+        self.assertEqual(parse_filters(QueryDict('price=10-25'))['max_price'], 2500)
+
+    def test_invalid_and_out_of_range_values_are_ignored(self):
+        query = 'min_price=abc&max_price=1e300&min_rating=x&vendor=99999999999999999999&sort=bogus'
+
+        self.assertEqual(parse_filters(QueryDict(query)), {'min_price': None, 'max_price': None, 'min_rating': None, 'vendor': None, 'sort': ''})
+
+        for value in ('nan', 'inf', '-inf'):
+            self.assertIsNone(parse_filters(QueryDict('min_price=' + value))['min_price'])
+
+    def test_price_bounds_are_inclusive(self):
+        self.assertEqual(self.filtered('max_price=10'), ['Hammer', 'Manual'])
+        self.assertEqual(self.filtered('min_price=10&max_price=20'), ['Hammer', 'Saw'])
+
+    def test_vendor_filter(self):
+        other = User.objects.create_user('other', password='password')
+        Product.objects.create(user=other, category=self.category, title='Drill', slug='drill', price=5000)
+
+        self.assertEqual(self.filtered('vendor=%d' % other.pk), ['Drill'])
+
+    def test_price_facet_values_select_their_bucket(self):
+        facets = compute_facets(Product.objects.all())
+
+        self.assertEqual([(option['value'], option['count']) for option in facets['prices']], [('0-9.99', 1), ('10-24.99', 2)])
+        self.assertEqual(self.filtered('price=10-24.99'), ['Hammer', 'Saw'])
+        self.assertEqual([(option['name'], option['count']) for option in facets['vendors']], [('vendor', 3)])
+
+    def test_listing_pages_ignore_huge_values(self):
+        for path in ('/search/?query=hammer&vendor=99999999999999999999', '/tools/?vendor=99999999999999999999', '/search/?query=&min_price=1e300'):
+            response = self.client.get(path)
+
+            self.assertEqual(response.status_code, 200)
+
+            if response.streaming:
+                b''.join(response.streaming_content)
+
+class CategoryTreeTests(TestCase):
+    def setUp(self):
+        self.tools = Category.objects.create(title='Tools', slug='tools')
+        self.garden = Category.objects.create(title='Garden', slug='garden')
+        self.saws = Category.objects.create(title='Saws', slug='saws', parent=self.tools)
+        self.handsaws = Category.objects.create(title='Handsaws', slug='handsaws', parent=self.saws)
+
+    def path(self, *categories):
+        return ''.join('%08d/' % category.pk for category in categories)
+
+    def test_paths_of_new_categories(self):
+        self.assertEqual((self.handsaws.path, self.handsaws.depth), (self.path(self.tools, self.saws, self.handsaws), 2))
+        self.assertEqual(list(self.tools.get_descendants()), [self.tools, self.saws, self.handsaws])
+
+    def test_moving_a_subtree_rewrites_its_descendants(self):
+        self.saws.parent = self.garden
+        self.saws.save()
+
+        self.handsaws.refresh_from_db()
+        self.assertEqual((self.handsaws.path, self.handsaws.depth), (self.path(self.garden, self.saws, self.handsaws), 2))
+        self.assertEqual(list(self.garden.get_descendants()), [self.garden, self.saws, self.handsaws])
+        self.assertEqual(list(self.tools.get_descendants()), [self.tools])
+
+        self.saws.parent = None
+        self.saws.save(update_fields=['parent'])
+
+        self.handsaws.refresh_from_db()
+        self.assertEqual((self.handsaws.path, self.handsaws.depth), (self.path(self.saws, self.handsaws), 1))
+        self.assertEqual(Category.objects.get(pk=self.saws.pk).depth, 0)
+
+    def test_other_update_fields_skip_the_paths(self):
+        self.saws.title = 'All saws'
+
+        with self.assertNumQueries(1):
+            self.saws.save(update_fields=['title'])
+
+        self.assertEqual(Category.objects.get(pk=self.saws.pk).title, 'All saws')
+
+    def test_cannot_move_below_itself(self):
+        self.tools.parent = self.handsaws
+
+        with self.assertRaises(ValueError):
+            self.tools.save()
+
+class CartTests(InventoryTestCase):
+    def cart(self, **lines):
+        request = RequestFactory().get('/')
+        request.session = SessionStore()
+        cart = Cart(request)
+        cart.cart = {str(getattr(self, name).pk): {'quantity': quantity, 'id': str(getattr(self, name).pk)} for name, quantity in lines.items()}
+
+        return cart
+
+    def test_apply_operations(self):
+        cart = self.cart(hammer=2, saw=1)
+        cart.apply([
+            {'op': 'add', 'product_id': self.hammer.pk, 'quantity': 3},
+            {'op': 'set', 'product_id': self.manual.pk, 'quantity': 4},
+            {'op': 'remove', 'product_id': self.saw.pk},
+        ])
+
+        self.assertEqual({pk: item['quantity'] for pk, item in cart.cart.items()}, {str(self.hammer.pk): 5, str(self.manual.pk): 4})
+        self.assertEqual(cart.session[settings.CART_SESSION_ID], cart.cart)
+        self.assertEqual((len(cart), cart.get_total_cost()), (9, 70))
+
+    def test_apply_removes_lines_dropping_to_zero(self):
+        cart = self.cart(hammer=2, saw=1)
+        cart.apply([
+            {'op': 'add', 'product_id': self.hammer.pk, 'quantity': -2},
+            {'op': 'set', 'product_id': self.saw.pk, 'quantity': 0},
+            {'op': 'remove', 'product_id': self.manual.pk},
+        ])
+
+        self.assertEqual(cart.cart, {})
+
+@override_settings(RATE_LIMITS={})
+class CartApiTests(InventoryTestCase):
+    def post(self, *operations, body=None):
+        response = self.client.post(reverse('cart_api'), body if body is not None else json.dumps({'operations': list(operations)}), content_type='application/json')
+
+        return response.status_code, response.json()
+
+    def test_add_update_and_remove(self):
+        status, data = self.post({'op': 'add', 'product_id': self.hammer.pk, 'quantity': 2}, {'op': 'add', 'product_id': self.saw.pk, 'quantity': 1})
+
+        self.assertEqual(status, 200)
+        self.assertEqual(data, {
+            'items': [{'product_id': self.hammer.pk, 'quantity': 2, 'total_price': 20}, {'product_id': self.saw.pk, 'quantity': 1, 'total_price': 20}],
+            'count': 3,
+            'total_cost': 40,
+        })
+
+        status, data = self.post({'op': 'set', 'product_id': self.hammer.pk, 'quantity': 1}, {'op': 'remove', 'product_id': self.saw.pk})
+
+        self.assertEqual((status, data['items'], data['count'], data['total_cost']), (200, [{'product_id': self.hammer.pk, 'quantity': 1, 'total_price': 10}], 1, 10))
+        self.assertEqual(self.client.session[settings.CART_SESSION_ID], {str(self.hammer.pk): {'quantity': 1, 'id': str(self.hammer.pk)}})
+
+    def test_malformed_bodies(self):
+        for body in ('not json', '[]', '{}', '{"operations": {"op": "add"}}'):
+            status, data = self.post(body=body)
+
+            self.assertEqual(status, 400)
+            self.assertEqual(len(data['errors']), 1)
+
+    def test_invalid_operations_apply_nothing(self):
+        self.post({'op': 'add', 'product_id': self.hammer.pk, 'quantity': 1})
+        status, data = self.post(
+            {'op': 'add', 'product_id': self.saw.pk, 'quantity': 1},
+            {'op': 'set', 'product_id': self.hammer.pk, 'quantity': -1},
+            {'op': 'add', 'product_id': self.hammer.pk, 'quantity': 1.5},
+            {'op': 'add', 'product_id': self.hammer.pk, 'quantity': True},
+            {'op': 'add', 'product_id': self.hammer.pk, 'quantity': '2'},
+            {'op': 'buy', 'product_id': self.hammer.pk, 'quantity': 1},
+            {'op': 'add', 'product_id': 'hammer', 'quantity': 1},
+            {'op': 'add', 'product_id': 99999, 'quantity': 1},
+            'add',
+        )
+
+        self.assertEqual(status, 400)
+        self.assertEqual(data['errors'], [
+            'Operation 1 is invalid.',
+            'Operation 2 is malformed.',
+            'Operation 3 is malformed.',
+            'Operation 4 is malformed.',
+            'Operation 5 is invalid.',
+            'Operation 6 is malformed.',
+            'Operation 8 is malformed.',
+            'Product 99999 is not available.',
+        ])
+        self.assertEqual(self.client.session[settings.CART_SESSION_ID], {str(self.hammer.pk): {'quantity': 1, 'id': str(self.hammer.pk)}})
+
+    def test_inactive_products_are_unavailable(self):
+        Product.objects.filter(pk=self.hammer.pk).update(status=Product.DRAFT)
+        status, data = self.post({'op': 'add', 'product_id': self.hammer.pk, 'quantity': 1})
+
+        self.assertEqual((status, data), (400, {'errors': ['Product %d is not available.' % self.hammer.pk]}))
+
+    def test_get_is_not_allowed(self):
+        self.assertEqual(self.client.get(reverse('cart_api')).status_code, 405)
+
+class SearchTests(InventoryTestCase):
+    def setUp(self):
+        cache.clear()
+
+    def search(self, query):
+        return cached_search_products(query, parse_filters(QueryDict()))['ids']
+
+    def test_normalize_query(self):
+        self.assertEqual(normalize_query('  Ｈammer\tSAW '), 'hammer saw')
+
+    def test_finds_substrings_and_typos(self):
+        self.assertEqual(self.search('hammer'), [self.hammer.pk])
+        self.assertEqual(self.search('hamer'), [self.hammer.pk])
+        self.assertEqual(fuzzy_search('hamer'), [self.hammer.pk])
+
+    def test_new_product_is_found(self):
+        self.assertEqual(self.search('chisel'), [])
+
+        chisel = Product.objects.create(user=self.vendor, category=self.category, title='Chisel', slug='chisel', price=800)
+
+        self.assertEqual(self.search('chisel'), [chisel.pk])
+        self.assertEqual(self.search('chisl'), [chisel.pk])
+
+    def test_renamed_product_is_found_by_its_new_title(self):
+        self.assertEqual(self.search('hamer'), [self.hammer.pk])
+
+        self.hammer.title = 'Mallet'
+        self.hammer.save()
+
+        self.assertEqual(self.search('malet'), [self.hammer.pk])
+        self.assertEqual(self.search('hamer'), [])
+
+    def test_saves_without_the_title_keep_the_index(self):
+        grams = set(ProductTrigram.objects.filter(product=self.hammer).values_list('pk', flat=True))
+        self.hammer.price = 1200
+        self.hammer.save(update_fields=['price'])
+
+        self.assertEqual(set(ProductTrigram.objects.filter(product=self.hammer).values_list('pk', flat=True)), grams)
+
+    def test_deleted_product_is_not_found(self):
+        self.assertEqual(self.search('hammer'), [self.hammer.pk])
+
+        self.hammer.delete()
+
+        self.assertEqual(self.search('hammer'), [])
+        self.assertEqual(self.search('hamer'), [])
+
+    def test_cache_is_invalidated_by_a_version_bump(self):
+        reset_search_cache_stats()
+        self.assertEqual(self.search('hammer'), [self.hammer.pk])
+        self.assertEqual(self.search(' HAMMER '), [self.hammer.pk])
+
+        self.assertEqual(search_cache_stats(), {'hits': 1, 'misses': 1, 'hit_ratio': 0.5})
+
+        # update() sends no signals, so the cached result stays until the version moves
+        Product.objects.filter(pk=self.hammer.pk).update(status=Product.DRAFT)
+
+        self.assertEqual(self.search('hammer'), [self.hammer.pk])
+
+        bump_catalogue_version()
+
+        self.assertEqual(self.search('hammer'), [])
+        self.assertEqual(search_cache_stats()['misses'], 2)
@@ -1,6 +1,6 @@
 from django.urls import path
 
-from . import views
+from . import api, views
 
 urlpatterns = [
     path('search/', views.search, name='search'),
@@ -8,7 +8,14 @@ urlpatterns = [
     path('change-quantity/<str:product_id>/', views.change_quantity, name='change_quantity'),
     path('remove-from-cart/<str:product_id>/', views.remove_from_cart, name='remove_from_cart'),
     path('cart/', views.cart_view, name='cart_view'),
+    path('cart/api/', views.cart_api, name='cart_api'),
     path('cart/checkout/', views.checkout, name='checkout'),
+    path('api/products/', api.product_list, name='api_product_list'),
+    path('api/products/<int:pk>/', api.product_detail, name='api_product_detail'),
+    path('api/products/<int:pk>/reviews/', api.product_reviews, name='api_product_reviews'),
+    path('api/categories/', api.category_list, name='api_category_list'),
+    path('api/vendors/', api.vendor_list, name='api_vendor_list'),
+    path('api/vendors/<int:pk>/', api.vendor_detail, name='api_vendor_detail'),
     path('<slug:slug>/', views.category_detail, name='category_detail'),
     path('<slug:category_slug>/<slug:slug>/', views.product_detail, name='product_detail'),
 ]
\ No newline at end of file
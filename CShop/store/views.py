@@ -1,10 +1,25 @@
+import json
+
+from django.conf import settings
 from django.contrib.auth.decorators import login_required
-from django.db.models import Q
+from django.core.paginator import Paginator
+from django.db import transaction
+from django.http import JsonResponse
 from django.shortcuts import render, get_object_or_404, redirect
+from django.views.decorators.csrf import ensure_csrf_cookie
+from django.views.decorators.http import require_POST
+
+from core.routers import use_replica
+from core.streaming import STREAM_CHUNK_SIZE, stream_render
+from userprofile.stats import record_sales
 
 from .cart import Cart
 from .forms import OrderForm
-from .models import Category, Product, Order, OrderItem, Review
+from .models import Category, Product, ProductRecommendation, Order, OrderItem, Review, subtree_filter
+from .inventory import OutOfStock, purchase, reserve
+from .facets import SORT_CHOICES, apply_filters, apply_sort, compute_facets, parse_filters
+from .search import cached_search_products
+from .tasks import schedule_reservation_sweep
 
 def add_to_cart(request, product_id):
     """
@@ -69,11 +84,90 @@ def change_quantity(request, product_id):
 
         return redirect('cart_view')
 
+@require_POST
+def cart_api(request):
+    """
+    Applies a batch of cart line operations sent as JSON and returns the new cart totals.
+
+    The request body is a JSON object with a list of 'operations', each with an 'op' of
+    'set', 'add' or 'remove', a 'product_id' and, for 'set' and 'add', an integer 'quantity'.
+    All products referenced by the operations or already in the cart are loaded with one bulk query.
+    If any operation is invalid nothing is applied. Otherwise the whole batch is applied
+    with a single session write.
+
+    Args:
+        request (HttpRequest): The request object.
+
+    Returns:
+        JsonResponse: The cart lines, the item count and the total cost,
+                      or the validation errors with a 400 status.
+    """
+    try:
+        operations = json.loads(request.body)['operations']
+    except (ValueError, KeyError, TypeError):
+        return JsonResponse({'errors': ['The body must be a JSON object with a list of operations.']}, status=400)
+
+    if not isinstance(operations, list):
+        return JsonResponse({'errors': ['The operations must be a list.']}, status=400)
+
+    cart = Cart(request)
+    errors = []
+    cleaned = []
+
+    for index, operation in enumerate(operations):
+        try:
+            op = operation['op']
+            product_id = int(operation['product_id'])
+            quantity = operation.get('quantity', 0)
+        except (KeyError, TypeError, ValueError, AttributeError):
+            errors.append('Operation %d is malformed.' % index)
+            continue
+
+        # int() would quietly round 1.5 down and accept true as 1
+        if not isinstance(quantity, int) or isinstance(quantity, bool):
+            errors.append('Operation %d is malformed.' % index)
+            continue
+
+        if op not in ('set', 'add', 'remove') or (op == 'set' and quantity < 0):
+            errors.append('Operation %d is invalid.' % index)
+            continue
+
+        cleaned.append({'op': op, 'product_id': product_id, 'quantity': quantity})
+
+    product_ids = {operation['product_id'] for operation in cleaned} | {int(pk) for pk in cart.cart}
+    products = Product.objects.filter(status=Product.ACTIVE).only('pk', 'price').in_bulk(product_ids)
+
+    for operation in cleaned:
+        if operation['op'] != 'remove' and operation['product_id'] not in products:
+            errors.append('Product %d is not available.' % operation['product_id'])
+
+    if errors:
+        return JsonResponse({'errors': errors}, status=400)
+
+    cart.apply(cleaned)
+
+    lines = []
+    total_cost = 0
+
+    for product_id, item in cart.cart.items():
+        if int(product_id) in products:
+            price = products[int(product_id)].price * item['quantity']
+            total_cost += price
+            lines.append({'product_id': int(product_id), 'quantity': item['quantity'], 'total_price': price / 100})
+
+    return JsonResponse({
+        'items': lines,
+        'count': len(cart),
+        'total_cost': total_cost / 100,
+    })
+
+@ensure_csrf_cookie
 def cart_view(request):
     """
     Renders the cart view.
 
     Retrieves the cart from the session and passes it to the template for rendering.
+    Sets the CSRF cookie, which the cart page's script sends along with its cart_api requests.
 
     Args:
         request (HttpRequest): The request object.
@@ -93,12 +187,16 @@ def checkout(request):
     Handles the checkout process for authenticated users.
 
     Retrieves the cart from the session and the order form from the request's POST data.
-    If the form is valid, calculates the total price of the items in the cart,
+    If the form is valid, calculates the total price and unit count of the items in the cart,
     creates an order instance, associates it with the authenticated user,
-    sets the paid amount to the total price, and saves the order.
-    Additionally, creates order items for each item in the cart.
+    stores the total price as the paid amount along with the item count, and saves the order.
+    Additionally, creates order items for each item in the cart with a single bulk insert.
     Finally, clears the cart and redirects to the 'myaccount' page.
 
+    Stock is taken with atomic conditional updates in the same transaction as the order,
+    using the units reserved for the session when the checkout page was opened.
+    If a product sold out in the meantime, nothing is saved and the form is shown again with an error.
+
     Args:
         request (HttpRequest): The request object.
 
@@ -110,48 +208,93 @@ def checkout(request):
 
     """
     cart = Cart(request)
+    items = list(cart)
+    quantities = {item['product'].id: int(item['quantity']) for item in items}
+    sold_out = []
 
     if request.method == 'POST':
         form = OrderForm(request.POST)
 
         if form.is_valid():
             total_price = 0
+            item_count = 0
 
-            for item in cart:
+            for item in items:
                 product = item['product']
                 total_price += product.price * int(item['quantity'])
+                item_count += int(item['quantity'])
+
+            try:
+                with transaction.atomic():
+                    purchase(request.session.session_key, quantities)
+
+                    order = form.save(commit=False)
+                    order.created_by = request.user
+                    order.paid_amount = total_price
+                    order.item_count = item_count
+                    order.save()
+
+                    OrderItem.objects.bulk_create([
+                        OrderItem(order=order, product=item['product'], price=item['product'].price * int(item['quantity']), quantity=int(item['quantity']))
+                        for item in items
+                    ])
+                    record_sales(items)
+            except OutOfStock as error:
+                sold_out = error.product_ids
+            else:
+                cart.clear()
 
-            order = form.save(commit=False)
-            order.created_by = request.user
-            order.paid_amount = total_price
-            order.save()
-
-            for item in cart:
-                product = item['product']
-                quantity = int(item['quantity'])
-                price = product.price * quantity
-
-                item = OrderItem.objects.create(order=order, product=product, price=price, quantity=quantity)
-
-            cart.clear()
-
-            return redirect('myaccount')
+                return redirect('myaccount')
     else:
         form = OrderForm()
 
+        if settings.STOCK_RESERVATION_SECONDS and quantities:
+            if not request.session.session_key:
+                request.session.save()
+
+            try:
+                reserve(request.session.session_key, quantities, settings.STOCK_RESERVATION_SECONDS)
+            except OutOfStock as error:
+                sold_out = error.product_ids
+            else:
+                schedule_reservation_sweep(settings.STOCK_RESERVATION_SECONDS)
+
     return render(request, 'store/checkout.html', {
         'cart': cart,
         'form': form,
+        'sold_out': [item['product'] for item in items if item['product'].id in sold_out],
     })
 
+def products_in_order(ids, chunk_size=STREAM_CHUNK_SIZE):
+    """
+    Loads products by id in the given order, one chunk at a time.
+
+    Args:
+        ids (list): The ids of the products, in display order.
+        chunk_size (int, optional): The number of products loaded per query (default is STREAM_CHUNK_SIZE).
+
+    Yields:
+        Product: The products that still exist, in the order of their ids.
+
+    """
+    for start in range(0, len(ids), chunk_size):
+        chunk = ids[start:start + chunk_size]
+        products = Product.objects.select_related('category').in_bulk(chunk)
+
+        yield from (products[pk] for pk in chunk if pk in products)
+
+@use_replica
 def search(request):
     """
     Handles the search functionality.
 
-    Retrieves the search query from the request's GET parameters.
-    Filters the active products based on the search query,
-    matching either the title or description using case-insensitive search.
-    Renders the search results page with the search query and matching products.
+    Retrieves the search query, filters and sort order from the request's GET parameters.
+    The ordered ids of the matching active products and the facet counts come from the search result cache,
+    which matches either the title or description using case-insensitive search
+    and tops up short result lists with typo-tolerant matches.
+    Only the requested page of products is loaded, with a single bulk query.
+    Renders the search results page with the search query, facets and matching products.
+    With STREAM_LISTINGS on, the page is streamed and the products are loaded in chunks while they are sent.
 
     Args:
         request (HttpRequest): The request object.
@@ -161,21 +304,48 @@ def search(request):
 
     """
     query = request.GET.get('query', '')
-    products = Product.objects.filter(status=Product.ACTIVE).filter(Q(title__icontains=query) | Q(description__icontains=query))
+    filters = parse_filters(request.GET)
+    result = cached_search_products(query, filters)
 
-    return render(request, 'store/search.html', {
+    paginator = Paginator(result['ids'], settings.PRODUCTS_PER_PAGE)
+    page = paginator.get_page(request.GET.get('page'))
+
+    page_query = request.GET.copy()
+    page_query.pop('page', None)
+
+    context = {
         'query': query,
-        'products': products,
-    })
+        'page_obj': page,
+        'page_query': page_query.urlencode(),
+        'filters': filters,
+        'facets': result['facets'],
+        'sort_choices': SORT_CHOICES,
+    }
 
+    if settings.STREAM_LISTINGS:
+        context['products'] = products_in_order(page.object_list)
+
+        return stream_render(request, 'store/search.html', context, 'store/partials/product_cards.html', has_items=bool(page.object_list))
+
+    products = Product.objects.select_related('category').in_bulk(page.object_list)
+    context['products'] = [products[pk] for pk in page.object_list if pk in products]
+
+    return render(request, 'store/search.html', context)
+
+@use_replica
 def category_detail(request, slug):
     """
     Renders the detail page for a specific category.
 
     Retrieves the category object with the specified slug from the database,
     or raises a 404 error if the category does not exist.
-    Filters the products belonging to the category based on their active status.
-    Renders the category detail page, passing the category and its associated products.
+    Filters the products belonging to the category or any category below it based on their active status,
+    using a single indexed range query on the materialized category path,
+    then applies the price, rating and vendor filters and the sort order from the query string.
+    Facet counts are computed over all active products of the category.
+    Renders the category detail page, passing the category, its breadcrumbs and subcategories,
+    the facets and a page of its products.
+    With STREAM_LISTINGS on, the page is streamed and the products are sent while they are read.
 
     Args:
         request (HttpRequest): The request object.
@@ -189,13 +359,38 @@ def category_detail(request, slug):
 
     """
     category = get_object_or_404(Category, slug=slug)
-    products = category.products.filter(status=Product.ACTIVE)
+    filters = parse_filters(request.GET)
+
+    products = Product.objects.filter(subtree_filter(category.path, 'category__path'), status=Product.ACTIVE)
+    facets = compute_facets(products)
+    products = apply_sort(apply_filters(products, filters), filters['sort']).select_related('category')
+
+    paginator = Paginator(products, settings.PRODUCTS_PER_PAGE)
+    page = paginator.get_page(request.GET.get('page'))
 
-    return render(request, 'store/category_detail.html', {
+    page_query = request.GET.copy()
+    page_query.pop('page', None)
+
+    context = {
         'category': category,
-        'products': products
-    })
+        'breadcrumbs': category.get_breadcrumbs(),
+        'subcategories': category.children.all(),
+        'products': page.object_list,
+        'page_obj': page,
+        'page_query': page_query.urlencode(),
+        'filters': filters,
+        'facets': facets,
+        'sort_choices': SORT_CHOICES,
+    }
+
+    if settings.STREAM_LISTINGS:
+        context['products'] = page.object_list.iterator(chunk_size=STREAM_CHUNK_SIZE)
 
+        return stream_render(request, 'store/category_detail.html', context, 'store/partials/product_cards.html', has_items=paginator.count > 0)
+
+    return render(request, 'store/category_detail.html', context)
+
+@use_replica
 def product_detail(request, category_slug, slug):
     """
     Renders the detail page for a specific product.
@@ -203,7 +398,9 @@ def product_detail(request, category_slug, slug):
     Retrieves the product object with the specified category slug and product slug from the database,
     filtering by the product's active status.
     If the product does not exist or is not active, raises a 404 error.
-    Renders the product detail page, passing the product object.
+    Loads the precomputed "frequently bought together" and "similar products" recommendations
+    with a single indexed query.
+    Renders the product detail page, passing the product object and its recommendations.
 
     Args:
         request (HttpRequest): The request object.
@@ -240,6 +437,23 @@ def product_detail(request, category_slug, slug):
                     created_by=request.user
                 )
 
+    recommendations = (
+        ProductRecommendation.objects
+        .filter(product=product, recommended__status=Product.ACTIVE)
+        .select_related('recommended__category')
+        .order_by('kind', 'rank')
+    )
+    bought_together = []
+    similar = []
+
+    for recommendation in recommendations:
+        if recommendation.kind == ProductRecommendation.BOUGHT_TOGETHER:
+            bought_together.append(recommendation.recommended)
+        else:
+            similar.append(recommendation.recommended)
+
     return render(request, 'store/product_detail.html', {
-        'product': product
+        'product': product,
+        'bought_together': bought_together,
+        'similar_products': similar,
     })
\ No newline at end of file
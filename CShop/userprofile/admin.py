@@ -1,5 +1,12 @@
 from django.contrib import admin
 
-from .models import Userprofile
+from .models import Userprofile, VendorStats
 
-admin.site.register(Userprofile)
\ No newline at end of file
+admin.site.register(Userprofile)
+
+@admin.register(VendorStats)
+class VendorStatsAdmin(admin.ModelAdmin):
+    list_display = ('user', 'product_count', 'review_count', 'rating_total', 'units_sold', 'updated_at')
+    list_select_related = ('user',)
+    readonly_fields = ('product_count', 'review_count', 'rating_total', 'units_sold', 'updated_at')
+    search_fields = ('user__username',)
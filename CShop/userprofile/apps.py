@@ -4,3 +4,6 @@ from django.apps import AppConfig
 class UserprofileConfig(AppConfig):
     default_auto_field = 'django.db.models.BigAutoField'
     name = 'userprofile'
+
+    def ready(self):
+        from . import signals
@@ -0,0 +1,19 @@
+from django.core.management.base import BaseCommand
+
+from userprofile.stats import rebuild_vendor_stats
+
+class Command(BaseCommand):
+    """
+    Recomputes the denormalized vendor statistics from products, reviews and orders.
+
+    """
+    help = 'Recomputes the denormalized vendor statistics from products, reviews and orders.'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--vendor', type=int, action='append', dest='vendors', help='Only rebuild the vendor with this user id; repeat for more vendors.')
+        parser.add_argument('--batch-size', type=int, default=500)
+
+    def handle(self, *args, **options):
+        rebuilt = rebuild_vendor_stats(options['vendors'], batch_size=options['batch_size'])
+
+        self.stdout.write(self.style.SUCCESS('Rebuilt the statistics of %d vendors.' % rebuilt))
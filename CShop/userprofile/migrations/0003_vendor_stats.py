@@ -0,0 +1,72 @@
+# Generated by Django 4.2.1 on 2026-10-18 23:06
+
+import json
+import zlib
+from collections import defaultdict
+
+from django.conf import settings
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+def backfill_vendor_stats(apps, schema_editor):
+    Product = apps.get_model('store', 'Product')
+    Review = apps.get_model('store', 'Review')
+    OrderItem = apps.get_model('store', 'OrderItem')
+    ArchivedOrder = apps.get_model('store', 'ArchivedOrder')
+    Userprofile = apps.get_model('userprofile', 'Userprofile')
+    VendorStats = apps.get_model('userprofile', 'VendorStats')
+
+    stats = defaultdict(dict)
+
+    for user_id, count in Product.objects.filter(status='active').order_by().values_list('user_id').annotate(count=models.Count('pk')):
+        stats[user_id]['product_count'] = count
+
+    for user_id, count, total in Review.objects.order_by().values_list('product__user_id').annotate(count=models.Count('pk'), total=models.Sum('rating')):
+        stats[user_id]['review_count'] = count
+        stats[user_id]['rating_total'] = total or 0
+
+    for user_id, units in OrderItem.objects.order_by().values_list('product__user_id').annotate(units=models.Sum('quantity')):
+        stats[user_id]['units_sold'] = units or 0
+
+    owners = dict(Product.objects.values_list('pk', 'user_id').iterator(chunk_size=2000))
+
+    for data in ArchivedOrder.objects.values_list('data', flat=True).iterator(chunk_size=500):
+        for item in json.loads(zlib.decompress(bytes(data)))['items']:
+            user_id = owners.get(item['product_id'])
+
+            if user_id is not None:
+                stats[user_id]['units_sold'] = stats[user_id].get('units_sold', 0) + item['quantity']
+
+    for user_id in Userprofile.objects.filter(is_vendor=True).values_list('user_id', flat=True):
+        stats[user_id]
+
+    stats.pop(None, None)
+    VendorStats.objects.bulk_create([VendorStats(user_id=user_id, **fields) for user_id, fields in stats.items()], batch_size=500)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('auth', '0012_alter_user_first_name_max_length'),
+        ('userprofile', '0002_userprofile_is_vendor'),
+        ('store', '0017_admin_indexes'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='VendorStats',
+            fields=[
+                ('user', models.OneToOneField(on_delete=django.db.models.deletion.CASCADE, primary_key=True, related_name='vendor_stats', serialize=False, to=settings.AUTH_USER_MODEL)),
+                ('product_count', models.IntegerField(default=0)),
+                ('review_count', models.IntegerField(default=0)),
+                ('rating_total', models.IntegerField(default=0)),
+                ('units_sold', models.IntegerField(default=0)),
+                ('updated_at', models.DateTimeField(auto_now=True)),
+            ],
+            options={
+                'verbose_name_plural': 'vendor stats',
+            },
+        ),
+        migrations.RunPython(backfill_vendor_stats, migrations.RunPython.noop),
+    ]
@@ -28,4 +28,62 @@ class Userprofile(models.Model):
             str: The username of the associated user.
 
         """
-        return self.user.username
\ No newline at end of file
+        return self.user.username
+
+class VendorStats(models.Model):
+    """
+    Model holding the denormalized statistics of a vendor, shown on their vendor page.
+
+    The counters are kept up to date incrementally (see userprofile.stats) when products change
+    status, reviews are written and orders are placed, so the vendor page never aggregates over
+    the vendor's products, reviews or order items.
+
+    Attributes:
+        user (User): The vendor.
+        product_count (int): The number of active products.
+        review_count (int): The number of reviews of the vendor's products.
+        rating_total (int): The sum of the ratings of those reviews.
+        units_sold (int): The number of units of the vendor's products sold.
+        updated_at (DateTimeField): The date and time when the statistics last changed.
+
+    Methods:
+        __str__: Returns a string representation of the vendor statistics.
+        get_rating: Returns the average rating of the vendor's products.
+
+    """
+    user = models.OneToOneField(User, primary_key=True, related_name='vendor_stats', on_delete=models.CASCADE)
+    product_count = models.IntegerField(default=0)
+    review_count = models.IntegerField(default=0)
+    rating_total = models.IntegerField(default=0)
+    units_sold = models.IntegerField(default=0)
+    updated_at = models.DateTimeField(auto_now=True)
+
+    class Meta:
+        """
+        Metadata for the VendorStats model.
+
+        Attributes:
+            verbose_name_plural (str): The plural name used in the admin, as 'stats' is already plural.
+
+        """
+        verbose_name_plural = 'vendor stats'
+
+    def __str__(self):
+        """
+        Returns a string representation of the vendor statistics.
+
+        Returns:
+            str: 'Stats of' followed by the id of the vendor.
+
+        """
+        return 'Stats of %s' % self.user_id
+
+    def get_rating(self):
+        """
+        Returns the average rating of the vendor's products.
+
+        Returns:
+            float: The average rating rounded to two decimals, or 0 if there are no reviews.
+
+        """
+        return round(self.rating_total / self.review_count, 2) if self.review_count else 0
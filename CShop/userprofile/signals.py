@@ -0,0 +1,98 @@
+from django.db.models.signals import post_delete, post_save, pre_save
+from django.dispatch import receiver
+
+from core.jobs import enqueue
+from store.models import Product, Review
+
+from .stats import adjust_vendor_stats, move_product
+from .tasks import move_archived_sales
+
+@receiver(pre_save, sender=Product)
+def remember_product_owner(sender, instance, **kwargs):
+    """
+    Remembers the stored status and vendor of a product about to be saved.
+
+    Args:
+        sender (Model): The Product model class.
+        instance (Product): The product about to be saved.
+
+    """
+    instance._stats_previous = Product.objects.filter(pk=instance.pk).values_list('status', 'user_id').first() if instance.pk else None
+
+@receiver(post_save, sender=Product)
+def update_vendor_products(sender, instance, **kwargs):
+    """
+    Updates the active product count of the vendor when a product is activated or deactivated.
+
+    A product moving to another vendor takes its reviews and sales along: those in the order tables
+    right away, those in archived orders with a background job, as finding them means decoding the archive.
+
+    Args:
+        sender (Model): The Product model class.
+        instance (Product): The saved product.
+
+    """
+    previous = getattr(instance, '_stats_previous', None)
+    was_active = previous is not None and previous[0] == Product.ACTIVE
+    is_active = instance.status == Product.ACTIVE
+
+    if previous is not None and previous[1] != instance.user_id:
+        move_product(instance.pk, previous[1], instance.user_id, was_active, is_active)
+        enqueue(move_archived_sales, product_id=instance.pk, from_user_id=previous[1], to_user_id=instance.user_id)
+    elif was_active != is_active:
+        adjust_vendor_stats({instance.user_id: {'product_count': 1 if is_active else -1}})
+
+@receiver(post_delete, sender=Product)
+def remove_vendor_product(sender, instance, **kwargs):
+    """
+    Updates the active product count of the vendor when an active product is deleted.
+
+    Args:
+        sender (Model): The Product model class.
+        instance (Product): The deleted product.
+
+    """
+    if instance.status == Product.ACTIVE:
+        adjust_vendor_stats({instance.user_id: {'product_count': -1}}, create=False)
+
+@receiver(pre_save, sender=Review)
+def remember_review_rating(sender, instance, **kwargs):
+    """
+    Remembers the stored rating of a review about to be saved.
+
+    Args:
+        sender (Model): The Review model class.
+        instance (Review): The review about to be saved.
+
+    """
+    instance._stats_previous = Review.objects.filter(pk=instance.pk).values_list('rating', flat=True).first() if instance.pk else None
+
+@receiver(post_save, sender=Review)
+def update_vendor_rating(sender, instance, created, **kwargs):
+    """
+    Adds a new or changed review to the rating of the product's vendor.
+
+    Args:
+        sender (Model): The Review model class.
+        instance (Review): The saved review.
+        created (bool): Whether the review is new.
+
+    """
+    previous = getattr(instance, '_stats_previous', None)
+
+    if created or previous is None:
+        adjust_vendor_stats({instance.product.user_id: {'review_count': 1, 'rating_total': int(instance.rating)}})
+    else:
+        adjust_vendor_stats({instance.product.user_id: {'rating_total': int(instance.rating) - previous}})
+
+@receiver(post_delete, sender=Review)
+def remove_vendor_review(sender, instance, **kwargs):
+    """
+    Removes a deleted review from the rating of the product's vendor.
+
+    Args:
+        sender (Model): The Review model class.
+        instance (Review): The deleted review.
+
+    """
+    adjust_vendor_stats({instance.product.user_id: {'review_count': -1, 'rating_total': -int(instance.rating)}}, create=False)
@@ -0,0 +1,165 @@
+import json
+import zlib
+from collections import defaultdict
+
+from django.contrib.auth.models import User
+from django.db import transaction
+from django.db.models import Count, F, Sum
+from django.utils import timezone
+
+from store.models import ArchivedOrder, OrderItem, Product, Review
+
+from .models import VendorStats
+
+FIELDS = ('product_count', 'review_count', 'rating_total', 'units_sold')
+
+def adjust_vendor_stats(deltas, create=True):
+    """
+    Adds changes to the statistics of vendors.
+
+    Every vendor is one UPDATE with F() expressions, so concurrent changes never overwrite each other.
+    A missing row is created first, for vendors that started selling after the table was filled.
+
+    Args:
+        deltas (dict): The change per field (e.g. {'units_sold': 3}) per vendor id.
+        create (bool, optional): Whether to create missing rows (default is True). Deletions pass False:
+                                 there is nothing to take away from a missing row, and its vendor may be
+                                 the user being deleted.
+
+    """
+    now = timezone.now()
+
+    for user_id, fields in sorted(deltas.items()):
+        fields = {field: delta for field, delta in fields.items() if delta}
+
+        if user_id is None or not fields:
+            continue
+
+        changes = {field: F(field) + delta for field, delta in fields.items()}
+
+        if not VendorStats.objects.filter(user_id=user_id).update(updated_at=now, **changes) and create:
+            VendorStats.objects.bulk_create([VendorStats(user_id=user_id)], ignore_conflicts=True)
+            VendorStats.objects.filter(user_id=user_id).update(updated_at=now, **changes)
+
+def record_sales(items):
+    """
+    Adds the units of a checkout to the statistics of the vendors who sold them.
+
+    Call this inside the checkout transaction.
+
+    Args:
+        items (list): The cart items, each holding the 'product' and its 'quantity'.
+
+    """
+    units = defaultdict(int)
+
+    for item in items:
+        units[item['product'].user_id] += int(item['quantity'])
+
+    adjust_vendor_stats({user_id: {'units_sold': quantity} for user_id, quantity in units.items()})
+
+def adjust_product_count(queryset, delta):
+    """
+    Changes the active product count of the vendors of some products, before they are activated
+    or deactivated with queryset.update(), which sends no signals.
+
+    Args:
+        queryset (QuerySet): The products about to change status.
+        delta (int): 1 if they become active, -1 if they stop being active.
+
+    """
+    counts = queryset.order_by().values_list('user_id').annotate(count=Count('pk'))
+
+    adjust_vendor_stats({user_id: {'product_count': delta * count} for user_id, count in counts})
+
+def move_product(product_id, from_user_id, to_user_id, was_active, is_active):
+    """
+    Moves the statistics of a product from its previous vendor to its new one.
+
+    The reviews and the units in the order tables are summed for this product alone. Units of
+    archived orders can only be found by decoding the archive, so they are moved by the
+    move_archived_sales background job instead of during the save.
+
+    Args:
+        product_id (int): The id of the product.
+        from_user_id (int): The id of the previous vendor.
+        to_user_id (int): The id of the new vendor.
+        was_active (bool): Whether the product was active before the save.
+        is_active (bool): Whether the product is active after the save.
+
+    """
+    reviews = Review.objects.filter(product_id=product_id).aggregate(count=Count('pk'), total=Sum('rating'))
+    units = OrderItem.objects.filter(product_id=product_id).aggregate(units=Sum('quantity'))['units'] or 0
+    moved = {'review_count': reviews['count'], 'rating_total': reviews['total'] or 0, 'units_sold': units}
+
+    adjust_vendor_stats({
+        from_user_id: dict({field: -value for field, value in moved.items()}, product_count=-int(was_active)),
+        to_user_id: dict(moved, product_count=int(is_active)),
+    })
+
+def archived_units(product_id, batch_size=500):
+    """
+    Sums the units of a product in archived orders.
+
+    Args:
+        product_id (int): The id of the product.
+        batch_size (int, optional): The number of archived orders decoded per query (default is 500).
+
+    Returns:
+        int: The number of units.
+
+    """
+    units = 0
+
+    for data in ArchivedOrder.objects.values_list('data', flat=True).iterator(chunk_size=batch_size):
+        units += sum(item['quantity'] for item in json.loads(zlib.decompress(bytes(data)))['items'] if item['product_id'] == product_id)
+
+    return units
+
+def rebuild_vendor_stats(user_ids=None, batch_size=500):
+    """
+    Recomputes the statistics of vendors from their products, reviews and orders, archived ones included.
+
+    Used to fill the table and to repair it. Adjustments made while it runs may be lost,
+    so run it while the shop is quiet.
+
+    Args:
+        user_ids (list, optional): The vendors to rebuild (default is every user with products and every vendor).
+        batch_size (int, optional): The number of archived orders decoded per query (default is 500).
+
+    Returns:
+        int: The number of rebuilt vendors.
+
+    """
+    products = Product.objects.all() if user_ids is None else Product.objects.filter(user_id__in=user_ids)
+    stats = defaultdict(lambda: dict.fromkeys(FIELDS, 0))
+
+    for user_id, count in products.filter(status=Product.ACTIVE).order_by().values_list('user_id').annotate(count=Count('pk')):
+        stats[user_id]['product_count'] = count
+
+    reviews = Review.objects.filter(product__in=products).order_by().values_list('product__user_id').annotate(count=Count('pk'), total=Sum('rating'))
+
+    for user_id, count, total in reviews:
+        stats[user_id]['review_count'] = count
+        stats[user_id]['rating_total'] = total or 0
+
+    for user_id, units in OrderItem.objects.filter(product__in=products).order_by().values_list('product__user_id').annotate(units=Sum('quantity')):
+        stats[user_id]['units_sold'] = units or 0
+
+    owners = dict(products.values_list('pk', 'user_id').iterator(chunk_size=2000))
+
+    for data in ArchivedOrder.objects.values_list('data', flat=True).iterator(chunk_size=batch_size):
+        for item in json.loads(zlib.decompress(bytes(data)))['items']:
+            if item['product_id'] in owners:
+                stats[owners[item['product_id']]]['units_sold'] += item['quantity']
+
+    full = user_ids is None
+
+    if full:
+        user_ids = set(stats) | set(User.objects.filter(userprofile__is_vendor=True).values_list('pk', flat=True))
+
+    with transaction.atomic():
+        (VendorStats.objects.all() if full else VendorStats.objects.filter(user_id__in=user_ids)).delete()
+        VendorStats.objects.bulk_create([VendorStats(user_id=user_id, **stats[user_id]) for user_id in user_ids], batch_size=batch_size)
+
+    return len(user_ids)
@@ -0,0 +1,18 @@
+from core.jobs import task
+
+from .stats import adjust_vendor_stats, archived_units
+
+@task('userprofile.move_archived_sales')
+def move_archived_sales(product_id, from_user_id, to_user_id):
+    """
+    Moves the units of a product in archived orders from its previous vendor to its new one.
+
+    Args:
+        product_id (int): The id of the product.
+        from_user_id (int): The id of the previous vendor.
+        to_user_id (int): The id of the new vendor.
+
+    """
+    units = archived_units(product_id)
+
+    adjust_vendor_stats({from_user_id: {'units_sold': -units}, to_user_id: {'units_sold': units}})
@@ -1,3 +1,166 @@
-from django.test import TestCase
+from datetime import timedelta
 
-# Create your tests here.
+from django.contrib.auth.models import User
+from django.test import TestCase, override_settings
+from django.urls import reverse
+from django.utils import timezone
+
+from core.models import Job
+from store.archive import archive_orders
+from store.models import Category, Order, OrderItem, Product, Review
+
+from .models import Userprofile, VendorStats
+from .stats import FIELDS, rebuild_vendor_stats
+from .tasks import move_archived_sales
+
+class VendorStatsTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.vendor = User.objects.create_user('vendor', password='password')
+        cls.other_vendor = User.objects.create_user('other', password='password')
+        cls.buyer = User.objects.create_user('buyer', password='password')
+        cls.category = Category.objects.create(title='Tools', slug='tools')
+
+    def create_product(self, user=None, **fields):
+        fields.setdefault('title', 'Hammer')
+        fields.setdefault('slug', 'hammer')
+
+        return Product.objects.create(user=user or self.vendor, category=self.category, price=1000, **fields)
+
+    def stats(self, user=None):
+        return VendorStats.objects.values_list(*FIELDS).get(user=user or self.vendor)
+
+    def sell(self, product, quantity):
+        order = Order.objects.create(created_by=self.buyer, first_name='Test', last_name='Shopper', address='1 Test Street', city='Testville', paid_amount=product.price * quantity, item_count=quantity)
+        OrderItem.objects.create(order=order, product=product, price=product.price * quantity, quantity=quantity)
+
+        return order
+
+    def test_active_product_is_counted(self):
+        self.create_product()
+        self.create_product(status=Product.DRAFT, slug='draft')
+
+        self.assertEqual(self.stats(), (1, 0, 0, 0))
+
+    def test_deleted_product_is_uncounted(self):
+        product = self.create_product()
+        product.delete()
+
+        self.assertEqual(self.stats(), (0, 0, 0, 0))
+
+    def test_status_change_updates_the_count(self):
+        product = self.create_product()
+        product.status = Product.DELETED
+        product.save()
+
+        self.assertEqual(self.stats()[0], 0)
+
+        product.status = Product.ACTIVE
+        product.save()
+
+        self.assertEqual(self.stats()[0], 1)
+
+    def test_reviews_update_the_rating(self):
+        product = self.create_product()
+        review = Review.objects.create(product=product, rating=4, content='Good', created_by=self.buyer)
+        Review.objects.create(product=product, rating=2, content='Bad', created_by=self.buyer)
+
+        self.assertEqual(self.stats()[1:3], (2, 6))
+
+        review.rating = 5
+        review.save()
+
+        self.assertEqual(self.stats()[1:3], (2, 7))
+
+        review.delete()
+
+        self.assertEqual(self.stats()[1:3], (1, 2))
+        self.assertEqual(VendorStats.objects.get(user=self.vendor).get_rating(), 2)
+
+    def test_moved_product_takes_its_stats_along(self):
+        product = self.create_product()
+        Review.objects.create(product=product, rating=4, content='Good', created_by=self.buyer)
+        self.sell(product, 3)
+        archived = self.sell(product, 2)
+        Order.objects.filter(pk=archived.pk).update(created_at=timezone.now() - timedelta(days=1))
+        archive_orders(timezone.now() - timedelta(hours=1))
+        # The orders were not placed through checkout, so their units are counted by a rebuild
+        rebuild_vendor_stats()
+
+        product.user = self.other_vendor
+        product.save()
+
+        # The units in archived orders are moved by the background job
+        self.assertEqual(self.stats(), (0, 0, 0, 2))
+        self.assertEqual(self.stats(self.other_vendor), (1, 1, 4, 3))
+        self.assertEqual(Job.objects.get().task, 'userprofile.move_archived_sales')
+
+        move_archived_sales(**Job.objects.get().payload)
+
+        self.assertEqual(self.stats(), (0, 0, 0, 0))
+        self.assertEqual(self.stats(self.other_vendor)[3], 5)
+
+    def test_rebuild_repairs_the_stats(self):
+        product = self.create_product()
+        self.create_product(status=Product.DRAFT, slug='draft')
+        Review.objects.create(product=product, rating=4, content='Good', created_by=self.buyer)
+        self.sell(product, 3)
+        self.sell(product, 2)
+        archive_orders(timezone.now() + timedelta(seconds=1))
+        Userprofile.objects.create(user=self.other_vendor, is_vendor=True)
+        VendorStats.objects.all().delete()
+        VendorStats.objects.create(user=self.buyer, product_count=7)
+
+        self.assertEqual(rebuild_vendor_stats(), 2)
+        self.assertEqual(self.stats(), (1, 1, 4, 5))
+        self.assertEqual(self.stats(self.other_vendor), (0, 0, 0, 0))
+        self.assertFalse(VendorStats.objects.filter(user=self.buyer).exists())
+
+    def test_rebuild_of_one_vendor(self):
+        self.create_product()
+        self.create_product(user=self.other_vendor, slug='other')
+        VendorStats.objects.update(product_count=9)
+
+        self.assertEqual(rebuild_vendor_stats([self.vendor.pk]), 1)
+        self.assertEqual(self.stats()[0], 1)
+        self.assertEqual(self.stats(self.other_vendor)[0], 9)
+
+@override_settings(PRODUCTS_PER_PAGE=2, RATE_LIMITS={})
+class VendorDetailTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.vendor = User.objects.create_user('vendor', password='password')
+        Userprofile.objects.create(user=cls.vendor, is_vendor=True)
+        category = Category.objects.create(title='Tools', slug='tools')
+
+        for index in range(3):
+            Product.objects.create(user=cls.vendor, category=category, title='Product %d' % index, slug='product-%d' % index, price=1000)
+
+    def get_page(self, page):
+        response = self.client.get(reverse('vendor_detail', args=[self.vendor.pk]), {'page': page})
+
+        return response.context['page_obj']
+
+    def test_pages_use_the_stats(self):
+        page = self.get_page(2)
+
+        self.assertEqual((page.number, page.paginator.num_pages, len(page)), (2, 2, 1))
+
+    def test_vendor_without_stats(self):
+        VendorStats.objects.all().delete()
+        page = self.get_page(2)
+
+        self.assertEqual((page.number, page.paginator.num_pages, len(page)), (2, 2, 1))
+
+    def test_stale_count_too_high(self):
+        VendorStats.objects.update(product_count=10)
+        page = self.get_page(4)
+
+        self.assertEqual((page.number, page.paginator.num_pages, len(page)), (2, 2, 1))
+
+    def test_stale_count_too_low(self):
+        VendorStats.objects.update(product_count=1)
+        page = self.get_page(2)
+
+        self.assertEqual((page.number, page.paginator.num_pages, len(page)), (2, 2, 1))
+        self.assertEqual(len(self.get_page(1)), 2)
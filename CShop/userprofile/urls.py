@@ -10,6 +10,7 @@ urlpatterns = [
     path('myaccount/', views.myaccount, name='myaccount'),
     path('become-vendor/', views.become_vendor, name='become_vendor'),
     path('my-store/', views.my_store, name='my_store'),
+    path('my-store/analytics/', views.my_store_analytics, name='my_store_analytics'),
     path('my-store/order-detail/<int:pk>/', views.my_store_order_detail, name='my_store_order_detail'),
     path('my-store/add-product/', views.add_product, name='add_product'),
     path('my-store/edit-product/<int:pk>/', views.edit_product, name='edit_product'),
@@ -1,15 +1,28 @@
+from datetime import timedelta
+
+from django.conf import settings
 from django.contrib import messages
 from django.contrib.auth import login
 from django.contrib.auth.decorators import login_required
 from django.contrib.auth.forms import UserCreationForm
 from django.contrib.auth.models import User
+from django.core.paginator import Paginator
+from django.db.models import Prefetch
 from django.shortcuts import render, get_object_or_404, redirect
+from django.utils import timezone
+from django.utils.dateparse import parse_date
 from django.utils.text import slugify
 
-from .models import Userprofile
+from .models import Userprofile, VendorStats
+
+from core.jobs import enqueue
+from core.paginators import CountedPaginator
+from core.routers import use_replica
 
+from store.analytics import sales_report
 from store.forms import ProductForm
 from store.models import Product, OrderItem, Order
+from store.tasks import generate_thumbnail
 
 @login_required
 def become_vendor(request):
@@ -33,18 +46,23 @@ def become_vendor(request):
   
         user.userprofile.is_vendor = True
         user.userprofile.save()
+
+        VendorStats.objects.get_or_create(user=user)
      
         return redirect('my_store')
     
     return render(request, 'userprofile/become_vendor.html')
 
+@use_replica
 def vendor_detail(request, pk):
     """
     Renders the vendor detail page for a specific user.
 
-    Retrieves the user with the given primary key (pk) from the User model.
-    Filters the products associated with the user, keeping only those with an 'ACTIVE' status.
-    Renders the 'vendor_detail' template with the user and products as context variables.
+    Retrieves the vendor with the given primary key (pk) together with their statistics in one query;
+    the active product count, the rating and the units sold are kept up to date by the signals and
+    checkout in userprofile.stats, so nothing is counted or averaged per request.
+    The active products are paginated, newest first, and the paginator takes its count from the statistics;
+    it counts the products instead when the vendor has no statistics yet or their count turns out stale.
 
     Args:
         request (HttpRequest): The request object.
@@ -53,13 +71,29 @@ def vendor_detail(request, pk):
     Returns:
         HttpResponse: The response containing the rendered 'vendor_detail' template.
 
+    Raises:
+        Http404: If there is no vendor with the given primary key.
+
     """
-    user = User.objects.get(pk=pk)
-    products = user.products.filter(status=Product.ACTIVE)
+    user = get_object_or_404(User.objects.select_related('vendor_stats'), pk=pk, userprofile__is_vendor=True)
+
+    products = user.products.filter(status=Product.ACTIVE).select_related('category').order_by('-created_at')
+
+    try:
+        stats = user.vendor_stats
+        paginator = CountedPaginator(products, settings.PRODUCTS_PER_PAGE, count=stats.product_count)
+    except VendorStats.DoesNotExist:
+        # Not rebuilt yet, the products are counted
+        stats = VendorStats(user=user)
+        paginator = Paginator(products, settings.PRODUCTS_PER_PAGE)
+
+    page = paginator.get_page(request.GET.get('page'))
 
     return render(request, 'userprofile/vendor_detail.html', {
         'user': user,
-        'products': products
+        'stats': stats,
+        'products': page.object_list,
+        'page_obj': page,
     })
 
 @login_required
@@ -89,6 +123,47 @@ def my_store(request):
         'order_items': order_items
     })
 
+@login_required
+def my_store_analytics(request):
+    """
+    Renders the sales analytics page of the authenticated vendor.
+
+    Reads the date range from the 'start' and 'end' query parameters (YYYY-MM-DD), defaulting to the last 30 days.
+    Invalid dates fall back to that default, and longer ranges than ANALYTICS_MAX_DAYS are cut to their last days.
+    The daily revenue and units, and the totals per product, come from the precomputed
+    daily sales rollup in a single query, whatever the length of the range.
+
+    Args:
+        request (HttpRequest): The request object.
+
+    Returns:
+        HttpResponse: The response containing the rendered 'my_store_analytics' template.
+
+    Raises:
+        PermissionDenied: If the user is not authenticated.
+
+    """
+    try:
+        end = parse_date(request.GET.get('end', '') or '') or timezone.localdate()
+        start = parse_date(request.GET.get('start', '') or '') or end - timedelta(days=29)
+    except (ValueError, OverflowError):
+        # A well-formed but impossible date such as 2024-13-45
+        end = timezone.localdate()
+        start = end - timedelta(days=29)
+
+    if start > end:
+        start, end = end, start
+
+    # The report has one row per day, so the range is capped
+    if (end - start).days >= settings.ANALYTICS_MAX_DAYS:
+        start = end - timedelta(days=settings.ANALYTICS_MAX_DAYS - 1)
+
+    return render(request, 'userprofile/my_store_analytics.html', {
+        'start': start,
+        'end': end,
+        'report': sales_report(request.user, start, end),
+    })
+
 @login_required
 def my_store_order_detail(request, pk):
     """
@@ -122,6 +197,7 @@ def add_product(request):
 
     If the request method is POST, processes the submitted form data.
     Validates the form and saves the product if it is valid.
+    The thumbnail is generated by a background job rather than during the request.
     Displays a success message and redirects to 'my_store' page.
     
     If the request method is not POST, renders an empty form.
@@ -147,6 +223,9 @@ def add_product(request):
             product.slug = slugify(title)
             product.save()  
 
+            if product.image:
+                enqueue(generate_thumbnail, product_id=product.id)
+
             messages.success(request, 'The product was added!')
 
             return redirect('my_store') 
@@ -167,6 +246,8 @@ def edit_product(request, pk):
     
     If the request method is POST, processes the submitted form data.
     Validates the form and saves the changes if it is valid.
+    If the title or description changed, the product's similar products are marked for recomputation.
+    If a new image was uploaded, the old thumbnail is dropped and a background job generates a new one.
     Displays a success message and redirects to 'my_store' page.
     
     If the request method is not POST, renders the form filled with the product's existing data.
@@ -188,7 +269,18 @@ def edit_product(request, pk):
         form = ProductForm(request.POST, request.FILES, instance=product)
 
         if form.is_valid():
-            form.save()
+            product = form.save(commit=False)
+
+            if 'title' in form.changed_data or 'description' in form.changed_data:
+                product.similar_products_stale = True
+
+            if 'image' in form.changed_data:
+                product.thumbnail = None
+
+            product.save()
+
+            if 'image' in form.changed_data and product.image:
+                enqueue(generate_thumbnail, product_id=product.id)
             
             messages.success(request, 'The changes was saved!')
 
@@ -235,10 +327,28 @@ def myaccount(request):
     """
     Render the 'myaccount' page for the authenticated user.
 
+    Lists the user's orders newest first, one page at a time.
+    The items of the page's orders and their products are prefetched in two queries,
+    and the order totals and item counts come from the order rows,
+    so the page costs the same number of queries for any order history.
+
+    Args:
+        request (HttpRequest): The request object.
+
     Returns:
         HttpResponse: The rendered 'myaccount' template.
     """
-    return render(request, 'userprofile/myaccount.html')
+    orders = (
+        request.user.orders
+        .order_by('-created_at')
+        .prefetch_related(Prefetch('items', queryset=OrderItem.objects.select_related('product')))
+    )
+    page = Paginator(orders, settings.ORDERS_PER_PAGE).get_page(request.GET.get('page'))
+
+    return render(request, 'userprofile/myaccount.html', {
+        'orders': page.object_list,
+        'page_obj': page,
+    })
 
 def signup(request):
     """